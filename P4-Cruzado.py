@@ -15,6 +15,16 @@ from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
 import os
 import sys
+import argparse
+
+from filtros import compilar_filtro
+from motor_cruces import calcular_tabla_cruzada, codificar_variable, obtener_pesos, predicado_igualdad
+from instrumentacion import (
+    activar_contador_escaneos, activar_perfil_memoria, afirmar_limite_escaneos, etapa, iniciar_registro, marcar_etapa,
+    terminar_registro
+)
+from perfilador import ejecutar_con_perfil
+from porcentajes import calcular_porcentajes, celda_porcentaje
 
 def normalizar_p4(valor):
     """
@@ -128,15 +138,56 @@ def aplicar_estilos_bordes(ws, fila, col, es_primera_fila=False, es_ultima_fila=
     ws.cell(row=fila, column=col).border = border
     return border
 
-def generar_analisis_cruzado(archivo_entrada='V3.xlsx', archivo_salida='Analisis_Cruzado_P4.xlsx'):
+def calcular_conteos_p4(df, variables, p4_valores, columna_peso=None, filas=None):
+    """
+    Conteos de la hoja de P4 con el motor de conteo (motor_cruces.py): P4 y
+    cada variable se codifican una sola vez y cada bloque de la tabla sale de
+    un solo bincount, ponderado si hay columna de pesos.
+    filas: máscara booleana opcional de los registros a analizar (--where),
+    sin copiar df.
+    
+    Retorna un diccionario con:
+        totales_opcion: columna TOTAL por opción de P4
+        conteos: {var_nombre: matriz opciones × categorías}
+        totales_categoria: fila TOTAL por variable (solo registros con P4)
+        n_categoria: N sin ponderar por categoría
+        total_general, n_total: registros con P4 (ponderado y sin ponderar)
+    """
+    codificadas = {var_nombre: codificar_variable(df, var_info) for var_nombre, var_info in variables.items()}
+    tabla = calcular_tabla_cruzada(
+        df, 'P4 - Servicio Electrónico', p4_valores, predicado_igualdad, variables, columna_peso, filas, codificadas
+    )
+    pesos = None if columna_peso is None else obtener_pesos(df, columna_peso)
+    
+    con_p4 = df['P4 - Servicio Electrónico'].notna().to_numpy()
+    if filas is not None:
+        con_p4 = con_p4 & filas
+    n_total = int(np.count_nonzero(con_p4))
+    return {
+        'totales_opcion': tabla['totales_opcion'],
+        'conteos': tabla['conteos'],
+        'totales_categoria': tabla['totales_categoria'],
+        'n_categoria': tabla['totales_categoria'] if pesos is None else tabla['sin_ponderar']['totales_categoria'],
+        'total_general': n_total if pesos is None else float(pesos[con_p4].sum()),
+        'n_total': n_total
+    }
+
+def generar_analisis_cruzado(archivo_entrada='V3.xlsx', archivo_salida='Analisis_Cruzado_P4.xlsx', columna_peso=None, filtro=None):
     """
     Función principal que genera el análisis cruzado de P4.
     
     Args:
         archivo_entrada: Nombre del archivo Excel de entrada (default: V3.xlsx)
         archivo_salida: Nombre del archivo Excel de salida (default: Analisis_Cruzado_P4.xlsx)
+        columna_peso: Columna con el factor de expansión por encuestado; si se indica,
+                      los conteos y porcentajes son sumas ponderadas (default: None)
+        filtro: Expresión --where (filtros.py); el análisis se hace solo sobre los
+                registros que la cumplen (default: None)
     """
     print(f"Leyendo archivo: {archivo_entrada}")
+    iniciar_registro(
+        'P4-Cruzado.py', archivo_salida, archivo_entrada=archivo_entrada, columna_peso=columna_peso, filtro=filtro
+    )
     
     # Verificar que el archivo existe
     if not os.path.exists(archivo_entrada):
@@ -145,17 +196,25 @@ def generar_analisis_cruzado(archivo_entrada='V3.xlsx', archivo_salida='Analisis
     
     # Leer el archivo
     try:
-        df = pd.read_excel(archivo_entrada)
+        with etapa('lectura') as medicion:
+            df = pd.read_excel(archivo_entrada)
+            medicion['registros'] = len(df)
         print(f"Archivo leído exitosamente. Total de registros: {len(df)}")
     except Exception as e:
         print(f"ERROR al leer el archivo: {e}")
         sys.exit(1)
     
+    # Verificar la columna de pesos
+    if columna_peso is not None and columna_peso not in df.columns:
+        print(f"ERROR: No se encontró la columna de pesos '{columna_peso}'")
+        sys.exit(1)
+    
     # P4 no requiere normalización (no tiene combinaciones múltiples)
     print("Procesando valores de P4...")
     
     # Crear rangos de edad
     print("Creando rangos de edad...")
+    marcar_etapa('columnas_derivadas', registros=len(df))
     df['Rango_Edad'] = df['P36 - Edad'].apply(crear_rango_edad)
     
     # Crear regiones para Oficina/Agencia/Delegación
@@ -166,9 +225,23 @@ def generar_analisis_cruzado(archivo_entrada='V3.xlsx', archivo_salida='Analisis
     print("Creando regiones de Aduana...")
     df['Region_Aduana'] = df['P44 - Aduana'].apply(obtener_region_aduana)
     
+    # Subpoblación (--where) como máscara de registros: el motor cuenta solo esas filas, sin copiar df
+    mascara = None
+    num_registros = len(df)
+    if filtro:
+        marcar_etapa('filtro', registros=len(df))
+        try:
+            mascara = compilar_filtro(filtro, df)
+        except ValueError as e:
+            print(f"ERROR en el filtro: {e}")
+            sys.exit(1)
+        num_registros = int(np.count_nonzero(mascara))
+        print(f"Filtro: {filtro} ({num_registros} registros cumplen)")
+    
     # Crear nuevo workbook
     print("Creando estructura del archivo Excel...")
     wb = Workbook()
+    marcar_etapa('encabezados', libro=wb, pregunta='P4 - Servicio Electrónico')
     ws = wb.active
     ws.title = "P4"
     
@@ -285,6 +358,10 @@ def generar_analisis_cruzado(archivo_entrada='V3.xlsx', archivo_salida='Analisis
         }
     }
     
+    # Número total de columnas: nombre, TOTAL y una columna por categoría
+    total_columnas = 2 + sum(len(var_info['categorias']) for var_info in variables.values())
+    print(f"Total de columnas calculadas: {total_columnas}")
+    
     # Crear encabezados principales (fila 3)
     col_actual = 1
     ws.cell(row=3, column=col_actual, value='')
@@ -310,13 +387,11 @@ def generar_analisis_cruzado(archivo_entrada='V3.xlsx', archivo_salida='Analisis
         ws.cell(row=3, column=inicio).border = Border(left=medium_side, right=medium_side, top=thin_side, bottom=thin_side)
         ws.cell(row=3, column=inicio).font = Font(bold=True)
         ws.cell(row=3, column=inicio).alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
+        if fin == total_columnas and fin != inicio:
+            ws.cell(row=3, column=fin).border = Border(right=medium_side)
         
         col_actual = fin + 1
     
-    # Calcular el número total de columnas (col_actual - 1 es la última columna con datos)
-    total_columnas = col_actual - 1
-    print(f"Total de columnas calculadas: {total_columnas}")
-    
     # Aplicar merge y bordes al título ahora que sabemos el total de columnas
     ws.merge_cells(start_row=1, start_column=1, end_row=1, end_column=total_columnas)
     ws.cell(row=1, column=1).border = Border(
@@ -325,6 +400,7 @@ def generar_analisis_cruzado(archivo_entrada='V3.xlsx', archivo_salida='Analisis
         top=medium_side,
         bottom=thin_side
     )
+    ws.cell(row=1, column=total_columnas).border = Border(right=medium_side)
     
     # Aplicar bordes a la fila vacía (fila 2) solo hasta las columnas necesarias
     for col in range(1, total_columnas + 1):
@@ -332,7 +408,7 @@ def generar_analisis_cruzado(archivo_entrada='V3.xlsx', archivo_salida='Analisis
         cell.fill = fill_fila1
         cell.border = Border(
             left=thin_side, 
-            right=thin_side, 
+            right=medium_side if col == total_columnas else thin_side, 
             top=thin_side, 
             bottom=thin_side
         )
@@ -362,7 +438,7 @@ def generar_analisis_cruzado(archivo_entrada='V3.xlsx', archivo_salida='Analisis
             ws.cell(row=4, column=col_actual).font = Font(bold=True)
             border = Border(
                 left=Side(style='medium' if es_primera else 'thin', color='FFD0D0D0'),
-                right=Side(style='medium' if es_ultima else 'thin', color='FFD0D0D0'),  # Última columna del grupo tiene right=medium
+                right=Side(style='medium') if col_actual == total_columnas else Side(style='medium' if es_ultima else 'thin', color='FFD0D0D0'),  # Última columna del grupo tiene right=medium
                 top=Side(style='medium'),
                 bottom=Side(style='thin', color='FFD0D0D0')
             )
@@ -372,15 +448,17 @@ def generar_analisis_cruzado(archivo_entrada='V3.xlsx', archivo_salida='Analisis
     
     # Filas de datos: Valores de P4
     print("Generando datos del análisis cruzado...")
+    marcar_etapa('calculo', registros=num_registros, pregunta='P4 - Servicio Electrónico')
     # Solo mostrar las 3 opciones principales, pero incluir todas las combinaciones
     p4_valores = ['a. RTU', 'b. FEL', 'c. Aduanas sin papeles', 'd. Agencia Virtual', 'e. Otros']
+    conteos = calcular_conteos_p4(df, variables, p4_valores, columna_peso, mascara)
     
     print(f"  Opciones de P4 a mostrar: {len(p4_valores)}")
-    for opcion in p4_valores:
-        # Contar todos los registros con esta opción (P4 no tiene combinaciones)
-        count = len(df[df['P4 - Servicio Electrónico'] == opcion])
-        print(f"    - {opcion}: {count} registros")
+    for idx_p4, opcion in enumerate(p4_valores):
+        # Registros con esta opción (P4 no tiene combinaciones)
+        print(f"    - {opcion}: {conteos['totales_opcion'][idx_p4]:,.0f} registros")
     
+    marcar_etapa('escritura', libro=wb, pregunta='P4 - Servicio Electrónico')
     fila = 5
     
     for idx_p4, p4_val in enumerate(p4_valores):
@@ -398,9 +476,11 @@ def generar_analisis_cruzado(archivo_entrada='V3.xlsx', archivo_salida='Analisis
         ws.cell(row=fila, column=col_actual).alignment = Alignment(horizontal='left', vertical='center')
         col_actual += 1
         
-        # TOTAL - contar todos los registros con esta opción (P4 no tiene combinaciones)
-        total = len(df[df['P4 - Servicio Electrónico'] == p4_val])
+        # TOTAL - todos los registros con esta opción (P4 no tiene combinaciones)
+        total = conteos['totales_opcion'][idx_p4].item()
         ws.cell(row=fila, column=col_actual, value=total)
+        if columna_peso is not None:
+            ws.cell(row=fila, column=col_actual).number_format = '#,##0'
         border = Border(
             left=Side(style='medium'),
             right=Side(style='medium'),
@@ -411,28 +491,21 @@ def generar_analisis_cruzado(archivo_entrada='V3.xlsx', archivo_salida='Analisis
         ws.cell(row=fila, column=col_actual).alignment = Alignment(horizontal='center', vertical='center')
         col_actual += 1
         
-        # Datos por variable
+        # Datos por variable (intersección; P4 no tiene combinaciones, comparación directa)
         for var_nombre, var_info in variables.items():
-            col_original = var_info['columna']
             num_cats = len(var_info['categorias'])
             
             for i, cat in enumerate(var_info['categorias']):
                 es_primera = (i == 0)
                 es_ultima = (i == num_cats - 1)
-                
-                # Contar intersección (P4 no tiene combinaciones, comparación directa)
-                if col_original == 'Rango_Edad':
-                    count = len(df[(df['P4 - Servicio Electrónico'] == p4_val) & (df[col_original] == cat)])
-                elif col_original == 'Region_Oficina' or col_original == 'Region_Aduana':
-                    count = len(df[(df['P4 - Servicio Electrónico'] == p4_val) & (df[col_original] == cat)])
-                else:
-                    count = len(df[(df['P4 - Servicio Electrónico'] == p4_val) & (df[col_original] == cat)])
-                valor = count
+                valor = conteos['conteos'][var_nombre][idx_p4, i].item()
                 
                 ws.cell(row=fila, column=col_actual, value=valor)
+                if columna_peso is not None:
+                    ws.cell(row=fila, column=col_actual).number_format = '#,##0'
                 border = Border(
                     left=Side(style='medium' if es_primera else 'thin', color='FFD0D0D0'),
-                    right=Side(style='medium' if es_ultima else 'thin', color='FFD0D0D0'),  # Última columna del grupo tiene right=medium
+                    right=Side(style='medium') if col_actual == total_columnas else Side(style='medium' if es_ultima else 'thin', color='FFD0D0D0'),  # Última columna del grupo tiene right=medium
                     top=Side(style='medium' if idx_p4 == 0 else 'thin', color='FFD0D0D0'),
                     bottom=Side(style='thin', color='FFD0D0D0')
                 )
@@ -442,27 +515,6 @@ def generar_analisis_cruzado(archivo_entrada='V3.xlsx', archivo_salida='Analisis
         
         fila += 1
     
-    # Asegurar que la última columna de todas las filas tenga right=medium
-    print("Aplicando bordes right=medium a la última columna...")
-    for row in range(1, fila + 1):
-        cell = ws.cell(row=row, column=total_columnas)
-        if cell.border:
-            current_border = cell.border
-            new_border = Border(
-                left=current_border.left,
-                right=Side(style='medium'),
-                top=current_border.top,
-                bottom=current_border.bottom
-            )
-            cell.border = new_border
-        else:
-            cell.border = Border(
-                left=Side(style='thin', color='FFD0D0D0'),
-                right=Side(style='medium'),
-                top=Side(style='thin', color='FFD0D0D0'),
-                bottom=Side(style='thin', color='FFD0D0D0')
-            )
-    
     # Fila TOTAL
     print("Generando fila de totales...")
     col_actual = 1
@@ -478,8 +530,10 @@ def generar_analisis_cruzado(archivo_entrada='V3.xlsx', archivo_salida='Analisis
     col_actual += 1
     
     # TOTAL general
-    total_general = len(df[df['P4 - Servicio Electrónico'].notna()])
+    total_general = conteos['total_general']
     ws.cell(row=fila, column=col_actual, value=total_general)
+    if columna_peso is not None:
+        ws.cell(row=fila, column=col_actual).number_format = '#,##0'
     ws.cell(row=fila, column=col_actual).font = Font(bold=True)
     ws.cell(row=fila, column=col_actual).border = Border(
         left=Side(style='medium'),
@@ -491,28 +545,21 @@ def generar_analisis_cruzado(archivo_entrada='V3.xlsx', archivo_salida='Analisis
     col_actual += 1
     
     # Totales por categoría (solo para registros con P4)
-    df_p4 = df[df['P4 - Servicio Electrónico'].notna()]  # Filtrar solo registros con P4
-    
     for var_nombre, var_info in variables.items():
-        col_original = var_info['columna']
         num_cats = len(var_info['categorias'])
         
         for i, cat in enumerate(var_info['categorias']):
             es_primera = (i == 0)
             es_ultima = (i == num_cats - 1)
-            
-            if col_original == 'Rango_Edad':
-                total_cat = len(df_p4[df_p4[col_original] == cat])
-            elif col_original == 'Region_Oficina' or col_original == 'Region_Aduana':
-                total_cat = len(df_p4[df_p4[col_original] == cat])
-            else:
-                total_cat = len(df_p4[df_p4[col_original] == cat])
+            total_cat = conteos['totales_categoria'][var_nombre][i].item()
             
             ws.cell(row=fila, column=col_actual, value=total_cat)
+            if columna_peso is not None:
+                ws.cell(row=fila, column=col_actual).number_format = '#,##0'
             ws.cell(row=fila, column=col_actual).font = Font(bold=True)
             border = Border(
                 left=Side(style='medium' if es_primera else 'thin', color='FFD0D0D0'),
-                right=Side(style='medium' if es_ultima else 'thin', color='FFD0D0D0'),  # Última columna del grupo tiene right=medium
+                right=Side(style='medium') if col_actual == total_columnas else Side(style='medium' if es_ultima else 'thin', color='FFD0D0D0'),  # Última columna del grupo tiene right=medium
                 top=Side(style='thin', color='FFD0D0D0'),
                 bottom=Side(style='medium')
             )
@@ -520,43 +567,51 @@ def generar_analisis_cruzado(archivo_entrada='V3.xlsx', archivo_salida='Analisis
             ws.cell(row=fila, column=col_actual).alignment = Alignment(horizontal='center', vertical='center')
             col_actual += 1
     
-    # Asegurar que TODAS las celdas de la última fila tengan bottom=medium
-    # Solo hasta las columnas necesarias (no más allá)
-    print("Aplicando bordes finales a la última fila...")
-    for col in range(1, total_columnas + 1):
-        cell = ws.cell(row=fila, column=col)
-        if cell.border:
-            # Mantener los bordes existentes (incluyendo right=medium) pero asegurar bottom=medium
-            current_border = cell.border
-            # La última columna debe tener right=medium
-            right_style = Side(style='medium') if col == total_columnas else current_border.right
-            new_border = Border(
-                left=current_border.left,
-                right=right_style,
-                top=current_border.top,
-                bottom=Side(style='medium')
-            )
-            cell.border = new_border
-        else:
-            # Si no tiene borde, crear uno con bottom=medium
-            right_style = Side(style='medium') if col == total_columnas else Side(style='thin', color='FFD0D0D0')
-            cell.border = Border(
-                left=Side(style='thin', color='FFD0D0D0'),
-                right=right_style,
-                top=Side(style='thin', color='FFD0D0D0'),
-                bottom=Side(style='medium')
-            )
+    # Base sin ponderar (N de registros) debajo de la fila TOTAL ponderada
+    if columna_peso is not None:
+        fila += 1
+        ws.cell(row=fila, column=1, value='N (sin ponderar)')
+        ws.cell(row=fila, column=1).font = Font(italic=True)
+        ws.cell(row=fila, column=1).border = Border(
+            left=Side(style='thin', color='FFD0D0D0'),
+            right=Side(style='thin', color='FFD0D0D0'),
+            top=Side(style='thin', color='FFD0D0D0'),
+            bottom=Side(style='medium')
+        )
+        ws.cell(row=fila, column=1).alignment = Alignment(horizontal='center', vertical='center')
+        ws.cell(row=fila, column=2, value=conteos['n_total'])
+        ws.cell(row=fila, column=2).font = Font(italic=True)
+        ws.cell(row=fila, column=2).border = Border(
+            left=Side(style='medium'),
+            right=Side(style='medium'),
+            top=Side(style='thin', color='FFD0D0D0'),
+            bottom=Side(style='medium')
+        )
+        ws.cell(row=fila, column=2).alignment = Alignment(horizontal='center', vertical='center')
+        col_actual = 3
+        for var_nombre, var_info in variables.items():
+            num_cats = len(var_info['categorias'])
+            for i in range(num_cats):
+                ws.cell(row=fila, column=col_actual, value=conteos['n_categoria'][var_nombre][i].item())
+                ws.cell(row=fila, column=col_actual).font = Font(italic=True)
+                ws.cell(row=fila, column=col_actual).border = Border(
+                    left=Side(style='medium' if i == 0 else 'thin', color='FFD0D0D0'),
+                    right=Side(style='medium') if col_actual == total_columnas else Side(style='medium' if i == num_cats - 1 else 'thin', color='FFD0D0D0'),
+                    top=Side(style='thin', color='FFD0D0D0'),
+                    bottom=Side(style='medium')
+                )
+                ws.cell(row=fila, column=col_actual).alignment = Alignment(horizontal='center', vertical='center')
+                col_actual += 1
     
-    # Agregar dos filas vacías
+    # Agregar dos filas vacías (la primera conserva el marco derecho)
+    ws.cell(row=fila + 1, column=total_columnas).border = Border(right=medium_side)
     fila += 2
     
     # ============================================================================
     # TABLA DE PORCENTAJES
     # ============================================================================
     print("Generando tabla de porcentajes...")
-    
-    # Filtrar solo registros con P4 para cálculos de totales
-    df_p4 = df[df['P4 - Servicio Electrónico'].notna()]
+    marcar_etapa('porcentajes', libro=wb, pregunta='P4 - Servicio Electrónico')
     
     # Fila de encabezados principales (igual que la primera tabla)
     fila_porcentajes = fila
@@ -584,6 +639,8 @@ def generar_analisis_cruzado(archivo_entrada='V3.xlsx', archivo_salida='Analisis
         ws.cell(row=fila_porcentajes, column=inicio).border = Border(left=medium_side, right=medium_side, top=medium_side, bottom=thin_side)
         ws.cell(row=fila_porcentajes, column=inicio).font = Font(bold=True)
         ws.cell(row=fila_porcentajes, column=inicio).alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
+        if fin == total_columnas and fin != inicio:
+            ws.cell(row=fila_porcentajes, column=fin).border = Border(right=medium_side)
         
         col_actual = fin + 1
     
@@ -612,7 +669,7 @@ def generar_analisis_cruzado(archivo_entrada='V3.xlsx', archivo_salida='Analisis
             ws.cell(row=fila_porcentajes, column=col_actual).font = Font(bold=True)
             border = Border(
                 left=Side(style='medium' if es_primera else 'thin', color='FFD0D0D0'),
-                right=Side(style='medium' if es_ultima else 'thin', color='FFD0D0D0'),
+                right=Side(style='medium') if col_actual == total_columnas else Side(style='medium' if es_ultima else 'thin', color='FFD0D0D0'),
                 top=Side(style='medium'),
                 bottom=Side(style='thin', color='FFD0D0D0')
             )
@@ -620,16 +677,21 @@ def generar_analisis_cruzado(archivo_entrada='V3.xlsx', archivo_salida='Analisis
             ws.cell(row=fila_porcentajes, column=col_actual).alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
             col_actual += 1
     
-    # Función para redondear porcentajes (0.5 -> 1, 1.5 -> 2, etc.)
-    def redondear_porcentaje(valor):
-        """Redondea porcentajes: si tiene .5 o más, redondea hacia arriba"""
-        if pd.isna(valor) or valor == 0:
-            return 0
-        # Si el decimal es >= 0.5, redondear hacia arriba
-        if valor % 1 >= 0.5:
-            return int(valor) + 1
-        else:
-            return int(valor)
+    # Conteos de la tabla de porcentajes: columna TOTAL (j = 0) y una columna
+    # por categoría, con el denominador de cada columna. Porcentaje VERTICAL
+    # (sobre el total de la categoría, solo registros con P4); TOTAL va sobre
+    # el total general
+    total_general = conteos['total_general']
+    conteos_pct = np.column_stack(
+        [conteos['totales_opcion']] + [conteos['conteos'][var_nombre] for var_nombre in variables]
+    ).astype(np.float64)
+    denominadores_pct = np.concatenate(
+        [np.array([total_general], dtype=np.float64)] + [conteos['totales_categoria'][var_nombre] for var_nombre in variables]
+    )
+    
+    # Toda la tabla redondeada en una sola llamada (entero, .5 hacia arriba); la
+    # fila TOTAL es la suma por columna de esos mismos porcentajes
+    porcentajes = calcular_porcentajes(conteos_pct, denominadores_pct, base='vertical', redondeo='entero_medio_arriba')
     
     # Filas de datos con porcentajes
     fila_porcentajes += 1
@@ -648,17 +710,11 @@ def generar_analisis_cruzado(archivo_entrada='V3.xlsx', archivo_salida='Analisis
         ws.cell(row=fila_porcentajes, column=col_actual).alignment = Alignment(horizontal='left', vertical='center')
         col_actual += 1
         
-        # TOTAL - calcular porcentaje sobre el total general
-        total_absoluto = len(df[df['P4 - Servicio Electrónico'] == p4_val])
-        total_general = len(df[df['P4 - Servicio Electrónico'].notna()])
-        porcentaje_total = (total_absoluto / total_general * 100) if total_general > 0 else 0
-        porcentaje_redondeado = redondear_porcentaje(porcentaje_total)
-        if porcentaje_redondeado == 0:
-            ws.cell(row=fila_porcentajes, column=col_actual, value="---")
-        else:
-            # Guardar como número decimal para formato de porcentaje
-            ws.cell(row=fila_porcentajes, column=col_actual, value=porcentaje_redondeado / 100)
-            ws.cell(row=fila_porcentajes, column=col_actual).number_format = '0%'
+        # TOTAL - porcentaje sobre el total general
+        ws.cell(row=fila_porcentajes, column=col_actual, value=celda_porcentaje(
+            porcentajes['unidades'][idx_p4, 0], porcentajes['valores'][idx_p4, 0]))
+        if porcentajes['unidades'][idx_p4, 0] != 0:
+            ws.cell(row=fila_porcentajes, column=col_actual).number_format = porcentajes['formato']
         border = Border(
             left=Side(style='medium'),
             right=Side(style='medium'),
@@ -671,41 +727,20 @@ def generar_analisis_cruzado(archivo_entrada='V3.xlsx', archivo_salida='Analisis
         
         # Datos por variable (porcentajes)
         for var_nombre, var_info in variables.items():
-            col_original = var_info['columna']
             num_cats = len(var_info['categorias'])
             
             for i, cat in enumerate(var_info['categorias']):
                 es_primera = (i == 0)
                 es_ultima = (i == num_cats - 1)
+                j = col_actual - 2
                 
-                # Contar intersección (P4 no tiene combinaciones)
-                if col_original == 'Rango_Edad':
-                    count = len(df[(df['P4 - Servicio Electrónico'] == p4_val) & (df[col_original] == cat)])
-                elif col_original == 'Region_Oficina' or col_original == 'Region_Aduana':
-                    count = len(df[(df['P4 - Servicio Electrónico'] == p4_val) & (df[col_original] == cat)])
-                else:
-                    count = len(df[(df['P4 - Servicio Electrónico'] == p4_val) & (df[col_original] == cat)])
-                
-                # Calcular porcentaje VERTICAL (sobre el total de esa categoría/columna - solo registros con P4)
-                if col_original == 'Rango_Edad':
-                    total_categoria = len(df_p4[df_p4[col_original] == cat])
-                elif col_original == 'Region_Oficina' or col_original == 'Region_Aduana':
-                    total_categoria = len(df_p4[df_p4[col_original] == cat])
-                else:
-                    total_categoria = len(df_p4[df_p4[col_original] == cat])
-                
-                porcentaje = (count / total_categoria * 100) if total_categoria > 0 else 0
-                
-                porcentaje_redondeado = redondear_porcentaje(porcentaje)
-                if porcentaje_redondeado == 0:
-                    ws.cell(row=fila_porcentajes, column=col_actual, value="---")
-                else:
-                    # Guardar como número decimal para formato de porcentaje
-                    ws.cell(row=fila_porcentajes, column=col_actual, value=porcentaje_redondeado / 100)
-                    ws.cell(row=fila_porcentajes, column=col_actual).number_format = '0%'
+                ws.cell(row=fila_porcentajes, column=col_actual, value=celda_porcentaje(
+                    porcentajes['unidades'][idx_p4, j], porcentajes['valores'][idx_p4, j]))
+                if porcentajes['unidades'][idx_p4, j] != 0:
+                    ws.cell(row=fila_porcentajes, column=col_actual).number_format = porcentajes['formato']
                 border = Border(
                     left=Side(style='medium' if es_primera else 'thin', color='FFD0D0D0'),
-                    right=Side(style='medium' if es_ultima else 'thin', color='FFD0D0D0'),
+                    right=Side(style='medium') if col_actual == total_columnas else Side(style='medium' if es_ultima else 'thin', color='FFD0D0D0'),
                     top=Side(style='medium' if idx_p4 == 0 else 'thin', color='FFD0D0D0'),
                     bottom=Side(style='thin', color='FFD0D0D0')
                 )
@@ -728,29 +763,11 @@ def generar_analisis_cruzado(archivo_entrada='V3.xlsx', archivo_salida='Analisis
     ws.cell(row=fila_porcentajes, column=col_actual).alignment = Alignment(horizontal='center', vertical='center')
     col_actual += 1
     
-    # TOTAL general - suma vertical de porcentajes
-    # Sumar los porcentajes de las 5 filas anteriores (opciones de P4)
-    suma_total = 0
-    for idx_p4 in range(len(p4_valores)):
-        fila_anterior = fila_porcentajes - len(p4_valores) + idx_p4
-        valor_celda = ws.cell(row=fila_anterior, column=col_actual).value
-        if valor_celda is not None:
-            if isinstance(valor_celda, (int, float)):
-                # Es un número decimal (formato de porcentaje), convertir a porcentaje entero
-                suma_total += int(valor_celda * 100)
-            elif isinstance(valor_celda, str) and valor_celda != "---":
-                # Formato antiguo con "%" (por compatibilidad)
-                if '%' in valor_celda:
-                    num = int(valor_celda.replace('%', ''))
-                    suma_total += num
-            # Si es "---", se trata como 0 (no se suma nada)
-    
-    if suma_total == 0:
-        ws.cell(row=fila_porcentajes, column=col_actual, value="---")
-    else:
-        # Guardar como número decimal para formato de porcentaje
-        ws.cell(row=fila_porcentajes, column=col_actual, value=suma_total / 100)
-        ws.cell(row=fila_porcentajes, column=col_actual).number_format = '0%'
+    # TOTAL general - suma vertical de porcentajes (desde el arreglo, sin leer la hoja)
+    ws.cell(row=fila_porcentajes, column=col_actual, value=celda_porcentaje(
+        porcentajes['suma_unidades'][0], porcentajes['suma_valores'][0]))
+    if porcentajes['suma_unidades'][0] != 0:
+        ws.cell(row=fila_porcentajes, column=col_actual).number_format = porcentajes['formato']
     ws.cell(row=fila_porcentajes, column=col_actual).font = Font(bold=True)
     ws.cell(row=fila_porcentajes, column=col_actual).border = Border(
         left=Side(style='medium'),
@@ -763,39 +780,21 @@ def generar_analisis_cruzado(archivo_entrada='V3.xlsx', archivo_salida='Analisis
     
     # Totales por categoría - suma vertical de porcentajes
     for var_nombre, var_info in variables.items():
-        col_original = var_info['columna']
         num_cats = len(var_info['categorias'])
         
         for i, cat in enumerate(var_info['categorias']):
             es_primera = (i == 0)
             es_ultima = (i == num_cats - 1)
+            j = col_actual - 2
             
-            # Sumar los porcentajes verticalmente de las 5 filas anteriores
-            suma_porcentajes = 0
-            for idx_p4 in range(len(p4_valores)):
-                fila_anterior = fila_porcentajes - len(p4_valores) + idx_p4
-                valor_celda = ws.cell(row=fila_anterior, column=col_actual).value
-                if valor_celda is not None:
-                    if isinstance(valor_celda, (int, float)):
-                        # Es un número decimal (formato de porcentaje), convertir a porcentaje entero
-                        suma_porcentajes += int(valor_celda * 100)
-                    elif isinstance(valor_celda, str) and valor_celda != "---":
-                        # Formato antiguo con "%" (por compatibilidad)
-                        if '%' in valor_celda:
-                            num = int(valor_celda.replace('%', ''))
-                            suma_porcentajes += num
-                    # Si es "---", se trata como 0 (no se suma nada)
-            
-            if suma_porcentajes == 0:
-                ws.cell(row=fila_porcentajes, column=col_actual, value="---")
-            else:
-                # Guardar como número decimal para formato de porcentaje
-                ws.cell(row=fila_porcentajes, column=col_actual, value=suma_porcentajes / 100)
-                ws.cell(row=fila_porcentajes, column=col_actual).number_format = '0%'
+            ws.cell(row=fila_porcentajes, column=col_actual, value=celda_porcentaje(
+                porcentajes['suma_unidades'][j], porcentajes['suma_valores'][j]))
+            if porcentajes['suma_unidades'][j] != 0:
+                ws.cell(row=fila_porcentajes, column=col_actual).number_format = porcentajes['formato']
             ws.cell(row=fila_porcentajes, column=col_actual).font = Font(bold=True)
             border = Border(
                 left=Side(style='medium' if es_primera else 'thin', color='FFD0D0D0'),
-                right=Side(style='medium' if es_ultima else 'thin', color='FFD0D0D0'),
+                right=Side(style='medium') if col_actual == total_columnas else Side(style='medium' if es_ultima else 'thin', color='FFD0D0D0'),
                 top=Side(style='thin', color='FFD0D0D0'),
                 bottom=Side(style='medium')
             )
@@ -803,33 +802,6 @@ def generar_analisis_cruzado(archivo_entrada='V3.xlsx', archivo_salida='Analisis
             ws.cell(row=fila_porcentajes, column=col_actual).alignment = Alignment(horizontal='center', vertical='center')
             col_actual += 1
     
-    # Asegurar bordes en la última fila y última columna de porcentajes
-    for col in range(1, total_columnas + 1):
-        cell = ws.cell(row=fila_porcentajes, column=col)
-        if cell.border:
-            current_border = cell.border
-            right_style = Side(style='medium') if col == total_columnas else current_border.right
-            new_border = Border(
-                left=current_border.left,
-                right=right_style,
-                top=current_border.top,
-                bottom=Side(style='medium')
-            )
-            cell.border = new_border
-    
-    # Asegurar que la última columna de todas las filas de porcentajes tenga right=medium
-    for row in range(fila - 2, fila_porcentajes + 1):
-        cell = ws.cell(row=row, column=total_columnas)
-        if cell.border:
-            current_border = cell.border
-            new_border = Border(
-                left=current_border.left,
-                right=Side(style='medium'),
-                top=current_border.top,
-                bottom=current_border.bottom
-            )
-            cell.border = new_border
-    
     # Ajustar ancho de columnas solo hasta las necesarias
     print("Ajustando ancho de columnas...")
     ws.column_dimensions['A'].width = 30
@@ -838,27 +810,76 @@ def generar_analisis_cruzado(archivo_entrada='V3.xlsx', archivo_salida='Analisis
     
     # Guardar archivo
     print(f"Guardando archivo: {archivo_salida}")
+    marcar_etapa('guardado')
     try:
         wb.save(archivo_salida)
         print(f"✓ Archivo generado exitosamente: {archivo_salida}")
-        print(f"  Total de registros procesados: {len(df)}")
+        print(f"  Total de registros procesados: {num_registros}")
         print(f"  Total de filas en el análisis: {fila}")
         print(f"  Total de columnas: {ws.max_column}")
     except Exception as e:
         print(f"ERROR al guardar el archivo: {e}")
         sys.exit(1)
+    
+    terminar_registro()
 
 if __name__ == "__main__":
     # Permitir especificar archivos como argumentos
-    archivo_entrada = sys.argv[1] if len(sys.argv) > 1 else 'V3.xlsx'
-    archivo_salida = sys.argv[2] if len(sys.argv) > 2 else 'P4-Cruzado.xlsx'
+    parser = argparse.ArgumentParser(description='Genera el análisis cruzado de P4.')
+    parser.add_argument('archivo_entrada', nargs='?', default='V3.xlsx')
+    parser.add_argument('archivo_salida', nargs='?', default='P4-Cruzado.xlsx')
+    parser.add_argument(
+        '--peso', default=None, metavar='COLUMNA',
+        help='Columna con el factor de expansión por encuestado; los conteos y porcentajes quedan ponderados'
+    )
+    parser.add_argument(
+        '--where', default=None, metavar='EXPRESION',
+        help="Analiza solo los registros que cumplen la expresión, p. ej. \"Region_Oficina = 'Occidente'\""
+    )
+    parser.add_argument(
+        '--escaneos', action='store_true',
+        help='Cuenta los str.contains, máscaras de igualdad y DataFrames filtrados y los agrega al informe de la corrida'
+    )
+    parser.add_argument(
+        '--max-escaneos', type=int, default=None, metavar='N',
+        help='Con el contador de escaneos: termina con error si la hoja hace más de N escaneos'
+    )
+    parser.add_argument(
+        '--max-filas-escaneadas', type=int, default=None, metavar='N',
+        help='Con el contador de escaneos: termina con error si la hoja hace escaneos que recorren más de N filas'
+    )
+    parser.add_argument(
+        '--profile-memory', action='store_true',
+        help='Registra el pico de RSS y la memoria asignada (tracemalloc) por etapa y por pregunta, con las líneas que más asignan'
+    )
+    parser.add_argument(
+        '--profile', action='store_true',
+        help='Ejecuta bajo cProfile: guarda <salida>-Perfil.prof y muestra las funciones más costosas por grupo'
+    )
+    args = parser.parse_args()
+    if args.escaneos or args.max_escaneos is not None or args.max_filas_escaneadas is not None:
+        activar_contador_escaneos()
+    if args.profile_memory:
+        activar_perfil_memoria()
     
     print("=" * 60)
     print("GENERADOR DE ANÁLISIS CRUZADO P4")
     print("=" * 60)
     print()
     
-    generar_analisis_cruzado(archivo_entrada, archivo_salida)
+    if args.profile:
+        ejecutar_con_perfil(
+            args.archivo_salida, generar_analisis_cruzado, args.archivo_entrada, args.archivo_salida, args.peso, args.where
+        )
+    else:
+        generar_analisis_cruzado(args.archivo_entrada, args.archivo_salida, args.peso, args.where)
+    
+    if args.max_escaneos is not None or args.max_filas_escaneadas is not None:
+        try:
+            afirmar_limite_escaneos(args.max_escaneos, maximo_filas=args.max_filas_escaneadas)
+        except AssertionError as e:
+            print(f"ERROR: {e}")
+            sys.exit(1)
     
     print()
     print("=" * 60)
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Almacén SQLite de los resultados de todos.py.
+
+Cada celda calculada de los reportes (conteo, base y porcentaje de cada
+opción por categoría de cada variable de cruce, más la columna TOTAL) se
+guarda en formato largo en la tabla `resultados`, con índices por pregunta
+y por variable, para consultar sin abrir los libros de Excel:
+
+    SELECT opcion, conteo, base, porcentaje FROM resultados
+    WHERE pregunta = 'P35' AND columna_variable = 'Region_Oficina' AND categoria = 'Occidente'
+
+Las filas son las de la tabla en formato largo (formato_largo.py): los
+porcentajes son los del reporte, en puntos con dos decimales. Cada corrida
+se guarda bajo un `origen`: la ruta resuelta del archivo de entrada (así
+ola1/V3.xlsx y ola2/V3.xlsx no se pisan) o el nombre dado con --origen en
+todos.py. Al volver a procesar el mismo origen sus filas se reemplazan en
+una sola transacción (si algo falla queda la versión anterior completa).
+
+Uso (consulta):
+    python almacen.py BASE.db PREGUNTA [VARIABLE] [CATEGORIA] [--origen ORIGEN]
+
+Autor: Generado automáticamente
+Fecha: 2025
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+from formato_largo import COLUMNAS_LARGO
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS corridas (
+    origen TEXT PRIMARY KEY,
+    registros INTEGER,
+    preguntas INTEGER,
+    columna_peso TEXT,
+    fecha TEXT
+);
+CREATE TABLE IF NOT EXISTS resultados (
+    origen TEXT NOT NULL,
+    pregunta TEXT NOT NULL,
+    pregunta_col TEXT NOT NULL,
+    orden INTEGER NOT NULL,
+    opcion TEXT,
+    variable TEXT NOT NULL,
+    columna_variable TEXT,
+    categoria TEXT NOT NULL,
+    conteo REAL,
+    base REAL,
+    porcentaje REAL
+);
+CREATE INDEX IF NOT EXISTS idx_resultados_pregunta ON resultados (pregunta, variable, categoria);
+CREATE INDEX IF NOT EXISTS idx_resultados_columna ON resultados (pregunta, columna_variable, categoria);
+CREATE INDEX IF NOT EXISTS idx_resultados_variable ON resultados (variable, categoria);
+CREATE INDEX IF NOT EXISTS idx_resultados_origen ON resultados (origen);
+"""
+
+def crear_esquema(conexion):
+    """Crea las tablas e índices si no existen."""
+    conexion.executescript(ESQUEMA)
+
+def clave_origen(archivo):
+    """Origen por defecto de una corrida: la ruta resuelta del archivo."""
+    return os.path.realpath(archivo)
+
+def guardar_resultados(archivo_db, origen, tabla_larga, registros, columna_peso=None):
+    """
+    Reemplaza los resultados de un origen en la base.
+    tabla_larga: resultado de construir_tabla_larga (formato_largo.py).
+    Retorna el número de filas escritas.
+    """
+    # Tipos de Python y None para los vacíos (columna_variable de TOTAL)
+    columnas = tabla_larga[COLUMNAS_LARGO].astype(object)
+    columnas = columnas.where(columnas.notna(), None)
+    filas = [(origen, *fila) for fila in columnas.itertuples(index=False, name=None)]
+    preguntas = int(tabla_larga['pregunta_col'].nunique())
+
+    conexion = sqlite3.connect(archivo_db)
+    try:
+        crear_esquema(conexion)
+        # Una sola transacción: se borra el origen y se insertan todas las filas
+        with conexion:
+            conexion.execute("DELETE FROM resultados WHERE origen = ?", (origen,))
+            conexion.executemany(
+                "INSERT INTO resultados (origen, pregunta, pregunta_col, orden, opcion, variable, "
+                "columna_variable, categoria, conteo, base, porcentaje) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                filas
+            )
+            conexion.execute(
+                "INSERT OR REPLACE INTO corridas (origen, registros, preguntas, columna_peso, fecha) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (origen, int(registros), preguntas, columna_peso, datetime.now().isoformat(timespec='seconds'))
+            )
+    finally:
+        conexion.close()
+    return len(filas)
+
+def consultar_resultados(archivo_db, pregunta, variable=None, categoria=None, origen=None):
+    """
+    Resultados de una pregunta, opcionalmente de una variable (nombre del
+    grupo o columna de la encuesta, p. ej. 'Region_Oficina') y una categoría.
+    Una pregunta puede tener varias columnas (p. ej. 'P35 - Medios Preferidos'
+    y 'P35 - Otros Medios'); se distinguen por pregunta_col.
+    Retorna una lista de diccionarios en el orden del reporte.
+    """
+    condiciones = ["pregunta = ?"]
+    parametros = [pregunta]
+    if variable is not None:
+        condiciones.append("(variable = ? OR columna_variable = ?)")
+        parametros.extend([variable, variable])
+    if categoria is not None:
+        condiciones.append("categoria = ?")
+        parametros.append(categoria)
+    if origen is not None:
+        condiciones.append("origen = ?")
+        parametros.append(origen)
+
+    conexion = sqlite3.connect(archivo_db)
+    conexion.row_factory = sqlite3.Row
+    try:
+        cursor = conexion.execute(
+            "SELECT origen, pregunta, pregunta_col, opcion, variable, categoria, conteo, base, porcentaje FROM resultados "
+            f"WHERE {' AND '.join(condiciones)} ORDER BY origen, rowid",
+            parametros
+        )
+        return [dict(fila) for fila in cursor]
+    finally:
+        conexion.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Consulta los resultados guardados por todos.py --sqlite.')
+    parser.add_argument('archivo_db')
+    parser.add_argument('pregunta', help='Número de la pregunta, p. ej. P35')
+    parser.add_argument('variable', nargs='?', default=None, help="Grupo o columna, p. ej. Region_Oficina")
+    parser.add_argument('categoria', nargs='?', default=None, help='Categoría, p. ej. Occidente')
+    parser.add_argument(
+        '--origen', default=None, metavar='ORIGEN',
+        help='Origen de la corrida: el archivo de entrada (se resuelve su ruta) o el nombre dado con --origen en todos.py'
+    )
+    args = parser.parse_args()
+    if args.origen is not None and os.path.exists(args.origen):
+        args.origen = clave_origen(args.origen)
+
+    if not os.path.exists(args.archivo_db):
+        print(f"ERROR: No se encontró la base {args.archivo_db}")
+        sys.exit(1)
+
+    inicio = time.perf_counter()
+    resultados = consultar_resultados(args.archivo_db, args.pregunta, args.variable, args.categoria, args.origen)
+    milisegundos = (time.perf_counter() - inicio) * 1000
+
+    print(f"{'Variable':<30} {'Categoría':<25} {'Opción':<40} {'Conteo':>10} {'Base':>10} {'%':>8}")
+    print("-" * 128)
+    anterior = None
+    for fila in resultados:
+        if (fila['origen'], fila['pregunta_col']) != anterior:
+            anterior = (fila['origen'], fila['pregunta_col'])
+            print(f"[{fila['origen']}] {fila['pregunta_col']}")
+        print(
+            f"{fila['variable'][:30]:<30} {str(fila['categoria'])[:25]:<25} {str(fila['opcion'])[:40]:<40} "
+            f"{fila['conteo']:>10,.0f} {fila['base']:>10,.0f} {fila['porcentaje']:>8.2f}"
+        )
+    print(f"\n{len(resultados)} filas en {milisegundos:.1f} ms")
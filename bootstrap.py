@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Intervalos de confianza bootstrap para las tablas de porcentajes.
+
+Los registros se remuestrean B veces con arreglos de índices de NumPy
+(remuestras × registros) generados una sola vez por población. Cada columna
+se codifica una sola vez como patrones de pertenencia (registros con el mismo
+conjunto de categorías comparten código), de modo que una tabla remuestreada
+es un np.bincount de los códigos combinados pregunta × variable, tomados con
+los índices de la remuestra. Todas las remuestras de un lote salen del mismo
+bincount; no se repite el proceso de pandas por remuestra.
+
+Los límites son los percentiles del porcentaje en las remuestras (método de
+percentiles), con la misma base que la tabla de porcentajes: la columna TOTAL
+sobre el total general y las categorías en vertical.
+
+Autor: Generado automáticamente
+Fecha: 2025
+"""
+
+import numpy as np
+
+from motor_cruces import codificar_columna, codificar_variable, indicadora, obtener_pesos
+
+REMUESTRAS = 1000
+NIVEL_CONFIANZA = 0.95
+TAMANO_LOTE = 250
+SEMILLA = 2025
+
+def codificar_patrones_columna(columna, respuesta=None):
+    """
+    Patrones de pertenencia de una columna ya codificada (también grupos
+    anidados). Si se indica 'respuesta' (vector booleano por registro) se
+    agrega como última columna del patrón.
+    Retorna (codigos, patrones) con patrones de forma num_patrones × categorías.
+    """
+    matriz = indicadora(columna)
+    if respuesta is not None:
+        matriz = np.column_stack([matriz, respuesta])
+    if len(matriz) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, matriz.shape[1]))
+    patrones, codigos = np.unique(matriz, axis=0, return_inverse=True)
+    return codigos.reshape(-1).astype(np.int64), patrones
+
+def generar_indices(num_registros, remuestras=REMUESTRAS, semilla=SEMILLA):
+    """Arreglo remuestras × registros con los índices de cada remuestra (con reemplazo)."""
+    generador = np.random.default_rng(semilla)
+    return generador.integers(0, num_registros, size=(remuestras, num_registros), dtype=np.int64)
+
+def contar_remuestras(codigos, num_codigos, indices, tamano_lote=TAMANO_LOTE, pesos=None):
+    """
+    Conteo por código en cada remuestra: arreglo remuestras × num_codigos.
+    Cada lote de remuestras se resuelve con un solo np.bincount, desplazando
+    los códigos de la remuestra b en b * num_codigos.
+    pesos: vector opcional por registro (suma de pesos en lugar de conteo).
+    """
+    remuestras = len(indices)
+    conteos = np.empty((remuestras, num_codigos), dtype=np.int64 if pesos is None else np.float64)
+    for inicio in range(0, remuestras, tamano_lote):
+        lote = indices[inicio:inicio + tamano_lote]
+        desplazamiento = np.arange(len(lote), dtype=np.int64)[:, None] * num_codigos
+        conteos[inicio:inicio + len(lote)] = np.bincount(
+            (codigos[lote] + desplazamiento).ravel(),
+            weights=None if pesos is None else pesos[lote].ravel(),
+            minlength=len(lote) * num_codigos
+        ).reshape(len(lote), num_codigos)
+    return conteos
+
+def limites_percentil(porcentajes, nivel=NIVEL_CONFIANZA):
+    """Límites inferior y superior (percentiles) sobre el eje de las remuestras."""
+    alfa = (1 - nivel) / 2 * 100
+    inferior, superior = np.percentile(porcentajes, [alfa, 100 - alfa], axis=0)
+    return inferior, superior
+
+def calcular_intervalos_bootstrap(df, preguntas, variables, remuestras=REMUESTRAS, nivel=NIVEL_CONFIANZA,
+                                  semilla=SEMILLA, tamano_lote=TAMANO_LOTE, columna_peso=None):
+    """
+    Calcula los intervalos de confianza de los porcentajes de varias preguntas
+    que comparten la misma población (df).
+
+    preguntas: {pregunta_col: (opciones, predicado)}
+    variables: grupos de columnas del reporte (se codifican una sola vez)
+    columna_peso: columna opcional de pesos; cada remuestra suma los pesos de
+    los registros elegidos
+
+    Retorna {pregunta_col: intervalos}, con intervalos:
+        total: (inferior, superior) de la columna TOTAL, por opción
+        variables: {var_nombre: (inferior, superior)} matrices opciones × categorías
+        remuestras, nivel
+    Los límites están en porcentaje (0-100).
+    """
+    total_general = len(df)
+    if total_general == 0:
+        return {}
+    indices = generar_indices(total_general, remuestras, semilla)
+    pesos = None
+    if columna_peso is not None:
+        pesos = obtener_pesos(df, columna_peso)
+        # Total general ponderado de cada remuestra (base de la columna TOTAL)
+        total_general = pesos[indices].sum(axis=1)[:, None]
+
+    # Variables de cruce: un solo código de patrón por registro, para todas las preguntas
+    codificadas = {}
+    for var_nombre, var_info in variables.items():
+        codificadas[var_nombre] = codificar_patrones_columna(codificar_variable(df, var_info))
+
+    resultados = {}
+    for pregunta_col, (opciones, predicado) in preguntas.items():
+        col_q = codificar_columna(df[pregunta_col], opciones, predicado)
+        respuesta = df[pregunta_col].notna().to_numpy(dtype=np.float64)
+        codigos_q, patrones_q = codificar_patrones_columna(col_q, respuesta)
+        num_q = len(patrones_q)
+
+        # Columna TOTAL: registros por opción sobre el total general
+        marginal = contar_remuestras(codigos_q, num_q, indices, tamano_lote, pesos) @ patrones_q[:, :-1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            porcentajes_total = np.where(total_general > 0, marginal / total_general * 100, 0.0)
+        intervalos = {
+            'total': limites_percentil(porcentajes_total, nivel),
+            'variables': {},
+            'remuestras': remuestras,
+            'nivel': nivel
+        }
+
+        for var_nombre, (codigos_d, patrones_d) in codificadas.items():
+            num_d = len(patrones_d)
+            conjuntos = contar_remuestras(codigos_q * num_d + codigos_d, num_q * num_d, indices, tamano_lote, pesos)
+            conjuntos = conjuntos.reshape(remuestras, num_q, num_d).astype(np.float64)
+            # Expandir patrones a opciones (más la fila "respondió") × categorías
+            tabla = patrones_q.T @ conjuntos @ patrones_d
+            conteos, totales_categoria = tabla[:, :-1, :], tabla[:, -1:, :]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                porcentajes = np.where(totales_categoria > 0, conteos / totales_categoria * 100, 0.0)
+            intervalos['variables'][var_nombre] = limites_percentil(porcentajes, nivel)
+
+        resultados[pregunta_col] = intervalos
+    return resultados
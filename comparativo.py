@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Comparación entre dos olas de la encuesta a partir de los resultados guardados.
+
+Lee dos agregados parciales (.npz de parciales.py o el estado de
+incremental.py), sin volver a leer las encuestas, y genera un libro con la
+misma organización que la versión con pestañas de todos.py: una hoja por
+pregunta con la diferencia en conteos (ola actual − ola anterior) y la
+diferencia en puntos porcentuales de cada celda.
+
+Las tablas se alinean por pregunta, opción y categoría con los vocabularios
+de cada ola: una opción o categoría que solo existe en una de las olas
+cuenta como 0 en la otra. Todas las preguntas se apilan en una sola matriz
+opciones × (TOTAL + categorías) por ola, y las diferencias se calculan de
+una vez sobre esas matrices. Los porcentajes usan la misma base y el mismo
+redondeo que los reportes (centésimas truncadas), de modo que la diferencia
+es la de los valores publicados.
+
+Uso:
+    python comparativo.py resultados_anterior.npz resultados_actual.npz [archivo_salida]
+
+Autor: Generado automáticamente
+Fecha: 2025
+"""
+
+import numpy as np
+import os
+import sys
+from openpyxl import Workbook
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+from openpyxl.utils import get_column_letter
+
+from parciales import cargar_parcial, tablas_desde_parcial
+from porcentajes import redondear_porcentajes
+from todos import escribir_encabezados
+
+# Formatos de las diferencias: signo explícito
+FORMATO_DELTA_CONTEO = '+#,##0;-#,##0;0'
+FORMATO_DELTA_PUNTOS = '+0.00;-0.00;0.00'
+
+def cargar_resultados(archivo):
+    """
+    Carga los resultados guardados de una ola.
+    Retorna (agregados, variables): tablas por opción (ver tablas_desde_parcial)
+    y las variables de cruce con que se calcularon.
+    """
+    parcial = cargar_parcial(archivo)
+    return tablas_desde_parcial(parcial), parcial['variables']
+
+def posiciones_en(vocabulario, elementos):
+    """
+    Posición de cada elemento en el vocabulario (-1 si no está).
+    """
+    indice = {elemento: i for i, elemento in enumerate(vocabulario)}
+    return np.array([indice.get(elemento, -1) for elemento in elementos], dtype=np.int64)
+
+def matriz_alineada(tabla, opciones_origen, variables_origen, opciones, variables):
+    """
+    Conteos y bases de una tabla en la disposición de la comparación:
+    filas = opciones, columnas = TOTAL + categorías de cada variable.
+    Las opciones o categorías que la tabla no tiene quedan en 0.
+    Retorna (conteos, bases), ambas matrices opciones × columnas.
+    """
+    num_columnas = 1 + sum(len(var_info['categorias']) for var_info in variables.values())
+    conteos = np.zeros((len(opciones), num_columnas), dtype=np.float64)
+    bases = np.zeros((len(opciones), num_columnas), dtype=np.float64)
+    if tabla is None:
+        return conteos, bases
+
+    filas = posiciones_en(opciones_origen, opciones)
+    presentes = filas >= 0
+
+    conteos[presentes, 0] = np.asarray(tabla['totales_opcion'])[filas[presentes]]
+    bases[:, 0] = tabla['total_general']
+
+    col_actual = 1
+    for var_nombre, var_info in variables.items():
+        num_cats = len(var_info['categorias'])
+        if var_nombre in tabla['conteos']:
+            columnas = posiciones_en(variables_origen[var_nombre]['categorias'], var_info['categorias'])
+            con_categoria = columnas >= 0
+            destino = col_actual + np.flatnonzero(con_categoria)
+            origen = np.asarray(tabla['conteos'][var_nombre])[:, columnas[con_categoria]]
+            conteos[np.ix_(presentes, destino)] = origen[filas[presentes]]
+            bases[:, destino] = np.asarray(tabla['totales_categoria'][var_nombre])[columnas[con_categoria]]
+        col_actual += num_cats
+    return conteos, bases
+
+def comparar_olas(anterior, variables_anterior, actual, variables_actual):
+    """
+    Diferencias por celda entre dos olas.
+
+    Retorna una lista, en el orden de las preguntas de la ola actual (y luego
+    las que solo tiene la anterior), de diccionarios con:
+        columna, num, opciones
+        delta_conteos: matriz opciones × (TOTAL + categorías)
+        delta_puntos: diferencia de porcentajes en centésimas de punto
+        delta_bases: diferencia de las bases (fila de N)
+    """
+    variables = variables_actual
+    numeros = {col: num for _, col, num in anterior['preguntas']}
+    numeros.update({col: num for _, col, num in actual['preguntas']})
+    columnas = [col for _, col, _ in actual['preguntas']]
+    columnas += [col for _, col, _ in anterior['preguntas'] if col not in columnas]
+
+    # Opciones alineadas: las de la ola actual y luego las que solo tiene la anterior
+    preguntas = []
+    bloques = {'conteos_a': [], 'bases_a': [], 'conteos_b': [], 'bases_b': []}
+    for pregunta_col in columnas:
+        opciones_a = anterior['info'].get(pregunta_col, (False, []))[1]
+        opciones_b = actual['info'].get(pregunta_col, (False, []))[1]
+        opciones = list(opciones_b) + [op for op in opciones_a if op not in opciones_b]
+        if len(opciones) == 0:
+            continue
+        conteos_a, bases_a = matriz_alineada(
+            anterior['tablas'].get(pregunta_col), opciones_a, variables_anterior, opciones, variables
+        )
+        conteos_b, bases_b = matriz_alineada(
+            actual['tablas'].get(pregunta_col), opciones_b, variables_actual, opciones, variables
+        )
+        bloques['conteos_a'].append(conteos_a)
+        bloques['bases_a'].append(bases_a)
+        bloques['conteos_b'].append(conteos_b)
+        bloques['bases_b'].append(bases_b)
+        preguntas.append({'columna': pregunta_col, 'num': numeros[pregunta_col], 'opciones': opciones})
+
+    if not preguntas:
+        return []
+
+    # Todas las preguntas apiladas: un solo cálculo de porcentajes y diferencias
+    conteos_a, bases_a, conteos_b, bases_b = (np.vstack(bloques[clave]) for clave in (
+        'conteos_a', 'bases_a', 'conteos_b', 'bases_b'
+    ))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        porcentajes_a = np.where(bases_a > 0, conteos_a / bases_a * 100, 0.0)
+        porcentajes_b = np.where(bases_b > 0, conteos_b / bases_b * 100, 0.0)
+    delta_conteos = conteos_b - conteos_a
+    delta_puntos = redondear_porcentajes(porcentajes_b)['unidades'] - redondear_porcentajes(porcentajes_a)['unidades']
+    delta_bases = bases_b - bases_a
+
+    cortes = np.cumsum([len(preg['opciones']) for preg in preguntas])[:-1]
+    for preg, conteos, puntos, bases in zip(
+        preguntas, np.split(delta_conteos, cortes), np.split(delta_puntos, cortes), np.split(delta_bases, cortes)
+    ):
+        preg['delta_conteos'] = conteos
+        preg['delta_puntos'] = puntos
+        preg['delta_bases'] = bases[0]
+    return preguntas
+
+def escribir_tabla_delta(ws, fila, titulo, opciones, variables, valores, formato, ultima_columna, base=None):
+    """
+    Escribe una tabla de diferencias con la disposición de las tablas de
+    todos.py (encabezados de variables, una fila por opción). Si se indica
+    base (vector por columna) se agrega la fila de N al final.
+    Retorna la última fila escrita.
+    """
+    medium_side = Side(style='medium')
+    thin_gris = Side(style='thin', color='FFD0D0D0')
+
+    ws.cell(row=fila, column=1, value=titulo)
+    ws.cell(row=fila, column=1).font = Font(bold=True)
+    fila_datos = escribir_encabezados(ws, fila + 1, variables, medium_side, ultima_columna)
+
+    filas = [(opcion, valores[i], False) for i, opcion in enumerate(opciones)]
+    if base is not None:
+        filas.append(('N (base)', base, True))
+
+    for idx_fila, (etiqueta, fila_valores, es_base) in enumerate(filas):
+        es_primera_fila = (idx_fila == 0)
+        es_ultima_fila = (idx_fila == len(filas) - 1)
+        if es_base:
+            superior = medium_side
+        else:
+            superior = Side(style='medium' if es_primera_fila else 'thin', color='FFD0D0D0')
+        inferior = medium_side if es_ultima_fila else thin_gris
+
+        ws.cell(row=fila_datos, column=1, value=etiqueta)
+        ws.cell(row=fila_datos, column=1).border = Border(left=thin_gris, right=thin_gris, top=superior, bottom=inferior)
+        ws.cell(row=fila_datos, column=1).alignment = Alignment(horizontal='left', vertical='center')
+        if es_base:
+            ws.cell(row=fila_datos, column=1).font = Font(italic=True)
+
+        col_actual = 2
+        ws.cell(row=fila_datos, column=col_actual, value=float(fila_valores[0]))
+        ws.cell(row=fila_datos, column=col_actual).number_format = formato if not es_base else FORMATO_DELTA_CONTEO
+        ws.cell(row=fila_datos, column=col_actual).border = Border(
+            left=medium_side, right=medium_side, top=superior, bottom=inferior
+        )
+        ws.cell(row=fila_datos, column=col_actual).alignment = Alignment(horizontal='center', vertical='center')
+        col_actual += 1
+
+        for var_nombre, var_info in variables.items():
+            num_cats = len(var_info['categorias'])
+            for i in range(num_cats):
+                es_primera = (i == 0)
+                es_ultima = (i == num_cats - 1)
+                celda = ws.cell(row=fila_datos, column=col_actual, value=float(fila_valores[col_actual - 2]))
+                celda.number_format = formato if not es_base else FORMATO_DELTA_CONTEO
+                celda.border = Border(
+                    left=Side(style='medium' if es_primera else 'thin', color='FFD0D0D0'),
+                    right=medium_side if col_actual == ultima_columna else Side(style='medium' if es_ultima else 'thin', color='FFD0D0D0'),
+                    top=superior,
+                    bottom=inferior
+                )
+                celda.alignment = Alignment(horizontal='center', vertical='center')
+                col_actual += 1
+
+        fila_datos += 1
+
+    return fila_datos - 1
+
+def generar_hoja_delta(wb, comparacion, variables, etiqueta_anterior, etiqueta_actual):
+    """
+    Genera la hoja de diferencias de una pregunta: título, tabla de
+    diferencias en conteos (con la fila de N) y tabla de diferencias en
+    puntos porcentuales.
+    """
+    ws = wb.create_sheet(title=f"P{comparacion['num']}")
+    thin_side = Side(style='thin', color='FFD0D0D0')
+    medium_side = Side(style='medium')
+    fill_fila1 = PatternFill(start_color='FFD9E1F2', end_color='FFD9E1F2', fill_type='solid')
+
+    total_columnas = 2 + sum(len(var_info['categorias']) for var_info in variables.values())
+    ultima_columna = total_columnas
+
+    # Fila 1: Título de la pregunta
+    ws.cell(row=1, column=1, value=comparacion['columna'])
+    ws.cell(row=1, column=1).font = Font(bold=True, size=14)
+    ws.cell(row=1, column=1).alignment = Alignment(horizontal='left', vertical='center')
+    ws.cell(row=1, column=1).fill = fill_fila1
+    ws.merge_cells(start_row=1, start_column=1, end_row=1, end_column=total_columnas)
+    ws.cell(row=1, column=1).border = Border(left=medium_side, right=medium_side, top=medium_side, bottom=thin_side)
+    ws.cell(row=1, column=ultima_columna).border = Border(right=medium_side)
+
+    # Fila 2: olas comparadas
+    ws.cell(row=2, column=1, value=f"{etiqueta_actual} − {etiqueta_anterior}")
+    ws.cell(row=2, column=1).font = Font(italic=True)
+
+    fila = escribir_tabla_delta(
+        ws, 4, "DIFERENCIA EN CONTEOS", comparacion['opciones'], variables,
+        comparacion['delta_conteos'], FORMATO_DELTA_CONTEO, ultima_columna, comparacion['delta_bases']
+    )
+    escribir_tabla_delta(
+        ws, fila + 3, "DIFERENCIA EN PUNTOS PORCENTUALES", comparacion['opciones'], variables,
+        comparacion['delta_puntos'] / 100, FORMATO_DELTA_PUNTOS, ultima_columna
+    )
+
+    # Ajustar ancho de columnas
+    ws.column_dimensions['A'].width = 30
+    for col_idx in range(2, total_columnas + 1):
+        ws.column_dimensions[get_column_letter(col_idx)].width = 12
+
+def generar_comparacion(archivo_anterior, archivo_actual, archivo_salida='Todos-Cruzado-Comparativo.xlsx'):
+    """
+    Función principal: carga los resultados de las dos olas, calcula las
+    diferencias y genera el libro comparativo.
+    """
+    resultados = []
+    for archivo in (archivo_anterior, archivo_actual):
+        print(f"Leyendo resultados: {archivo}")
+        if not os.path.exists(archivo):
+            print(f"ERROR: No se encontró el archivo {archivo}")
+            sys.exit(1)
+        try:
+            resultados.append(cargar_resultados(archivo))
+        except Exception as e:
+            print(f"ERROR al leer los resultados: {e}")
+            sys.exit(1)
+    (anterior, variables_anterior), (actual, variables_actual) = resultados
+    print(f"  Ola anterior: {anterior['total_registros']} registros")
+    print(f"  Ola actual: {actual['total_registros']} registros")
+
+    comparaciones = comparar_olas(anterior, variables_anterior, actual, variables_actual)
+    print(f"Preguntas comparadas: {len(comparaciones)}")
+
+    etiqueta_anterior = os.path.splitext(os.path.basename(archivo_anterior))[0]
+    etiqueta_actual = os.path.splitext(os.path.basename(archivo_actual))[0]
+    wb = Workbook()
+    wb.remove(wb.active)
+    for comparacion in comparaciones:
+        generar_hoja_delta(wb, comparacion, variables_actual, etiqueta_anterior, etiqueta_actual)
+
+    print(f"Guardando archivo comparativo: {archivo_salida}")
+    try:
+        wb.save(archivo_salida)
+        print(f"✓ Archivo generado exitosamente: {archivo_salida}")
+        print(f"  Total de hojas generadas: {len(wb.worksheets)}")
+    except Exception as e:
+        print(f"ERROR al guardar el archivo: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Uso: python comparativo.py resultados_anterior.npz resultados_actual.npz [archivo_salida]")
+        sys.exit(1)
+    archivo_salida = sys.argv[3] if len(sys.argv) > 3 else 'Todos-Cruzado-Comparativo.xlsx'
+
+    print("=" * 80)
+    print("COMPARACIÓN ENTRE OLAS")
+    print("=" * 80)
+    print()
+
+    generar_comparacion(sys.argv[1], sys.argv[2], archivo_salida)
+
+    print()
+    print("=" * 80)
+    print("Proceso completado exitosamente")
+    print("=" * 80)
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cubo de conteos precalculado sobre las dimensiones demográficas.
+
+Paso de construcción que agrega la encuesta codificada en un cubo disperso
+por pregunta: patrón de opciones × P37 × Rango_Edad × P40 × P38 × P9 ×
+Region_Oficina × Region_Aduana. El cubo se guarda en disco (.npz) y
+cualquier tabla existente, o cualquier combinación anidada de esas
+dimensiones, se obtiene sumando celdas del cubo sin volver a recorrer los
+registros.
+
+Cada dimensión se guarda como patrones de pertenencia (patrón × categorías),
+de modo que las columnas con combinaciones múltiples se suman sin contar dos
+veces a un mismo registro. El patrón de la pregunta incluye además una
+columna que indica si el registro respondió la pregunta (base de los
+totales por categoría).
+
+Uso:
+    python cubo.py [archivo_entrada] [archivo_cubo]
+
+Autor: Generado automáticamente
+Fecha: 2025
+"""
+
+import pandas as pd
+import numpy as np
+import json
+import os
+import sys
+
+from motor_cruces import (
+    codificar_patrones, predicado_contiene, predicado_de_variable, predicado_igualdad
+)
+from todos import (
+    VARIABLES_CRUCE, agregar_columnas_derivadas, detectar_combinaciones_multiples,
+    listar_preguntas, mascara_poblacion, obtener_opciones_unicas
+)
+
+VERSION_CUBO = 1
+
+# Dimensiones del cubo (nombres de VARIABLES_CRUCE)
+DIMENSIONES_CUBO = [
+    'P37 Género', 'Rango de edad', 'P40 Nivel académico', 'P38 Etnia',
+    'P9 Personería', 'Oficina/Agencia/Delegación', 'Aduana'
+]
+
+def construir_cubo(df, dimensiones=DIMENSIONES_CUBO, variables=VARIABLES_CRUCE):
+    """
+    Construye el cubo disperso de conteos para todas las preguntas desde P3.
+
+    Retorna un diccionario con:
+        version, total_registros
+        dimensiones: lista de {nombre, columna, categorias, patrones}
+        preguntas: {pregunta_col: {num, opciones, tiene_combinaciones,
+                    patrones, celdas, conteos}}
+    Cada fila de 'celdas' es (patrón de la pregunta, código de cada dimensión)
+    y 'conteos' el número de registros de esa combinación.
+    """
+    df_base = agregar_columnas_derivadas(df.copy())
+
+    # Codificar las dimensiones una sola vez sobre todos los registros
+    dims = []
+    codigos_dims = []
+    for nombre in dimensiones:
+        var_info = variables[nombre]
+        codigos, patrones = codificar_patrones(
+            df_base[var_info['columna']], var_info['categorias'], predicado_de_variable(var_info)
+        )
+        dims.append({
+            'nombre': nombre,
+            'columna': var_info['columna'],
+            'categorias': list(var_info['categorias']),
+            'patrones': patrones
+        })
+        codigos_dims.append(codigos)
+    codigos_dims = np.column_stack(codigos_dims) if codigos_dims else np.zeros((len(df), 0), dtype=np.int64)
+
+    preguntas = {}
+    for _, pregunta_col, num_str in listar_preguntas(df):
+        tiene_combinaciones = detectar_combinaciones_multiples(df, pregunta_col)
+        opciones = obtener_opciones_unicas(df, pregunta_col, tiene_combinaciones)
+        if len(opciones) == 0:
+            continue
+
+        predicado = predicado_contiene if tiene_combinaciones else predicado_igualdad
+        codigos_q, patrones_q = codificar_patrones(
+            df[pregunta_col], opciones, predicado, incluir_respuesta=True
+        )
+
+        # Población de la pregunta (P6, P7 y P8 son condicionales)
+        mask_p3, _ = mascara_poblacion(df, pregunta_col)
+        filas = slice(None) if mask_p3 is None else mask_p3.to_numpy()
+
+        claves = np.column_stack([codigos_q[filas], codigos_dims[filas]])
+        if len(claves):
+            celdas, conteos = np.unique(claves, axis=0, return_counts=True)
+        else:
+            celdas, conteos = claves, np.zeros(0, dtype=np.int64)
+
+        preguntas[pregunta_col] = {
+            'num': num_str,
+            'opciones': opciones,
+            'tiene_combinaciones': bool(tiene_combinaciones),
+            'patrones': patrones_q,
+            'celdas': celdas.astype(np.int32),
+            'conteos': conteos.astype(np.int64)
+        }
+
+    return {
+        'version': VERSION_CUBO,
+        'total_registros': len(df),
+        'dimensiones': dims,
+        'preguntas': preguntas
+    }
+
+def guardar_cubo(cubo, archivo):
+    """
+    Guarda el cubo en un archivo .npz comprimido: arreglos por pregunta y
+    dimensión, más los vocabularios (opciones y categorías) como JSON.
+    """
+    arreglos = {}
+    metadatos = {
+        'version': cubo['version'],
+        'total_registros': cubo['total_registros'],
+        'dimensiones': [],
+        'preguntas': []
+    }
+    for j, dim in enumerate(cubo['dimensiones']):
+        metadatos['dimensiones'].append({
+            'nombre': dim['nombre'], 'columna': dim['columna'], 'categorias': dim['categorias']
+        })
+        arreglos[f'dim{j}_patrones'] = dim['patrones']
+    for i, (pregunta_col, preg) in enumerate(cubo['preguntas'].items()):
+        metadatos['preguntas'].append({
+            'columna': pregunta_col,
+            'num': preg['num'],
+            'opciones': preg['opciones'],
+            'tiene_combinaciones': preg['tiene_combinaciones']
+        })
+        arreglos[f'preg{i}_patrones'] = preg['patrones']
+        arreglos[f'preg{i}_celdas'] = preg['celdas']
+        arreglos[f'preg{i}_conteos'] = preg['conteos']
+    arreglos['metadatos'] = np.array(json.dumps(metadatos, ensure_ascii=False, default=str))
+
+    with open(archivo, 'wb') as f:
+        np.savez_compressed(f, **arreglos)
+
+def cargar_cubo(archivo):
+    """
+    Carga un cubo guardado con guardar_cubo.
+    """
+    with np.load(archivo, allow_pickle=False) as datos:
+        metadatos = json.loads(str(datos['metadatos']))
+        if metadatos['version'] != VERSION_CUBO:
+            raise ValueError(
+                f"Versión de cubo no soportada: {metadatos['version']} (se esperaba {VERSION_CUBO})"
+            )
+        dims = []
+        for j, dim in enumerate(metadatos['dimensiones']):
+            dims.append(dict(dim, patrones=datos[f'dim{j}_patrones']))
+        preguntas = {}
+        for i, preg in enumerate(metadatos['preguntas']):
+            preguntas[preg['columna']] = {
+                'num': preg['num'],
+                'opciones': preg['opciones'],
+                'tiene_combinaciones': preg['tiene_combinaciones'],
+                'patrones': datos[f'preg{i}_patrones'],
+                'celdas': datos[f'preg{i}_celdas'],
+                'conteos': datos[f'preg{i}_conteos']
+            }
+    return {
+        'version': metadatos['version'],
+        'total_registros': metadatos['total_registros'],
+        'dimensiones': dims,
+        'preguntas': preguntas
+    }
+
+def pesos_filtro(cubo, pregunta_col, filtros=None):
+    """
+    Conteos de las celdas de una pregunta que cumplen los filtros.
+    filtros: {nombre de dimensión: índices de categorías}; una celda cumple
+    si su patrón incluye alguna de las categorías de cada dimensión filtrada.
+    """
+    preg = cubo['preguntas'][pregunta_col]
+    conteos = preg['conteos']
+    if not filtros:
+        return conteos
+    posiciones = {dim['nombre']: j for j, dim in enumerate(cubo['dimensiones'])}
+    cumple = np.ones(len(conteos), dtype=bool)
+    for nombre, indices in filtros.items():
+        j = posiciones[nombre]
+        patrones = cubo['dimensiones'][j]['patrones']
+        cumple &= patrones[preg['celdas'][:, j + 1]][:, list(indices)].any(axis=1)
+    return np.where(cumple, conteos, 0)
+
+def consultar_cubo(cubo, pregunta_col, dimensiones=(), filtros=None, pesos=None):
+    """
+    Suma las celdas del cubo de una pregunta conservando las dimensiones indicadas.
+
+    Retorna un arreglo de forma (opciones + 1) × K1 × K2 × ...; la última fila
+    cuenta los registros con respuesta a la pregunta. Las demás dimensiones
+    se suman completas (incluyendo registros fuera de sus categorías).
+    filtros: restringe los registros a categorías de otras dimensiones (ver
+    pesos_filtro); pesos: los conteos ya filtrados, para no repetir el filtro
+    en cada consulta de la misma pregunta.
+    """
+    preg = cubo['preguntas'][pregunta_col]
+    posiciones = {dim['nombre']: j for j, dim in enumerate(cubo['dimensiones'])}
+    conteos = pesos if pesos is not None else pesos_filtro(cubo, pregunta_col, filtros)
+
+    factores = [preg['patrones']]
+    ejes = [preg['celdas'][:, 0]]
+    for nombre in dimensiones:
+        j = posiciones[nombre]
+        factores.append(cubo['dimensiones'][j]['patrones'])
+        ejes.append(preg['celdas'][:, j + 1])
+
+    # Agrupar las celdas por combinación de patrones con un solo bincount
+    tamanos = tuple(f.shape[0] for f in factores)
+    indice = np.ravel_multi_index(ejes, tamanos) if len(conteos) else np.zeros(0, dtype=np.int64)
+    agregado = np.bincount(
+        indice, weights=conteos, minlength=int(np.prod(tamanos))
+    ).reshape(tamanos)
+
+    # Expandir cada patrón a sus categorías: agregado × patrones de cada eje,
+    # un producto de matrices por eje
+    resultado = agregado
+    for eje, factor in enumerate(factores):
+        resultado = np.moveaxis(np.tensordot(resultado, factor.astype(np.float64), axes=([eje], [0])), -1, eje)
+    return np.rint(resultado).astype(np.int64)
+
+def tabla_desde_cubo(cubo, pregunta_col, variables, filtros=None):
+    """
+    Obtiene del cubo la misma tabla que calcular_tabla_cruzada para las
+    variables indicadas (todas deben ser dimensiones del cubo; los grupos
+    anidados se leen conservando sus dos dimensiones).
+    filtros: ver pesos_filtro.
+    """
+    pesos = pesos_filtro(cubo, pregunta_col, filtros)
+    marginal = consultar_cubo(cubo, pregunta_col, pesos=pesos)
+    conteos = {}
+    totales_categoria = {}
+    for var_nombre, var_info in variables.items():
+        if 'niveles' in var_info:
+            # Grupo anidado: conservar ambas dimensiones y aplanar externa × interna
+            tabla = consultar_cubo(cubo, pregunta_col, [var_info['externa'], var_info['interna']], pesos=pesos)
+            tabla = tabla.reshape(len(tabla), -1)
+        else:
+            tabla = consultar_cubo(cubo, pregunta_col, [var_nombre], pesos=pesos)
+        conteos[var_nombre] = tabla[:-1]
+        totales_categoria[var_nombre] = tabla[-1]
+
+    return {
+        'totales_opcion': marginal[:-1],
+        'conteos': conteos,
+        'totales_categoria': totales_categoria,
+        'total_general': int(pesos.sum())
+    }
+
+def generar_cubo(archivo_entrada='V3.xlsx', archivo_cubo='Todos-Cruzado-Cubo.npz'):
+    """
+    Función principal: lee la encuesta, construye el cubo y lo guarda en disco.
+    """
+    print(f"Leyendo archivo: {archivo_entrada}")
+
+    if not os.path.exists(archivo_entrada):
+        print(f"ERROR: No se encontró el archivo {archivo_entrada}")
+        sys.exit(1)
+
+    try:
+        df = pd.read_excel(archivo_entrada)
+        print(f"Archivo leído exitosamente. Total de registros: {len(df)}")
+    except Exception as e:
+        print(f"ERROR al leer el archivo: {e}")
+        sys.exit(1)
+
+    print("Construyendo cubo de conteos...")
+    cubo = construir_cubo(df)
+    total_celdas = sum(len(preg['conteos']) for preg in cubo['preguntas'].values())
+    print(f"  Dimensiones: {', '.join(dim['nombre'] for dim in cubo['dimensiones'])}")
+    print(f"  Preguntas: {len(cubo['preguntas'])}")
+    print(f"  Celdas no vacías: {total_celdas}")
+
+    print(f"Guardando cubo: {archivo_cubo}")
+    try:
+        guardar_cubo(cubo, archivo_cubo)
+        print(f"✓ Cubo generado exitosamente: {archivo_cubo}")
+    except Exception as e:
+        print(f"ERROR al guardar el cubo: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    archivo_entrada = sys.argv[1] if len(sys.argv) > 1 else 'V3.xlsx'
+    archivo_cubo = sys.argv[2] if len(sys.argv) > 2 else 'Todos-Cruzado-Cubo.npz'
+
+    print("=" * 80)
+    print("CONSTRUCCIÓN DEL CUBO DE CONTEOS")
+    print("=" * 80)
+    print()
+
+    generar_cubo(archivo_entrada, archivo_cubo)
+
+    print()
+    print("=" * 80)
+    print("Proceso completado exitosamente")
+    print("=" * 80)
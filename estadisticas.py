@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Estadísticas de asociación para las tablas cruzadas ya calculadas.
+
+Toma las matrices de conteos que entrega el motor (pregunta × variable de
+cruce) y calcula chi-cuadrado, p-valor y V de Cramér para todas las tablas a
+la vez: las tablas se rellenan con ceros en un solo arreglo
+tablas × filas × columnas y cada estadístico es una operación de NumPy.
+No se vuelve a leer la encuesta.
+
+El p-valor se obtiene con la función gamma incompleta regularizada
+(serie para x < a + 1, fracción continua en otro caso), también vectorizada.
+
+Autor: Generado automáticamente
+Fecha: 2025
+"""
+
+import math
+import numpy as np
+
+ITERACIONES_GAMMA = 300
+
+def gamma_incompleta_superior(a, x):
+    """
+    Q(a, x) = Γ(a, x) / Γ(a), regularizada, para arreglos a > 0 y x >= 0.
+    """
+    a = np.asarray(a, dtype=np.float64)
+    x = np.asarray(x, dtype=np.float64)
+    log_gamma = np.array([math.lgamma(v) for v in a.ravel()]).reshape(a.shape)
+    # Factor común x^a e^-x / Γ(a), en escala logarítmica
+    with np.errstate(divide='ignore'):
+        log_factor = a * np.log(x) - x - log_gamma
+    factor = np.exp(log_factor)
+
+    usar_serie = x < a + 1
+    # Ambas ramas se evalúan para todos los elementos; se descarta la que no aplica
+    with np.errstate(over='ignore', invalid='ignore', divide='ignore'):
+        # Serie: P(a, x) = factor * Σ x^n / (a (a+1) ... (a+n))
+        termino = 1.0 / a
+        suma = termino.copy()
+        for n in range(1, ITERACIONES_GAMMA):
+            termino = termino * x / (a + n)
+            suma = suma + termino
+        q_serie = 1.0 - factor * suma
+
+        # Fracción continua (Lentz modificado) para Q(a, x)
+        minimo = 1e-300
+        b = x + 1.0 - a
+        c = np.full_like(x, 1.0 / minimo)
+        d = 1.0 / np.where(np.abs(b) < minimo, minimo, b)
+        h = d.copy()
+        for i in range(1, ITERACIONES_GAMMA):
+            an = -i * (i - a)
+            b = b + 2.0
+            d = an * d + b
+            d = np.where(np.abs(d) < minimo, minimo, d)
+            c = b + an / c
+            c = np.where(np.abs(c) < minimo, minimo, c)
+            d = 1.0 / d
+            h = h * d * c
+        q_fraccion = factor * h
+
+    resultado = np.where(usar_serie, q_serie, q_fraccion)
+    return np.clip(np.where(x <= 0, 1.0, resultado), 0.0, 1.0)
+
+def p_valor_chi2(chi2, grados_libertad):
+    """P(X > chi2) para una chi-cuadrado con los grados de libertad indicados."""
+    chi2 = np.asarray(chi2, dtype=np.float64)
+    grados_libertad = np.asarray(grados_libertad, dtype=np.float64)
+    p = np.ones_like(chi2)
+    validos = grados_libertad > 0
+    if validos.any():
+        p[validos] = gamma_incompleta_superior(grados_libertad[validos] / 2.0, chi2[validos] / 2.0)
+    return p
+
+def apilar_tablas(matrices):
+    """
+    Rellena con ceros una lista de matrices de conteos en un solo arreglo
+    tablas × max_filas × max_columnas.
+    """
+    max_filas = max((m.shape[0] for m in matrices), default=0)
+    max_columnas = max((m.shape[1] for m in matrices), default=0)
+    apiladas = np.zeros((len(matrices), max_filas, max_columnas), dtype=np.float64)
+    for t, m in enumerate(matrices):
+        apiladas[t, :m.shape[0], :m.shape[1]] = m
+    return apiladas
+
+def calcular_asociaciones(matrices):
+    """
+    Calcula chi-cuadrado, grados de libertad, p-valor y V de Cramér para una
+    lista de matrices de conteos. Las filas y columnas vacías no cuentan para
+    los grados de libertad ni para la regla de Cochran.
+
+    Retorna un diccionario de arreglos (uno por tabla):
+        n, chi2, grados_libertad, p_valor, v_cramer,
+        esperados_bajos: proporción de celdas con frecuencia esperada < 5
+    """
+    observados = apilar_tablas(matrices)
+    suma_filas = observados.sum(axis=2)
+    suma_columnas = observados.sum(axis=1)
+    n = suma_filas.sum(axis=1)
+
+    # Esperados bajo independencia: fila * columna / n
+    with np.errstate(divide='ignore', invalid='ignore'):
+        esperados = suma_filas[:, :, None] * suma_columnas[:, None, :] / n[:, None, None]
+        contribuciones = np.where(esperados > 0, (observados - esperados) ** 2 / esperados, 0.0)
+    chi2 = contribuciones.sum(axis=(1, 2))
+
+    filas = (suma_filas > 0).sum(axis=1)
+    columnas = (suma_columnas > 0).sum(axis=1)
+    grados_libertad = np.maximum(filas - 1, 0) * np.maximum(columnas - 1, 0)
+
+    # Regla de Cochran: proporción de celdas (de filas y columnas no vacías)
+    # con frecuencia esperada menor que 5
+    celdas = filas * columnas
+    esperados_bajos = ((esperados < 5) & (suma_filas[:, :, None] > 0) & (suma_columnas[:, None, :] > 0)).sum(axis=(1, 2))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        proporcion_esperados_bajos = np.where(celdas > 0, esperados_bajos / np.maximum(celdas, 1), 0.0)
+
+    dimension_menor = np.minimum(filas, columnas) - 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        v_cramer = np.where(
+            (dimension_menor > 0) & (n > 0), np.sqrt(chi2 / (n * np.maximum(dimension_menor, 1))), 0.0
+        )
+
+    return {
+        'n': n.astype(np.int64),
+        'chi2': chi2,
+        'grados_libertad': grados_libertad,
+        'p_valor': p_valor_chi2(chi2, grados_libertad),
+        'v_cramer': v_cramer,
+        'esperados_bajos': proporcion_esperados_bajos
+    }
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Explorador interactivo de cruces en la terminal.
+
+Carga una sola vez el cubo de conteos precalculado (cubo.py) y responde
+comandos con tablas de texto alineadas, sin volver a leer la encuesta:
+
+    mostrar P35 por Region_Oficina      (también: show P35 by Region_Oficina)
+    filtrar P37=M                       (también: filter P37=M)
+    asociaciones [N]                    (también: top associations [N])
+    filtros | limpiar [VARIABLE] | preguntas | variables | ayuda | salir
+
+Las variables se indican por su nombre de grupo ('P37 Género'), su columna
+('Region_Oficina') o el prefijo del grupo ('P37'). Las categorías y los
+porcentajes son los de VARIABLES_CRUCE y de la política de redondeo de
+todos.py, de modo que sin filtros las cifras coinciden con los reportes.
+Solo se pueden cruzar y filtrar las dimensiones del cubo.
+
+Uso:
+    python explorador.py [archivo_cubo]
+
+Autor: Generado automáticamente
+Fecha: 2025
+"""
+
+import numpy as np
+import os
+import sys
+import time
+
+from cubo import cargar_cubo, tabla_desde_cubo
+from estadisticas import calcular_asociaciones
+from porcentajes import calcular_porcentajes
+from todos import VARIABLES_CRUCE, cruza_consigo_misma
+
+ANCHO_OPCION = 45
+
+AYUDA = """Comandos:
+  mostrar PREGUNTA [por VARIABLE]   tabla de conteos y porcentajes (show ... by ...)
+  filtrar VARIABLE=CATEGORIA        restringe los registros (filter)
+  filtros                           filtros activos
+  limpiar [VARIABLE]                quita uno o todos los filtros (clear)
+  asociaciones [N]                  las N asociaciones más fuertes (top associations)
+  preguntas                         preguntas del cubo (questions)
+  variables                         variables de cruce y sus categorías
+  ayuda                             esta ayuda (help)
+  salir                             termina (quit, exit)"""
+
+def resolver_variable(cubo, texto):
+    """Nombre de la dimensión del cubo por nombre, columna o prefijo del grupo."""
+    texto_min = texto.strip().lower()
+    for dim in cubo['dimensiones']:
+        if texto_min in (dim['nombre'].lower(), dim['columna'].lower(), dim['nombre'].split()[0].lower()):
+            return dim['nombre']
+    disponibles = ', '.join(dim['columna'] for dim in cubo['dimensiones'])
+    raise ValueError(f"Variable no encontrada en el cubo: '{texto}'. Disponibles: {disponibles}")
+
+def resolver_categoria(cubo, nombre, texto):
+    """Índice de la categoría de una dimensión (exacta, sin mayúsculas o por prefijo único)."""
+    categorias = next(dim['categorias'] for dim in cubo['dimensiones'] if dim['nombre'] == nombre)
+    texto_min = texto.strip().lower()
+    for criterio in (lambda cat: cat == texto.strip(), lambda cat: cat.lower() == texto_min,
+                     lambda cat: cat.lower().startswith(texto_min)):
+        indices = [i for i, cat in enumerate(categorias) if criterio(cat)]
+        if len(indices) == 1:
+            return indices[0]
+    raise ValueError(f"Categoría no válida para {nombre}: '{texto}'. Opciones: {', '.join(categorias)}")
+
+def resolver_preguntas(cubo, texto):
+    """Columnas de la pregunta: por número (P35 incluye todas sus columnas) o por nombre completo."""
+    texto = texto.strip()
+    if texto in cubo['preguntas']:
+        return [texto]
+    columnas = [
+        pregunta_col for pregunta_col, preg in cubo['preguntas'].items()
+        if f"P{preg['num']}".lower() == texto.lower()
+    ]
+    if not columnas:
+        raise ValueError(f"Pregunta no encontrada en el cubo: '{texto}' (ver 'preguntas')")
+    return columnas
+
+def formatear_tabla(encabezados, filas, texto=(0,)):
+    """
+    Tabla de texto alineada: las columnas de texto (índices en 'texto') a la
+    izquierda y las numéricas a la derecha.
+    """
+    anchos = [max(len(str(fila[i])) for fila in [encabezados] + filas) for i in range(len(encabezados))]
+    lineas = []
+    for k, fila in enumerate([encabezados] + filas):
+        celdas = [
+            str(valor).ljust(ancho) if i in texto else str(valor).rjust(ancho)
+            for i, (valor, ancho) in enumerate(zip(fila, anchos))
+        ]
+        lineas.append('  '.join(celdas).rstrip())
+        if k == 0:
+            lineas.append('  '.join('-' * a for a in anchos))
+    return '\n'.join(lineas)
+
+def texto_conteo(valor):
+    return f"{valor:,.0f}"
+
+def texto_porcentaje(unidades):
+    """Igual que el reporte: "---" si el porcentaje redondeado es 0."""
+    return "---" if unidades == 0 else f"{unidades / 100:.2f}%"
+
+def tabla_cruce(estado, pregunta_col, var_nombre=None):
+    """Texto de la tabla de conteos y porcentajes de una pregunta (por una variable o solo el total)."""
+    cubo = estado['cubo']
+    preg = cubo['preguntas'][pregunta_col]
+    variables = {var_nombre: VARIABLES_CRUCE[var_nombre]} if var_nombre else {}
+    tabla = tabla_desde_cubo(cubo, pregunta_col, variables, estado['filtros'])
+    opciones = [str(opcion)[:ANCHO_OPCION] for opcion in preg['opciones']]
+
+    categorias = list(VARIABLES_CRUCE[var_nombre]['categorias']) if var_nombre else []
+    conteos = np.column_stack([tabla['totales_opcion']] + ([tabla['conteos'][var_nombre]] if var_nombre else []))
+    totales = np.concatenate([[tabla['total_general']]] + ([tabla['totales_categoria'][var_nombre]] if var_nombre else []))
+    porcentajes = np.column_stack(
+        [calcular_porcentajes(tabla['totales_opcion'], tabla['total_general'], base='total')['unidades']]
+        + ([calcular_porcentajes(conteos[:, 1:], totales[1:], base='vertical')['unidades']] if var_nombre else [])
+    )
+
+    encabezados = ['Opción', 'TOTAL'] + categorias
+    filas_conteo = [[opcion] + [texto_conteo(v) for v in fila] for opcion, fila in zip(opciones, conteos)]
+    filas_conteo.append(['TOTAL'] + [texto_conteo(v) for v in totales])
+    filas_porcentaje = [[opcion] + [texto_porcentaje(v) for v in fila] for opcion, fila in zip(opciones, porcentajes)]
+    filas_porcentaje.append(['TOTAL'] + [texto_porcentaje(v) for v in porcentajes.sum(axis=0)])
+
+    titulo = pregunta_col + (f" por {var_nombre}" if var_nombre else '')
+    return '\n'.join([
+        titulo, '', 'CONTEOS', formatear_tabla(encabezados, filas_conteo),
+        '', 'PORCENTAJES', formatear_tabla(encabezados, filas_porcentaje)
+    ])
+
+def calcular_ranking_asociaciones(estado):
+    """
+    Asociación de cada pregunta con cada dimensión del cubo, con el orden de
+    la hoja Asociaciones de todos.py: primero las significativas que cumplen
+    la regla de Cochran, cada bloque por V de Cramér descendente, y al final
+    las tablas de selección múltiple (chi-cuadrado no válido: nunca confiables).
+    Se guarda por combinación de filtros.
+    """
+    clave = tuple(sorted((nombre, tuple(indices)) for nombre, indices in estado['filtros'].items()))
+    if clave in estado['asociaciones']:
+        return estado['asociaciones'][clave]
+
+    cubo = estado['cubo']
+    variables = {dim['nombre']: VARIABLES_CRUCE[dim['nombre']] for dim in cubo['dimensiones']}
+    pares = []
+    matrices = []
+    for pregunta_col, preg in cubo['preguntas'].items():
+        tabla = tabla_desde_cubo(cubo, pregunta_col, variables, estado['filtros'])
+        for var_nombre, var_info in variables.items():
+            # Omitir la pregunta cruzada consigo misma (o con sus columnas derivadas)
+            if cruza_consigo_misma(pregunta_col, var_info):
+                continue
+            multiple = preg['tiene_combinaciones'] or var_info.get('usa_contains', False)
+            pares.append((pregunta_col, var_nombre, multiple))
+            matrices.append(tabla['conteos'][var_nombre])
+
+    resultados = calcular_asociaciones(matrices)
+    multiples = np.array([multiple for _, _, multiple in pares], dtype=bool)
+    cumplen = (resultados['p_valor'] < 0.05) & (resultados['esperados_bajos'] <= 0.2)
+    confiables = cumplen & ~multiples
+    orden = np.lexsort((-resultados['v_cramer'], ~cumplen, multiples))
+    ranking = [
+        (pares[k][0], pares[k][1], resultados['n'][k], resultados['chi2'][k], resultados['grados_libertad'][k],
+         resultados['p_valor'][k], resultados['v_cramer'][k], bool(confiables[k]), bool(multiples[k]))
+        for k in orden
+    ]
+    estado['asociaciones'][clave] = ranking
+    return ranking
+
+def texto_asociaciones(estado, cantidad):
+    ranking = calcular_ranking_asociaciones(estado)[:cantidad]
+    encabezados = ['#', 'Pregunta', 'Variable', 'N', 'Chi-cuadrado', 'gl', 'p-valor', 'V de Cramér', 'Confiable',
+                   'Múltiple']
+    filas = [
+        [str(k), pregunta_col[:ANCHO_OPCION], var_nombre, texto_conteo(n), f"{chi2:.2f}", str(int(gl)),
+         f"{p:.4f}", f"{v:.4f}", 'sí' if confiable else 'no', 'sí' if multiple else 'no']
+        for k, (pregunta_col, var_nombre, n, chi2, gl, p, v, confiable, multiple) in enumerate(ranking, start=1)
+    ]
+    return formatear_tabla(encabezados, filas, texto=(1, 2, 8, 9))
+
+def texto_filtros(estado):
+    if not estado['filtros']:
+        return 'Sin filtros'
+    categorias = {dim['nombre']: dim['categorias'] for dim in estado['cubo']['dimensiones']}
+    return '\n'.join(
+        f"  {nombre} = {' | '.join(categorias[nombre][i] for i in indices)}"
+        for nombre, indices in estado['filtros'].items()
+    )
+
+def comando_mostrar(estado, argumentos):
+    if not argumentos:
+        raise ValueError("Uso: mostrar PREGUNTA [por VARIABLE]")
+    separadores = [k for k, palabra in enumerate(argumentos) if palabra.lower() in ('por', 'by')]
+    if separadores:
+        pregunta = ' '.join(argumentos[:separadores[0]])
+        var_nombre = resolver_variable(estado['cubo'], ' '.join(argumentos[separadores[0] + 1:]))
+    else:
+        pregunta, var_nombre = ' '.join(argumentos), None
+    return '\n\n'.join(tabla_cruce(estado, col, var_nombre) for col in resolver_preguntas(estado['cubo'], pregunta))
+
+def comando_filtrar(estado, argumentos):
+    variable, separador, categoria = ' '.join(argumentos).partition('=')
+    if not separador:
+        raise ValueError("Uso: filtrar VARIABLE=CATEGORIA")
+    nombre = resolver_variable(estado['cubo'], variable)
+    estado['filtros'][nombre] = [resolver_categoria(estado['cubo'], nombre, categoria)]
+    return texto_filtros(estado)
+
+def comando_limpiar(estado, argumentos):
+    if argumentos:
+        estado['filtros'].pop(resolver_variable(estado['cubo'], ' '.join(argumentos)), None)
+    else:
+        estado['filtros'].clear()
+    return texto_filtros(estado)
+
+def comando_asociaciones(estado, argumentos):
+    argumentos = [palabra for palabra in argumentos if palabra.lower() not in ('asociaciones', 'associations')]
+    if len(argumentos) > 1 or (argumentos and not (argumentos[0].isdigit() and int(argumentos[0]) > 0)):
+        raise ValueError("Uso: asociaciones [N]")
+    return texto_asociaciones(estado, int(argumentos[0]) if argumentos else 10)
+
+def comando_preguntas(estado, argumentos):
+    return '\n'.join(
+        f"  P{preg['num']:<6} {pregunta_col}" for pregunta_col, preg in estado['cubo']['preguntas'].items()
+    )
+
+def comando_variables(estado, argumentos):
+    return '\n'.join(
+        f"  {dim['columna']:<16} {dim['nombre']:<28} {', '.join(dim['categorias'])}"
+        for dim in estado['cubo']['dimensiones']
+    )
+
+COMANDOS = {
+    'mostrar': comando_mostrar, 'show': comando_mostrar,
+    'filtrar': comando_filtrar, 'filter': comando_filtrar,
+    'filtros': lambda estado, argumentos: texto_filtros(estado), 'filters': lambda estado, argumentos: texto_filtros(estado),
+    'limpiar': comando_limpiar, 'clear': comando_limpiar,
+    'asociaciones': comando_asociaciones, 'top': comando_asociaciones,
+    'preguntas': comando_preguntas, 'questions': comando_preguntas,
+    'variables': comando_variables,
+    'ayuda': lambda estado, argumentos: AYUDA, 'help': lambda estado, argumentos: AYUDA
+}
+
+def ejecutar_comando(estado, linea):
+    """
+    Ejecuta una línea de comando. Retorna el texto a mostrar, o None para salir.
+    """
+    palabras = linea.split()
+    if not palabras:
+        return ''
+    nombre = palabras[0].lower()
+    if nombre in ('salir', 'quit', 'exit'):
+        return None
+    if nombre not in COMANDOS:
+        return f"Comando desconocido: '{palabras[0]}' (ver 'ayuda')"
+    try:
+        return COMANDOS[nombre](estado, palabras[1:])
+    except ValueError as e:
+        return f"ERROR: {e}"
+
+def explorar(archivo_cubo='Todos-Cruzado-Cubo.npz'):
+    """
+    Función principal: carga el cubo y atiende comandos hasta 'salir' o fin
+    de la entrada (también acepta comandos por tubería).
+    """
+    if not os.path.exists(archivo_cubo):
+        print(f"ERROR: No se encontró el cubo {archivo_cubo} (se genera con: python cubo.py V3.xlsx {archivo_cubo})")
+        sys.exit(1)
+
+    inicio = time.perf_counter()
+    try:
+        cubo = cargar_cubo(archivo_cubo)
+    except Exception as e:
+        print(f"ERROR al cargar el cubo: {e}")
+        sys.exit(1)
+    print(f"Cubo cargado: {archivo_cubo} ({cubo['total_registros']} registros, "
+          f"{len(cubo['preguntas'])} preguntas) en {(time.perf_counter() - inicio) * 1000:.0f} ms")
+    print("Escriba 'ayuda' para ver los comandos.")
+
+    try:
+        import readline  # noqa: F401 (historial y edición de línea, si está disponible)
+    except ImportError:
+        pass
+
+    estado = {'cubo': cubo, 'filtros': {}, 'asociaciones': {}}
+    while True:
+        try:
+            linea = input('\nsat> ')
+        except (EOFError, KeyboardInterrupt):
+            print()
+            break
+        inicio = time.perf_counter()
+        try:
+            salida = ejecutar_comando(estado, linea)
+        except Exception as e:
+            salida = f"ERROR: {e}"
+        if salida is None:
+            break
+        if salida:
+            print(salida)
+            print(f"({(time.perf_counter() - inicio) * 1000:.1f} ms)")
+
+if __name__ == "__main__":
+    explorar(sys.argv[1] if len(sys.argv) > 1 else 'Todos-Cruzado-Cubo.npz')
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filtros de subpoblación (--where) para los reportes.
+
+Una expresión como
+
+    P9 = 'h. Importador'
+    Region_Aduana is not null and P37 in ('H', 'M')
+    "P36 - Edad" >= 30 or not (P3 ~ 'Presencial')
+
+se compila una sola vez en una máscara booleana de registros. Cada
+condición se evalúa sobre los valores únicos de su columna (pd.factorize)
+y se expande a los registros por el código de cada uno, igual que el motor
+de conteo; la máscara se combina después con las reglas de población de
+P6, P7 y P8 sin copiar el DataFrame.
+
+Campos: nombre de la columna (entre comillas dobles o `...` si tiene
+espacios), nombre o prefijo del grupo de la variable de cruce ('P37 Género',
+'P9') o prefijo de la pregunta ('P43' para 'P43 - Tipo de Punto'). Para las
+columnas de las variables de cruce, '=' usa la misma condición que el
+reporte (en P3 y P39, contiene la categoría).
+
+Operadores: = != < <= > >= ~ (contiene el texto), in (...), not in (...),
+is null, is not null, and, or, not y paréntesis. Los valores de texto van
+entre comillas simples.
+
+Vacíos: como en SQL, un registro vacío en la columna no cumple ninguna
+comparación (=, !=, <, ~, in ni not in); solo 'is null' lo selecciona. 'not'
+delante de una condición sí lo incluye: not (P37 = 'H') toma los vacíos.
+
+Autor: Generado automáticamente
+Fecha: 2025
+"""
+
+import pandas as pd
+import numpy as np
+import operator
+import re
+
+from motor_cruces import predicado_de_variable, predicado_igualdad
+
+PATRON_SIMBOLO = re.compile(r"""
+    \s*(?:
+        (?P<texto>'(?:[^']|'')*')                 # valor: 'texto' ('' escapa la comilla)
+      | (?P<campo>"[^"]*"|`[^`]*`)                # campo con espacios
+      | (?P<operador>!=|<=|>=|=|<|>|~|\(|\)|,)
+      | (?P<palabra>[^\s()=!<>~,'"`]+)
+    )""", re.VERBOSE)
+
+COMPARACIONES = {
+    '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge
+}
+
+def separar_simbolos(expresion):
+    """Lista de (tipo, valor) de la expresión."""
+    simbolos = []
+    posicion = 0
+    expresion = expresion.rstrip()
+    while posicion < len(expresion):
+        coincidencia = PATRON_SIMBOLO.match(expresion, posicion)
+        if coincidencia is None or coincidencia.end() == posicion:
+            raise ValueError(f"No se entiende el filtro a partir de: {expresion[posicion:]!r}")
+        tipo = coincidencia.lastgroup
+        valor = coincidencia.group(tipo)
+        if tipo == 'texto':
+            valor = valor[1:-1].replace("''", "'")
+        elif tipo == 'campo':
+            valor = valor[1:-1]
+        simbolos.append((tipo, valor))
+        posicion = coincidencia.end()
+    return simbolos
+
+def resolver_campo(nombre, df, variables):
+    """
+    Columna de df y condición de '=' para un campo del filtro: columna
+    exacta, grupo de variable de cruce o prefijo de pregunta ('P9').
+    """
+    por_columna = {info['columna']: info for info in variables.values() if 'columna' in info}
+    if nombre in df.columns:
+        columna = nombre
+    else:
+        grupos = [info['columna'] for grupo, info in variables.items()
+                  if 'columna' in info and nombre.lower() in (grupo.lower(), grupo.split()[0].lower())]
+        prefijos = [col for col in df.columns if str(col).split(' - ')[0].lower() == nombre.lower()]
+        candidatos = grupos or prefijos
+        if len(candidatos) != 1:
+            detalle = f" (coincide con: {', '.join(candidatos)})" if candidatos else ''
+            raise ValueError(f"Campo del filtro no válido: '{nombre}'{detalle}")
+        columna = candidatos[0]
+    info = por_columna.get(columna)
+    return columna, predicado_de_variable(info) if info is not None else predicado_igualdad
+
+def valores_comparables(unicos, texto):
+    """
+    Valores únicos y literal con el mismo tipo: números si la columna es
+    numérica, texto en otro caso.
+    """
+    if pd.api.types.is_numeric_dtype(unicos.dtype) and not pd.api.types.is_bool_dtype(unicos.dtype):
+        try:
+            return unicos, float(texto)
+        except ValueError:
+            raise ValueError(f"La columna es numérica y el valor no: '{texto}'")
+    return unicos.astype(str), str(texto)
+
+def compilar_filtro(expresion, df, variables=None):
+    """
+    Compila la expresión en una máscara booleana (arreglo de NumPy) sobre
+    los registros de df. variables: grupos de cruce (p. ej. VARIABLES_CRUCE)
+    para resolver nombres y condiciones.
+    """
+    variables = variables or {}
+    simbolos = separar_simbolos(expresion)
+    if not simbolos:
+        raise ValueError("El filtro está vacío")
+    codificadas = {}
+    posicion = [0]
+
+    def actual():
+        return simbolos[posicion[0]] if posicion[0] < len(simbolos) else (None, None)
+
+    def es_palabra(*palabras):
+        tipo, valor = actual()
+        return tipo == 'palabra' and valor.lower() in palabras
+
+    def avanzar():
+        simbolo = actual()
+        if simbolo[0] is None:
+            raise ValueError("El filtro termina antes de tiempo")
+        posicion[0] += 1
+        return simbolo
+
+    def esperar(operador):
+        tipo, valor = avanzar()
+        if tipo != 'operador' or valor != operador:
+            raise ValueError(f"Se esperaba '{operador}' y se encontró '{valor}'")
+
+    def codificar(columna):
+        # Cada columna se factoriza una sola vez aunque aparezca varias veces
+        if columna not in codificadas:
+            codigos, unicos = pd.factorize(df[columna])
+            codificadas[columna] = (np.asarray(codigos), pd.Series(unicos))
+        return codificadas[columna]
+
+    def expandir(columna, cumple_unicos, nulos=False):
+        codigos, _ = codificar(columna)
+        tabla = np.append(np.asarray(cumple_unicos, dtype=bool), nulos)
+        # El código -1 (vacío) toma la última posición de la tabla
+        return tabla[codigos]
+
+    def valor():
+        tipo, texto = avanzar()
+        if tipo not in ('texto', 'palabra'):
+            raise ValueError(f"Se esperaba un valor y se encontró '{texto}'")
+        return texto
+
+    def condicion():
+        tipo, nombre = avanzar()
+        if tipo not in ('campo', 'palabra'):
+            raise ValueError(f"Se esperaba un campo y se encontró '{nombre}'")
+        columna, predicado = resolver_campo(nombre, df, variables)
+        _, unicos = codificar(columna)
+
+        if es_palabra('is'):
+            avanzar()
+            negado = es_palabra('not')
+            if negado:
+                avanzar()
+            if not es_palabra('null'):
+                raise ValueError("Se esperaba 'null' después de 'is'")
+            avanzar()
+            nulos = expandir(columna, np.zeros(len(unicos), dtype=bool), nulos=True)
+            return ~nulos if negado else nulos
+
+        negado = es_palabra('not')
+        if negado:
+            avanzar()
+            if not es_palabra('in'):
+                raise ValueError("Se esperaba 'in' después de 'not'")
+        if es_palabra('in'):
+            avanzar()
+            esperar('(')
+            literales = [valor()]
+            while actual() == ('operador', ','):
+                avanzar()
+                literales.append(valor())
+            esperar(')')
+            cumple = np.zeros(len(unicos), dtype=bool)
+            for literal in literales:
+                cumple |= igual(unicos, literal, predicado)
+            # Igual que '!=': los vacíos no cumplen 'not in' (como en SQL)
+            return expandir(columna, ~cumple if negado else cumple)
+
+        tipo, operador_texto = avanzar()
+        if tipo != 'operador' or operador_texto not in ('=', '!=', '~', *COMPARACIONES):
+            raise ValueError(f"Operador no válido después de '{nombre}': '{operador_texto}'")
+        literal = valor()
+        if operador_texto == '=':
+            return expandir(columna, igual(unicos, literal, predicado))
+        if operador_texto == '!=':
+            # Los vacíos no son distintos de nada (como en SQL): quedan fuera
+            return expandir(columna, ~igual(unicos, literal, predicado))
+        if operador_texto == '~':
+            cumple = unicos.astype(str).str.contains(literal, regex=False).to_numpy(dtype=bool)
+            return expandir(columna, cumple)
+        numeros = pd.to_numeric(unicos, errors='coerce').to_numpy(dtype=np.float64)
+        try:
+            limite = float(literal)
+        except ValueError:
+            raise ValueError(f"'{operador_texto}' necesita un número y se encontró '{literal}'")
+        with np.errstate(invalid='ignore'):
+            return expandir(columna, COMPARACIONES[operador_texto](numeros, limite))
+
+    def factor():
+        if es_palabra('not'):
+            avanzar()
+            return ~factor()
+        if actual() == ('operador', '('):
+            avanzar()
+            mascara = disyuncion()
+            esperar(')')
+            return mascara
+        return condicion()
+
+    def conjuncion():
+        mascara = factor()
+        while es_palabra('and'):
+            avanzar()
+            mascara = mascara & factor()
+        return mascara
+
+    def disyuncion():
+        mascara = conjuncion()
+        while es_palabra('or'):
+            avanzar()
+            mascara = mascara | conjuncion()
+        return mascara
+
+    mascara = disyuncion()
+    if posicion[0] != len(simbolos):
+        raise ValueError(f"Sobra texto en el filtro desde: '{simbolos[posicion[0]][1]}'")
+    return mascara
+
+def igual(unicos, literal, predicado):
+    """Valores únicos que cumplen '= literal' con la condición de la columna."""
+    if predicado is predicado_igualdad:
+        comparables, literal = valores_comparables(unicos, literal)
+        return (comparables == literal).to_numpy(dtype=bool)
+    return np.asarray(predicado(unicos, literal), dtype=bool)
+
+def particionar_registros(df, campo, variables=None):
+    """
+    Divide los registros según un campo (--split-by) con una sola
+    factorización de la columna. Si el campo es una variable de cruce se usan
+    sus categorías, en su orden y con su condición de conteo; si no, los
+    valores distintos de la columna.
+    Retorna (columna, [(categoria, mascara), ...]) sin las categorías vacías.
+    """
+    variables = variables or {}
+    columna, predicado = resolver_campo(campo, df, variables)
+    codigos, unicos = pd.factorize(df[columna])
+    unicos = pd.Series(unicos)
+    categorias = next(
+        (info['categorias'] for info in variables.values() if info.get('columna') == columna),
+        sorted(unicos.astype(str))
+    )
+    particiones = []
+    for categoria in categorias:
+        cumple = np.append(igual(unicos, categoria, predicado), False)
+        mascara = cumple[codigos]
+        if mascara.any():
+            particiones.append((categoria, mascara))
+    return columna, particiones
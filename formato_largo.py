@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tabla en formato largo ("tidy") de todos los cruces de todos.py.
+
+Una fila por celda del reporte: pregunta, opción, variable de cruce,
+categoría, conteo, base y porcentaje (en puntos, con la misma política de
+redondeo del reporte). La columna TOTAL del reporte aparece con variable y
+categoría 'TOTAL'. Se arma directamente desde las matrices de conteos del
+motor, con operaciones de NumPy por tabla, sin pasar por las hojas de Excel
+(sin encabezados combinados ni "---").
+
+Se exporta como CSV y, si está instalado pyarrow (o fastparquet), como
+Parquet con las columnas de texto como categorías. La misma tabla alimenta
+el almacén SQLite (almacen.py).
+
+Autor: Generado automáticamente
+Fecha: 2025
+"""
+
+import pandas as pd
+import numpy as np
+
+from porcentajes import calcular_porcentajes
+
+# Nombre de la columna TOTAL del reporte como variable y categoría
+VARIABLE_TOTAL = 'TOTAL'
+
+COLUMNAS_LARGO = [
+    'pregunta', 'pregunta_col', 'orden', 'opcion', 'variable', 'columna_variable', 'categoria',
+    'conteo', 'base', 'porcentaje'
+]
+
+def bloque_largo(opciones, conteos, bases, porcentajes, variable, columna, categorias):
+    """
+    Columnas de un bloque opciones × categorías, recorrido por categoría y
+    dentro de cada categoría por opción (el orden del reporte).
+    """
+    num_opciones, num_categorias = conteos.shape
+    return {
+        'orden': np.tile(np.arange(num_opciones), num_categorias),
+        'opcion': np.tile(opciones, num_categorias),
+        'variable': np.full(num_opciones * num_categorias, variable, dtype=object),
+        'columna_variable': np.full(num_opciones * num_categorias, columna, dtype=object),
+        'categoria': np.repeat(np.asarray(categorias, dtype=object), num_opciones),
+        'conteo': conteos.T.ravel(),
+        'base': np.repeat(bases, num_opciones),
+        'porcentaje': porcentajes.T.ravel() / 100
+    }
+
+def construir_tabla_larga(tablas, variables):
+    """
+    tablas: lista de (pregunta, pregunta_col, opciones, tabla) con las tablas
+    de conteos del motor.
+    Retorna un DataFrame con las columnas de COLUMNAS_LARGO.
+    """
+    bloques = []
+    for pregunta, pregunta_col, opciones, tabla in tablas:
+        opciones = np.array([str(opcion) for opcion in opciones], dtype=object)
+        total_general = np.float64(tabla['total_general'])
+        totales_opcion = np.asarray(tabla['totales_opcion'], dtype=np.float64)[:, None]
+        porcentajes = calcular_porcentajes(totales_opcion, total_general, base='total')['unidades']
+        bloques_pregunta = [bloque_largo(
+            opciones, totales_opcion, np.array([total_general]), porcentajes,
+            VARIABLE_TOTAL, None, [VARIABLE_TOTAL]
+        )]
+        for var_nombre, var_info in variables.items():
+            conteos = np.asarray(tabla['conteos'][var_nombre], dtype=np.float64)
+            totales = np.asarray(tabla['totales_categoria'][var_nombre], dtype=np.float64)
+            porcentajes = calcular_porcentajes(conteos, totales, base='vertical')['unidades']
+            bloques_pregunta.append(bloque_largo(
+                opciones, conteos, totales, porcentajes, var_nombre, var_info.get('columna'), var_info['categorias']
+            ))
+        filas = sum(len(bloque['orden']) for bloque in bloques_pregunta)
+        bloques.append({
+            'pregunta': np.full(filas, pregunta, dtype=object),
+            'pregunta_col': np.full(filas, pregunta_col, dtype=object),
+            **{
+                columna: np.concatenate([bloque[columna] for bloque in bloques_pregunta])
+                for columna in bloques_pregunta[0]
+            }
+        })
+
+    if not bloques:
+        return pd.DataFrame(columns=COLUMNAS_LARGO)
+    return pd.DataFrame({
+        columna: np.concatenate([bloque[columna] for bloque in bloques]) for columna in COLUMNAS_LARGO
+    })
+
+def exportar_tabla_larga(tabla_larga, archivo_salida):
+    """
+    Escribe <base>-Largo.csv y, si hay un motor de Parquet instalado,
+    <base>-Largo.parquet (base: archivo_salida sin .xlsx).
+    Retorna la lista de archivos escritos.
+    """
+    base = archivo_salida[:-len('.xlsx')] if archivo_salida.endswith('.xlsx') else archivo_salida
+    archivo_csv = f'{base}-Largo.csv'
+    tabla_larga.to_csv(archivo_csv, index=False, encoding='utf-8')
+    archivos = [archivo_csv]
+
+    archivo_parquet = f'{base}-Largo.parquet'
+    columnar = tabla_larga.astype({
+        columna: 'category' for columna in ('pregunta', 'pregunta_col', 'opcion', 'variable', 'columna_variable', 'categoria')
+    })
+    try:
+        columnar.to_parquet(archivo_parquet, index=False)
+        archivos.append(archivo_parquet)
+    except ImportError:
+        print("  ⚠ No hay motor de Parquet instalado (pyarrow o fastparquet): solo se escribe el CSV")
+    return archivos
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Actualización incremental de los reportes de todos.py.
+
+Durante el levantamiento la encuesta se vuelve a exportar cada día con los
+registros nuevos agregados al final. En lugar de recalcular todo, este
+script guarda el estado de la corrida anterior (los conteos como agregado
+parcial, ver parciales.py, y los registros ya procesados con su clave y su
+hash) y en cada corrida:
+
+    - identifica los registros nuevos, modificados y eliminados, por una
+      columna de identificador (--id) o por el hash del contenido del registro
+    - calcula el parcial solo de esos registros: suma los nuevos y las
+      versiones actuales de los modificados, y resta las versiones anteriores
+      de los modificados y de los eliminados
+    - vuelve a generar los reportes desde los conteos actualizados
+
+Sin --id, un registro corregido cambia de hash y se trata como eliminado y
+agregado, con el mismo resultado.
+
+Archivos de estado:
+    <estado>.npz            conteos (parcial, combinable con parciales.py)
+    <estado>-filas.jsonl.gz registros procesados, con las columnas _clave y _hash
+                            (JSON conserva los tipos: texto, números y vacíos)
+
+Uso:
+    python incremental.py archivo_entrada estado [archivo_salida] [--id COLUMNA] [--peso COLUMNA]
+
+Autor: Generado automáticamente
+Fecha: 2025
+"""
+
+import pandas as pd
+import numpy as np
+import argparse
+import os
+import sys
+
+from parciales import (
+    cargar_parcial, combinar_parciales, construir_parcial, escalar_parcial, guardar_parcial,
+    tablas_desde_parcial
+)
+from todos import generar_todos_analisis, leer_encuesta
+
+COLUMNA_CLAVE = '_clave'
+COLUMNA_HASH = '_hash'
+
+def hash_filas(df):
+    """
+    Hash estable del contenido de cada registro. Las columnas numéricas se
+    llevan a float para que un entero no cambie de hash cuando la columna
+    pasa a tener vacíos (read_excel la lee entonces como float).
+    """
+    normalizado = df.copy()
+    for columna in normalizado.columns:
+        if pd.api.types.is_numeric_dtype(normalizado[columna]) and not pd.api.types.is_bool_dtype(normalizado[columna]):
+            normalizado[columna] = normalizado[columna].astype(np.float64)
+    hashes = pd.util.hash_pandas_object(normalizado, index=False).to_numpy()
+    return np.array([f'{valor:016x}' for valor in hashes.tolist()], dtype=object)
+
+def claves_filas(df, hashes, columna_id=None):
+    """
+    Clave de cada registro: el valor de la columna de identificador o, sin
+    ella, el hash del contenido más el número de repetición (registros
+    idénticos quedan con claves distintas).
+    """
+    if columna_id is not None:
+        if df[columna_id].isna().any():
+            raise ValueError(f"La columna de identificador '{columna_id}' tiene valores vacíos")
+        claves = df[columna_id].astype(str)
+        if claves.duplicated().any():
+            raise ValueError(f"La columna de identificador '{columna_id}' tiene valores repetidos")
+        return claves.to_numpy(dtype=object)
+    repeticion = pd.Series(hashes).groupby(hashes).cumcount().to_numpy()
+    return np.array([f'{valor}-{n}' for valor, n in zip(hashes, repeticion)], dtype=object)
+
+def archivos_estado(estado):
+    """Rutas del estado: conteos (.npz) y registros procesados (.jsonl.gz)."""
+    return f'{estado}.npz', f'{estado}-filas.jsonl.gz'
+
+def cargar_estado(estado):
+    """
+    Carga el estado de la corrida anterior.
+    Retorna (parcial, filas) o (None, None) si no hay estado.
+    """
+    archivo_parcial, archivo_filas = archivos_estado(estado)
+    if not (os.path.exists(archivo_parcial) and os.path.exists(archivo_filas)):
+        return None, None
+    filas = pd.read_json(archivo_filas, lines=True, dtype=False, convert_dates=False, compression='gzip')
+    return cargar_parcial(archivo_parcial), filas
+
+def guardar_estado(estado, parcial, df, claves, hashes):
+    """Guarda los conteos y los registros procesados con su clave y hash."""
+    archivo_parcial, archivo_filas = archivos_estado(estado)
+    guardar_parcial(parcial, archivo_parcial)
+    filas = df.copy()
+    filas[COLUMNA_CLAVE] = claves
+    filas[COLUMNA_HASH] = hashes
+    filas.to_json(archivo_filas, orient='records', lines=True, date_format='iso', force_ascii=False, compression='gzip')
+
+def clasificar_filas(claves, hashes, filas_previas):
+    """
+    Compara los registros actuales con los de la corrida anterior.
+    Retorna (nuevas, modificadas, restar): máscaras sobre los registros
+    actuales (nuevas, modificadas) y sobre los anteriores (versiones previas
+    de los modificados y registros eliminados, que se restan).
+    """
+    previos = dict(zip(filas_previas[COLUMNA_CLAVE], filas_previas[COLUMNA_HASH]))
+    actuales = set(claves)
+    nuevas = np.array([clave not in previos for clave in claves], dtype=bool)
+    modificadas = np.array(
+        [clave in previos and previos[clave] != valor for clave, valor in zip(claves, hashes)], dtype=bool
+    )
+    claves_modificadas = set(claves[modificadas])
+    restar = filas_previas[COLUMNA_CLAVE].map(
+        lambda clave: clave not in actuales or clave in claves_modificadas
+    ).to_numpy(dtype=bool)
+    return nuevas, modificadas, restar
+
+def actualizar_conteos(parcial, df, filas_previas, claves, hashes, columna_peso=None):
+    """
+    Aplica al parcial anterior los registros nuevos, modificados y eliminados.
+    Retorna (parcial actualizado, resumen con el número de registros de cada tipo).
+    """
+    nuevas, modificadas, restar = clasificar_filas(claves, hashes, filas_previas)
+    sumar = nuevas | modificadas
+    resumen = {
+        'nuevos': int(nuevas.sum()),
+        'modificados': int(modificadas.sum()),
+        'eliminados': int(restar.sum() - modificadas.sum())
+    }
+
+    parciales = [parcial]
+    if sumar.any():
+        parciales.append(construir_parcial(df[sumar], parcial['variables'], columna_peso))
+    if restar.any():
+        anteriores = filas_previas[restar].drop(columns=[COLUMNA_CLAVE, COLUMNA_HASH])
+        parciales.append(escalar_parcial(construir_parcial(anteriores, parcial['variables'], columna_peso), -1))
+    return combinar_parciales(parciales), resumen
+
+def generar_incremental(archivo_entrada, estado, archivo_salida='Todos-Cruzado.xlsx', columna_id=None,
+                        columna_peso=None):
+    """
+    Función principal: actualiza el estado con la exportación actual y vuelve
+    a generar los reportes. Sin estado previo (o si cambiaron las columnas o
+    la columna de pesos) se construye desde cero.
+    """
+    print(f"Leyendo archivo: {archivo_entrada}")
+
+    if not os.path.exists(archivo_entrada):
+        print(f"ERROR: No se encontró el archivo {archivo_entrada}")
+        sys.exit(1)
+
+    try:
+        df = leer_encuesta(archivo_entrada)
+        print(f"Archivo leído exitosamente. Total de registros: {len(df)}")
+    except Exception as e:
+        print(f"ERROR al leer el archivo: {e}")
+        sys.exit(1)
+
+    for columna in (columna_id, columna_peso):
+        if columna is not None and columna not in df.columns:
+            print(f"ERROR: No se encontró la columna '{columna}'")
+            sys.exit(1)
+
+    try:
+        hashes = hash_filas(df)
+        claves = claves_filas(df, hashes, columna_id)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+
+    parcial, filas_previas = cargar_estado(estado)
+    if parcial is not None:
+        columnas_previas = [col for col in filas_previas.columns if col not in (COLUMNA_CLAVE, COLUMNA_HASH)]
+        if columnas_previas != df.columns.tolist() or parcial['columna_peso'] != columna_peso:
+            print("  ⚠ Cambiaron las columnas o la columna de pesos: se recalcula desde cero")
+            parcial = None
+
+    if parcial is None:
+        print("Calculando conteos de todos los registros...")
+        parcial = construir_parcial(df, columna_peso=columna_peso)
+    else:
+        print(f"Estado anterior: {parcial['total_registros']} registros")
+        parcial, resumen = actualizar_conteos(parcial, df, filas_previas, claves, hashes, columna_peso)
+        print(f"  Registros nuevos: {resumen['nuevos']}")
+        print(f"  Registros modificados: {resumen['modificados']}")
+        print(f"  Registros eliminados: {resumen['eliminados']}")
+        if parcial['total_registros'] != len(df):
+            print(f"ERROR: El estado actualizado tiene {parcial['total_registros']} registros y el archivo {len(df)}")
+            sys.exit(1)
+
+    try:
+        guardar_estado(estado, parcial, df, claves, hashes)
+        print(f"✓ Estado actualizado: {', '.join(archivos_estado(estado))}")
+    except Exception as e:
+        print(f"ERROR al guardar el estado: {e}")
+        sys.exit(1)
+
+    generar_todos_analisis(
+        archivo_entrada, archivo_salida, parcial['variables'], columna_peso=columna_peso,
+        agregados=tablas_desde_parcial(parcial)
+    )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Actualiza los conteos con los registros nuevos o corregidos y vuelve a generar los reportes.'
+    )
+    parser.add_argument('archivo_entrada')
+    parser.add_argument('estado', help='Ruta base del estado (se crean <estado>.npz y <estado>-filas.jsonl.gz)')
+    parser.add_argument('archivo_salida', nargs='?', default='Todos-Cruzado.xlsx')
+    parser.add_argument(
+        '--id', default=None, metavar='COLUMNA',
+        help="Columna que identifica cada registro, p. ej. 'ID Encuesta' (por defecto, hash del contenido)"
+    )
+    parser.add_argument(
+        '--peso', default=None, metavar='COLUMNA',
+        help='Columna con el factor de expansión por encuestado'
+    )
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("ACTUALIZACIÓN INCREMENTAL DE LOS ANÁLISIS CRUZADOS")
+    print("=" * 80)
+    print()
+
+    generar_incremental(args.archivo_entrada, args.estado, args.archivo_salida, args.id, args.peso)
+
+    print()
+    print("=" * 80)
+    print("Proceso completado exitosamente")
+    print("=" * 80)
@@ -0,0 +1,529 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Medición por etapas de las corridas de todos.py, P3-Cruzado.py y
+P4-Cruzado.py.
+
+Cada corrida abre un registro (iniciar_registro) y marca sus etapas:
+lectura, normalización, columnas derivadas, perfil de esquema, cálculo y
+escritura de cada pregunta y guardado. Por etapa se acumulan el tiempo de
+reloj, el tiempo de CPU, las veces que se ejecutó, los registros procesados
+y las celdas escritas en el libro. Las etapas se pueden anidar (el cálculo
+dentro de la escritura de una hoja); el tiempo de cada una es el propio, sin
+el de las etapas internas, así que la suma de las etapas es el total de la
+corrida.
+
+Al terminar (terminar_registro) se escribe el informe JSON <salida>-Corrida.json
+y se muestra un resumen en una pantalla. Sin un registro activo las etapas
+no miden nada (p. ej. en servicio.py), con un costo despreciable.
+
+Contador de escaneos (activar_contador_escaneos, opción --escaneos): cuenta
+por pregunta y por etapa las llamadas a str.contains, las máscaras de
+igualdad (==, != sobre una Series) y los DataFrames filtrados con una
+máscara (df[mascara], como en len(df[...])), con las filas que recorre cada
+una. Es la huella del patrón de un filtro por celda, cuyo costo crece con
+celdas × registros; afirmar_limite_escaneos permite fijar un máximo por hoja
+(--max-escaneos) para que ese patrón no vuelva sin que se note.
+
+Perfil de memoria (activar_perfil_memoria, opción --profile-memory): con
+tracemalloc, cada etapa y cada pregunta registran el pico de memoria
+asignada desde que empiezan y la memoria neta (lo que sigue asignado al
+terminar), y cada etapa el pico de RSS del proceso al terminar. Las etapas
+que copian DataFrames o acumulan celdas se ven en la memoria neta. La primera vez que se
+ejecuta cada etapa se comparan instantáneas de tracemalloc para obtener las
+líneas de código que más memoria asignaron en ella (sin contar las etapas
+internas). Las instantáneas cuestan segundos con libros grandes en memoria,
+por eso solo se toman en la primera ejecución.
+
+Autor: Generado automáticamente
+Fecha: 2025
+"""
+
+import contextlib
+import functools
+import json
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from pandas.core.strings.accessor import StringMethods
+
+try:
+    import resource
+except ImportError:  # Windows: sin pico de RSS
+    resource = None
+
+# Registro de la corrida en curso (uno por proceso)
+_registro = None
+
+# Informe de la última corrida terminada (para afirmar_limite_escaneos)
+_ultimo_informe = None
+
+# Métodos de pandas reemplazados por el contador de escaneos: (clase, nombre, original o None si era heredado)
+_originales = []
+
+TIPOS_ESCANEO = ('str_contains', 'igualdad', 'materializacion')
+
+# Clave de los escaneos hechos fuera de una pregunta o de una etapa
+FUERA_DE_PREGUNTA = '(sin pregunta)'
+
+# Perfil de memoria: activo y número de líneas de código por etapa en el informe
+_memoria = {'activa': False, 'sitios': 10}
+
+MB = 1024 * 1024
+
+def contar_celdas(libro):
+    """Celdas creadas en todas las hojas de un libro de openpyxl."""
+    return sum(len(ws._cells) for ws in libro.worksheets)
+
+def iniciar_registro(script, archivo_salida, **datos):
+    """
+    Abre el registro de una corrida. datos: información adicional para el
+    informe (archivo de entrada, columna de pesos...).
+    """
+    global _registro
+    base = archivo_salida[:-len('.xlsx')] if archivo_salida.endswith('.xlsx') else archivo_salida
+    _registro = {
+        'script': script,
+        'archivo_informe': f'{base}-Corrida.json',
+        'datos': datos,
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'reloj': time.perf_counter(),
+        'cpu': time.process_time(),
+        'etapas': {},
+        'preguntas': {},
+        'pila': [],
+        'lineal': None,
+        'escaneos': {'por_pregunta': {}, 'por_etapa': {}},
+        'memoria_preguntas': {}
+    }
+    return _registro
+
+def abrir_etapa(nombre, pregunta=None, registros=0, libro=None):
+    """
+    Empieza a medir una etapa. pregunta: columna de la pregunta a la que se
+    atribuye (si no se indica, la de la etapa que la contiene). libro: libro
+    de openpyxl del que se cuentan las celdas escritas durante la etapa.
+    Retorna el marco de la etapa (None sin registro activo).
+    """
+    if _registro is None:
+        return None
+    pila = _registro['pila']
+    if pregunta is None and pila:
+        pregunta = pila[-1]['pregunta']
+    marco = {
+        'nombre': nombre,
+        'pregunta': pregunta,
+        'registros': registros,
+        'libro': libro,
+        'celdas': contar_celdas(libro) if libro is not None else 0,
+        'hijos_reloj': 0.0,
+        'hijos_cpu': 0.0,
+        'reloj': time.perf_counter(),
+        'cpu': time.process_time()
+    }
+    if _memoria['activa']:
+        abrir_memoria(marco, pila)
+        marco['reloj'] = time.perf_counter()
+        marco['cpu'] = time.process_time()
+    pila.append(marco)
+    return marco
+
+def cerrar_etapa(marco, registros=None):
+    """Termina la medición de una etapa y la acumula en el registro."""
+    if marco is None or _registro is None:
+        return
+    reloj = time.perf_counter() - marco['reloj']
+    cpu = time.process_time() - marco['cpu']
+    pila = _registro['pila']
+    pila.remove(marco)
+    if pila:
+        pila[-1]['hijos_reloj'] += reloj
+        pila[-1]['hijos_cpu'] += cpu
+    if _memoria['activa'] and 'memoria_inicio' in marco:
+        cerrar_memoria(marco, pila)
+
+    propio_reloj = reloj - marco['hijos_reloj']
+    medicion = _registro['etapas'].setdefault(marco['nombre'], {
+        'veces': 0, 'segundos': 0.0, 'cpu': 0.0, 'registros': 0, 'celdas': 0
+    })
+    medicion['veces'] += 1
+    medicion['segundos'] += propio_reloj
+    medicion['cpu'] += cpu - marco['hijos_cpu']
+    medicion['registros'] += int(registros if registros is not None else marco['registros'])
+    if marco['libro'] is not None:
+        medicion['celdas'] += contar_celdas(marco['libro']) - marco['celdas']
+    if marco['pregunta'] is not None:
+        por_pregunta = _registro['preguntas'].setdefault(marco['pregunta'], {})
+        por_pregunta[marco['nombre']] = por_pregunta.get(marco['nombre'], 0.0) + propio_reloj
+
+def activar_perfil_memoria(sitios=10):
+    """
+    Empieza a seguir las asignaciones con tracemalloc (conviene activarlo
+    antes de leer la encuesta). sitios: líneas de código por etapa en el informe.
+    """
+    _memoria['activa'] = True
+    _memoria['sitios'] = sitios
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+def rss_pico():
+    """Pico de memoria residente del proceso en bytes (None si no se puede medir)."""
+    if resource is None:
+        return None
+    maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo da en KB y macOS en bytes
+    return maximo if sys.platform == 'darwin' else maximo * 1024
+
+def nombre_sitio(traza):
+    """'paquete/modulo.py:linea' de un marco de tracemalloc."""
+    archivo = traza.filename.replace(os.sep, '/')
+    if 'site-packages/' in archivo:
+        archivo = archivo.split('site-packages/')[-1]
+    else:
+        archivo = os.path.basename(archivo)
+    return f"{archivo}:{traza.lineno}"
+
+def descontar_medicion(pila, inicio_reloj, inicio_cpu):
+    """
+    El tiempo de las mediciones de memoria no cuenta como propio de la etapa
+    que las contiene: queda en el tiempo sin medir de la corrida.
+    """
+    if pila:
+        pila[-1]['hijos_reloj'] += time.perf_counter() - inicio_reloj
+        pila[-1]['hijos_cpu'] += time.process_time() - inicio_cpu
+
+def abrir_memoria(marco, pila):
+    """
+    Memoria al empezar una etapa. tracemalloc tiene un solo pico: el de la
+    etapa que la contiene se guarda antes de reiniciarlo.
+    """
+    inicio_reloj, inicio_cpu = time.perf_counter(), time.process_time()
+    actual, pico = tracemalloc.get_traced_memory()
+    if pila:
+        pila[-1]['memoria_pico'] = max(pila[-1]['memoria_pico'], pico)
+    tracemalloc.reset_peak()
+    marco['memoria_inicio'] = actual
+    marco['memoria_pico'] = actual
+    marco['sitios_hijos'] = {}
+    # Instantánea solo en la primera ejecución de cada etapa
+    primera = marco['nombre'] not in _registro['etapas'] and all(otro['nombre'] != marco['nombre'] for otro in pila)
+    marco['instantanea'] = tracemalloc.take_snapshot() if primera else None
+    descontar_medicion(pila, inicio_reloj, inicio_cpu)
+
+def cerrar_memoria(marco, pila):
+    """Acumula pico, memoria retenida, RSS y líneas de código de la etapa."""
+    inicio_reloj, inicio_cpu = time.perf_counter(), time.process_time()
+    actual, pico = tracemalloc.get_traced_memory()
+    pico = max(marco['memoria_pico'], pico)
+    tracemalloc.reset_peak()
+    if pila:
+        pila[-1]['memoria_pico'] = max(pila[-1]['memoria_pico'], pico)
+
+    memoria = _registro.setdefault('memoria_etapas', {}).setdefault(marco['nombre'], {
+        'pico': 0, 'neta': 0, 'rss_pico': None, 'sitios': None
+    })
+    memoria['pico'] = max(memoria['pico'], pico - marco['memoria_inicio'])
+    memoria['neta'] += actual - marco['memoria_inicio']
+    memoria['rss_pico'] = rss_pico()
+
+    # Por pregunta, solo la etapa más externa de cada una (las internas ya están incluidas)
+    if marco['pregunta'] is not None and (not pila or pila[-1]['pregunta'] != marco['pregunta']):
+        por_pregunta = _registro['memoria_preguntas'].setdefault(marco['pregunta'], {'pico': 0, 'neta': 0})
+        por_pregunta['pico'] = max(por_pregunta['pico'], pico - marco['memoria_inicio'])
+        por_pregunta['neta'] += actual - marco['memoria_inicio']
+
+    if marco['instantanea'] is not None:
+        diferencias = tracemalloc.take_snapshot().compare_to(marco['instantanea'], 'lineno')
+        marco['instantanea'] = None
+        sitios = {}
+        for estadistica in diferencias:
+            # Las instantáneas de las etapas internas también ocupan memoria
+            if estadistica.size_diff > 0 and estadistica.traceback[0].filename != tracemalloc.__file__:
+                sitio = nombre_sitio(estadistica.traceback[0])
+                sitios[sitio] = sitios.get(sitio, 0) + estadistica.size_diff
+        if pila:
+            for sitio, tamano in sitios.items():
+                pila[-1]['sitios_hijos'][sitio] = pila[-1]['sitios_hijos'].get(sitio, 0) + tamano
+        # Lo asignado en las etapas internas se les atribuye a ellas
+        for sitio, tamano in marco['sitios_hijos'].items():
+            sitios[sitio] = sitios.get(sitio, 0) - tamano
+        memoria['sitios'] = [
+            {'sitio': sitio, 'mb': round(tamano / MB, 3)}
+            for sitio, tamano in sorted(sitios.items(), key=lambda par: -par[1])[:_memoria['sitios']]
+            if tamano > 0
+        ]
+    elif pila and marco['sitios_hijos']:
+        # Sin instantánea propia: lo de sus etapas internas pasa a la que la contiene
+        for sitio, tamano in marco['sitios_hijos'].items():
+            pila[-1]['sitios_hijos'][sitio] = pila[-1]['sitios_hijos'].get(sitio, 0) + tamano
+    descontar_medicion(pila, inicio_reloj, inicio_cpu)
+
+@contextlib.contextmanager
+def etapa(nombre, pregunta=None, registros=0, libro=None):
+    """
+    Mide el bloque como una etapa (ver abrir_etapa). El diccionario que
+    entrega permite fijar al final los registros procesados:
+
+        with etapa('lectura') as medicion:
+            df = leer_encuesta(archivo)
+            medicion['registros'] = len(df)
+    """
+    marco = abrir_etapa(nombre, pregunta, registros, libro)
+    medicion = {'registros': registros}
+    try:
+        yield medicion
+    finally:
+        cerrar_etapa(marco, medicion['registros'])
+
+def marcar_etapa(nombre, registros=0, libro=None, pregunta=None):
+    """
+    Para los scripts lineales (P3, P4): termina la etapa marcada antes y
+    empieza la siguiente. marcar_etapa(None) solo termina la anterior.
+    """
+    if _registro is None:
+        return
+    cerrar_etapa(_registro['lineal'])
+    _registro['lineal'] = abrir_etapa(nombre, pregunta, registros, libro) if nombre is not None else None
+
+def contar_escaneo(tipo, filas):
+    """Suma un escaneo a la pregunta y a la etapa en curso."""
+    if _registro is None:
+        return
+    pila = _registro['pila']
+    marco = pila[-1] if pila else None
+    claves = (
+        ('por_pregunta', marco['pregunta'] if marco and marco['pregunta'] is not None else FUERA_DE_PREGUNTA),
+        ('por_etapa', marco['nombre'] if marco else FUERA_DE_PREGUNTA)
+    )
+    for grupo, clave in claves:
+        conteo = _registro['escaneos'][grupo].setdefault(clave, {**dict.fromkeys(TIPOS_ESCANEO, 0), 'filas': 0})
+        conteo[tipo] += 1
+        conteo['filas'] += filas
+
+def es_mascara(clave):
+    """True si la clave de df[clave] es una máscara booleana de registros."""
+    if isinstance(clave, (pd.Series, np.ndarray)):
+        return clave.dtype == bool
+    return False
+
+def reemplazar_metodo(clase, nombre, envoltura):
+    """Reemplaza clase.nombre por envoltura(original) y guarda el original."""
+    original = getattr(clase, nombre)
+    _originales.append((clase, nombre, clase.__dict__.get(nombre)))
+    setattr(clase, nombre, functools.wraps(original)(envoltura(original)))
+
+def activar_contador_escaneos():
+    """
+    Instala el contador en str.contains, Series.__eq__/__ne__ y
+    DataFrame.__getitem__ (solo cuenta mientras hay un registro activo).
+    Los procesos hijos creados por fork lo heredan.
+    """
+    if _originales:
+        return
+
+    def contains(original):
+        def contar(self, *args, **kwargs):
+            contar_escaneo('str_contains', len(self._orig))
+            return original(self, *args, **kwargs)
+        return contar
+
+    def igualdad(original):
+        def contar(self, otro):
+            contar_escaneo('igualdad', len(self))
+            return original(self, otro)
+        return contar
+
+    def materializacion(original):
+        def contar(self, clave):
+            if es_mascara(clave):
+                contar_escaneo('materializacion', len(self))
+            return original(self, clave)
+        return contar
+
+    reemplazar_metodo(StringMethods, 'contains', contains)
+    reemplazar_metodo(pd.Series, '__eq__', igualdad)
+    reemplazar_metodo(pd.Series, '__ne__', igualdad)
+    reemplazar_metodo(pd.DataFrame, '__getitem__', materializacion)
+
+def desactivar_contador_escaneos():
+    """Restaura los métodos originales de pandas."""
+    while _originales:
+        clase, nombre, original = _originales.pop()
+        if original is None:
+            delattr(clase, nombre)
+        else:
+            setattr(clase, nombre, original)
+
+def escaneos_por_hoja(informe, clave='escaneos'):
+    """
+    {pregunta: total} del informe. clave: 'escaneos' (str_contains +
+    igualdad + materializacion) o 'filas' (filas recorridas).
+    """
+    return {
+        pregunta: conteo['filas'] if clave == 'filas' else sum(conteo[tipo] for tipo in TIPOS_ESCANEO)
+        for pregunta, conteo in informe.get('escaneos', {}).get('por_pregunta', {}).items()
+        if pregunta != FUERA_DE_PREGUNTA
+    }
+
+def afirmar_limite_escaneos(maximo=None, informe=None, maximo_filas=None):
+    """
+    Falla (AssertionError) si alguna hoja (pregunta) hizo más de maximo
+    escaneos o recorrió más de maximo_filas filas en ellos. informe: por
+    defecto, el de la última corrida terminada con el contador activo.
+    """
+    informe = informe if informe is not None else _ultimo_informe
+    assert informe is not None and 'escaneos' in informe, "No hay un informe con el contador de escaneos activo"
+    for clave, limite in (('escaneos', maximo), ('filas', maximo_filas)):
+        if limite is None:
+            continue
+        excedidas = {pregunta: total for pregunta, total in escaneos_por_hoja(informe, clave).items() if total > limite}
+        assert not excedidas, (
+            f"{len(excedidas)} hojas superan {limite:,} {clave}: "
+            + ', '.join(f"{pregunta} ({total:,})" for pregunta, total in sorted(excedidas.items(), key=lambda par: -par[1]))
+        )
+
+def informe_registro():
+    """Informe de la corrida en curso como diccionario (lo que va al JSON)."""
+    segundos = time.perf_counter() - _registro['reloj']
+    cpu = time.process_time() - _registro['cpu']
+    etapas = [
+        {
+            'etapa': nombre,
+            'veces': medicion['veces'],
+            'segundos': round(medicion['segundos'], 4),
+            'cpu': round(medicion['cpu'], 4),
+            'registros': medicion['registros'],
+            'celdas': medicion['celdas']
+        }
+        for nombre, medicion in _registro['etapas'].items()
+    ]
+    medidos = sum(medicion['segundos'] for medicion in _registro['etapas'].values())
+    informe = {
+        'script': _registro['script'],
+        'fecha': _registro['fecha'],
+        **_registro['datos'],
+        'segundos': round(segundos, 4),
+        'cpu': round(cpu, 4),
+        'sin_medir': round(segundos - medidos, 4),
+        'etapas': etapas,
+        'preguntas': {
+            pregunta: {nombre: round(valor, 4) for nombre, valor in por_etapa.items()}
+            for pregunta, por_etapa in _registro['preguntas'].items()
+        }
+    }
+    if _memoria['activa']:
+        memoria_etapas = _registro.get('memoria_etapas', {})
+        for medicion in etapas:
+            memoria = memoria_etapas.get(medicion['etapa'])
+            if memoria is not None:
+                medicion['memoria_pico_mb'] = round(memoria['pico'] / MB, 3)
+                medicion['memoria_neta_mb'] = round(memoria['neta'] / MB, 3)
+                if memoria['rss_pico'] is not None:
+                    medicion['rss_pico_mb'] = round(memoria['rss_pico'] / MB, 1)
+                if memoria['sitios'] is not None:
+                    medicion['sitios'] = memoria['sitios']
+        actual, _ = tracemalloc.get_traced_memory()
+        rss = rss_pico()
+        informe['memoria'] = {
+            'rss_pico_mb': round(rss / MB, 1) if rss is not None else None,
+            'asignada_al_terminar_mb': round(actual / MB, 3),
+            'pico_etapa_mb': max((medicion.get('memoria_pico_mb', 0) for medicion in etapas), default=0),
+            'preguntas': {
+                pregunta: {'pico_mb': round(memoria['pico'] / MB, 3), 'neta_mb': round(memoria['neta'] / MB, 3)}
+                for pregunta, memoria in _registro['memoria_preguntas'].items()
+            }
+        }
+    if _originales:
+        escaneos = _registro['escaneos']
+        informe['escaneos'] = {
+            'total': {
+                clave: sum(conteo[clave] for conteo in escaneos['por_etapa'].values())
+                for clave in (*TIPOS_ESCANEO, 'filas')
+            },
+            'por_etapa': escaneos['por_etapa'],
+            'por_pregunta': escaneos['por_pregunta']
+        }
+    return informe
+
+def imprimir_resumen(informe, mas_lentas=5):
+    """Tabla de etapas y preguntas más lentas, en una pantalla."""
+    total = informe['segundos'] or 1.0
+    print(f"\n{'Etapa':<28} {'Veces':>6} {'Segundos':>9} {'CPU':>9} {'%':>6} {'Registros':>11} {'Celdas':>10}")
+    print("-" * 85)
+    for medicion in sorted(informe['etapas'], key=lambda m: -m['segundos']):
+        print(
+            f"{medicion['etapa'][:28]:<28} {medicion['veces']:>6} {medicion['segundos']:>9.2f} "
+            f"{medicion['cpu']:>9.2f} {medicion['segundos'] / total:>6.1%} "
+            f"{medicion['registros']:>11,} {medicion['celdas']:>10,}"
+        )
+    print(f"{'(sin medir)':<28} {'':>6} {informe['sin_medir']:>9.2f}")
+    print("-" * 85)
+    print(f"{'TOTAL':<28} {'':>6} {informe['segundos']:>9.2f} {informe['cpu']:>9.2f}")
+
+    lentas = sorted(informe['preguntas'].items(), key=lambda par: -sum(par[1].values()))[:mas_lentas]
+    if lentas:
+        print("\nPreguntas más lentas:")
+        for pregunta, por_etapa in lentas:
+            etapas = sorted(por_etapa.items(), key=lambda par: -par[1])[:3]
+            detalle = ', '.join(f"{nombre} {valor:.2f}" for nombre, valor in etapas)
+            print(f"  {sum(por_etapa.values()):>7.2f} s  {pregunta[:50]} ({detalle})")
+
+    if 'memoria' in informe:
+        memoria = informe['memoria']
+        rss = f"{memoria['rss_pico_mb']:,.1f} MB" if memoria['rss_pico_mb'] is not None else 'no disponible'
+        print(f"\nMemoria: pico de RSS {rss}, asignada al terminar {memoria['asignada_al_terminar_mb']:,.1f} MB")
+        print(f"{'Etapa':<28} {'Pico MB':>10} {'Neta MB':>12} {'RSS MB':>9}  Línea que más asignó")
+        print("-" * 100)
+        con_memoria = [medicion for medicion in informe['etapas'] if 'memoria_pico_mb' in medicion]
+        for medicion in sorted(con_memoria, key=lambda m: -m['memoria_pico_mb']):
+            sitio = medicion['sitios'][0] if medicion.get('sitios') else None
+            texto_sitio = f"{sitio['sitio']} ({sitio['mb']:,.1f} MB)" if sitio else ''
+            print(
+                f"{medicion['etapa'][:28]:<28} {medicion['memoria_pico_mb']:>10,.1f} "
+                f"{medicion['memoria_neta_mb']:>12,.1f} {medicion.get('rss_pico_mb', 0):>9,.1f}  {texto_sitio}"
+            )
+        preguntas = sorted(memoria['preguntas'].items(), key=lambda par: -par[1]['pico_mb'])[:mas_lentas]
+        if preguntas:
+            print("Preguntas con mayor pico:")
+            for pregunta, valores in preguntas:
+                print(f"  {valores['pico_mb']:>8,.1f} MB  {pregunta[:50]} (neta {valores['neta_mb']:,.1f} MB)")
+
+    if 'escaneos' in informe:
+        total = informe['escaneos']['total']
+        por_hoja = escaneos_por_hoja(informe)
+        print(
+            f"\nEscaneos: {total['str_contains']:,} str.contains, {total['igualdad']:,} igualdad, "
+            f"{total['materializacion']:,} materializaciones ({total['filas']:,} filas recorridas)"
+        )
+        if por_hoja:
+            pregunta, maximo = max(por_hoja.items(), key=lambda par: par[1])
+            pregunta_filas, maximo_filas = max(escaneos_por_hoja(informe, 'filas').items(), key=lambda par: par[1])
+            print(f"  Máximo por hoja: {maximo:,} escaneos ({pregunta[:50]}), {maximo_filas:,} filas ({pregunta_filas[:50]})")
+
+def terminar_registro():
+    """
+    Cierra el registro: escribe el informe JSON y muestra el resumen.
+    Retorna el informe.
+    """
+    global _registro, _ultimo_informe
+    if _registro is None:
+        return None
+    marcar_etapa(None)
+    informe = informe_registro()
+    archivo_informe = _registro['archivo_informe']
+    _registro = None
+    _ultimo_informe = informe
+
+    imprimir_resumen(informe)
+    try:
+        with open(archivo_informe, 'w', encoding='utf-8') as f:
+            json.dump(informe, f, ensure_ascii=False, indent=2)
+        print(f"\n✓ Informe de la corrida: {archivo_informe}")
+    except OSError as e:
+        print(f"  ⚠ No se pudo escribir el informe de la corrida: {e}")
+    return informe
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Procesamiento por lotes de varios archivos de la encuesta con todos.py.
+
+Recibe un directorio o un patrón (glob) de archivos Excel/CSV, p. ej. las
+variantes V3-1.xlsx y V3x2.xlsx de cada ola, y genera los dos reportes de
+todos.py por archivo en un grupo de procesos, sin volver a iniciar Python ni
+a importar pandas por cada archivo.
+
+El perfil de esquema (columnas y preguntas) se obtiene una sola vez del
+primer archivo, o del indicado con --perfil, y se comparte con todo el lote:
+los archivos a los que les faltan preguntas del perfil se omiten antes de
+procesarlos. Cada archivo escribe su registro en <nombre>.log y el lote
+termina con un resumen (tabla en pantalla y Resumen-Lote.json).
+
+Uso:
+    python lote.py ENTRADA [ENTRADA ...] [--salida DIRECTORIO] [--procesos N]
+
+Autor: Generado automáticamente
+Fecha: 2025
+"""
+
+import pandas as pd
+import argparse
+import contextlib
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from openpyxl import load_workbook
+
+from todos import generar_todos_analisis, listar_preguntas
+
+EXTENSIONES = ('.xlsx', '.csv')
+
+# Reportes generados por los scripts (no son archivos de entrada)
+SUFIJOS_REPORTE = ('-Pestanas.xlsx', '-UnaHoja.xlsx')
+
+def listar_entradas(especificaciones):
+    """
+    Archivos de entrada a partir de directorios o patrones glob, en orden y
+    sin repetir. Se omiten los reportes generados por los scripts.
+    """
+    entradas = []
+    for especificacion in especificaciones:
+        if os.path.isdir(especificacion):
+            candidatos = sorted(
+                os.path.join(especificacion, nombre) for nombre in os.listdir(especificacion)
+                if nombre.lower().endswith(EXTENSIONES)
+            )
+        else:
+            candidatos = sorted(glob.glob(especificacion))
+        for archivo in candidatos:
+            if archivo.endswith(SUFIJOS_REPORTE) or os.path.basename(archivo).startswith('~$'):
+                continue
+            if archivo not in entradas:
+                entradas.append(archivo)
+    return entradas
+
+def leer_columnas(archivo):
+    """Encabezados de un archivo de la encuesta, sin leer los registros."""
+    if archivo.lower().endswith('.csv'):
+        return pd.read_csv(archivo, nrows=0).columns.tolist()
+    wb = load_workbook(archivo, read_only=True)
+    try:
+        fila = next(wb.worksheets[0].iter_rows(max_row=1, values_only=True), ())
+        return [columna for columna in fila if columna is not None]
+    finally:
+        wb.close()
+
+def perfil_esquema(archivo):
+    """
+    Perfil de esquema compartido por el lote: columnas del archivo y
+    preguntas que se analizan (ver listar_preguntas).
+    """
+    columnas = leer_columnas(archivo)
+    preguntas = listar_preguntas(pd.DataFrame(columns=columnas))
+    return {
+        'archivo': archivo,
+        'columnas': columnas,
+        'preguntas': [pregunta_col for _, pregunta_col, _ in preguntas]
+    }
+
+def comparar_con_perfil(perfil, columnas):
+    """
+    Compara los encabezados de un archivo con el perfil.
+    Retorna (faltantes, adicionales): preguntas del perfil que no están en el
+    archivo y preguntas del archivo que no están en el perfil.
+    """
+    preguntas = [pregunta_col for _, pregunta_col, _ in listar_preguntas(pd.DataFrame(columns=columnas))]
+    faltantes = [col for col in perfil['preguntas'] if col not in preguntas]
+    adicionales = [col for col in preguntas if col not in perfil['preguntas']]
+    return faltantes, adicionales
+
+def nombres_salida(entradas, directorio_salida):
+    """
+    Archivo de salida (base para -Pestanas/-UnaHoja) y registro de cada
+    entrada. Si dos entradas tienen el mismo nombre se agrega la extensión.
+    """
+    bases = [os.path.splitext(os.path.basename(archivo))[0] for archivo in entradas]
+    nombres = {}
+    for archivo, base in zip(entradas, bases):
+        if bases.count(base) > 1:
+            base = f"{base}-{os.path.splitext(archivo)[1][1:]}"
+        nombres[archivo] = (
+            os.path.join(directorio_salida, f"{base}-Todos-Cruzado.xlsx"),
+            os.path.join(directorio_salida, f"{base}.log")
+        )
+    return nombres
+
+def procesar_entrada(tarea):
+    """
+    Genera los reportes de un archivo (se ejecuta en un proceso del grupo).
+    La salida de todos.py va al registro del archivo.
+    Retorna la fila del resumen del lote.
+    """
+    archivo_entrada, archivo_salida, archivo_log, opciones = tarea
+    resultado = {'entrada': archivo_entrada, 'log': archivo_log, 'estado': 'ok'}
+    inicio = time.perf_counter()
+    with open(archivo_log, 'w', encoding='utf-8') as log, \
+            contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        try:
+            resumen = generar_todos_analisis(archivo_entrada, archivo_salida, **opciones)
+            resultado.update(resumen)
+            if resumen['errores']:
+                resultado['estado'] = 'con errores'
+        except SystemExit:
+            # todos.py termina con sys.exit(1) y deja el motivo en el registro
+            resultado['estado'] = 'error'
+        except Exception as e:
+            print(f"ERROR: {e}")
+            resultado['estado'] = 'error'
+    resultado['segundos'] = round(time.perf_counter() - inicio, 2)
+    return resultado
+
+def imprimir_resumen(resultados):
+    """Tabla del resumen del lote en pantalla."""
+    print(f"{'Archivo':<40} {'Estado':<18} {'Registros':>10} {'Preguntas':>10} {'Segundos':>9}")
+    print("-" * 91)
+    for resultado in resultados:
+        print(
+            f"{os.path.basename(resultado['entrada']):<40} {resultado['estado']:<18} "
+            f"{resultado.get('registros', '-'):>10} {resultado.get('preguntas', '-'):>10} "
+            f"{resultado.get('segundos', 0):>9.1f}"
+        )
+        if 'detalle' in resultado:
+            print(f"    {resultado['detalle']}")
+
+def procesar_lote(especificaciones, directorio_salida='.', procesos=None, archivo_perfil=None, **opciones):
+    """
+    Función principal: procesa todos los archivos del lote en un grupo de
+    procesos y escribe el resumen.
+    opciones: argumentos de generar_todos_analisis comunes a todo el lote
+    (columna_peso, asociaciones, tamano_bloque...).
+    Retorna la lista de resultados por archivo.
+    """
+    entradas = listar_entradas(especificaciones)
+    if not entradas:
+        print("ERROR: No se encontraron archivos de entrada")
+        sys.exit(1)
+    print(f"Archivos encontrados: {len(entradas)}")
+
+    try:
+        perfil = perfil_esquema(archivo_perfil or entradas[0])
+    except Exception as e:
+        print(f"ERROR al leer el perfil de esquema: {e}")
+        sys.exit(1)
+    print(f"Perfil de esquema: {perfil['archivo']} ({len(perfil['preguntas'])} preguntas)")
+
+    os.makedirs(directorio_salida, exist_ok=True)
+    nombres = nombres_salida(entradas, directorio_salida)
+
+    # Validar cada archivo contra el perfil antes de repartir el trabajo
+    resultados = {}
+    tareas = []
+    for archivo in entradas:
+        try:
+            faltantes, adicionales = comparar_con_perfil(perfil, leer_columnas(archivo))
+        except Exception as e:
+            resultados[archivo] = {'entrada': archivo, 'estado': 'error', 'detalle': f"No se pudo leer: {e}"}
+            continue
+        if faltantes:
+            resultados[archivo] = {
+                'entrada': archivo, 'estado': 'esquema distinto',
+                'detalle': f"Faltan {len(faltantes)} preguntas del perfil: {', '.join(faltantes[:5])}"
+            }
+            continue
+        if adicionales:
+            print(f"  ⚠ {archivo}: {len(adicionales)} preguntas adicionales al perfil")
+        archivo_salida, archivo_log = nombres[archivo]
+        tareas.append((archivo, archivo_salida, archivo_log, opciones))
+
+    procesos = procesos or os.cpu_count() or 1
+    print(f"Procesando {len(tareas)} archivos con {min(procesos, max(len(tareas), 1))} procesos...")
+    inicio = time.perf_counter()
+    if tareas:
+        with ProcessPoolExecutor(max_workers=min(procesos, len(tareas))) as grupo:
+            for resultado in grupo.map(procesar_entrada, tareas):
+                resultados[resultado['entrada']] = resultado
+                print(f"  ✓ {resultado['entrada']}: {resultado['estado']} ({resultado['segundos']:.1f} s)")
+    total_segundos = round(time.perf_counter() - inicio, 2)
+
+    resultados = [resultados[archivo] for archivo in entradas]
+    print()
+    imprimir_resumen(resultados)
+    print(f"\nTiempo total: {total_segundos:.1f} s")
+
+    archivo_resumen = os.path.join(directorio_salida, 'Resumen-Lote.json')
+    resumen = {
+        'perfil': {'archivo': perfil['archivo'], 'preguntas': len(perfil['preguntas'])},
+        'procesos': procesos,
+        'segundos': total_segundos,
+        'archivos': resultados
+    }
+    with open(archivo_resumen, 'w', encoding='utf-8') as f:
+        json.dump(resumen, f, ensure_ascii=False, indent=2, default=str)
+    print(f"✓ Resumen del lote: {archivo_resumen}")
+    return resultados
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Genera los reportes de todos.py para varios archivos de la encuesta en paralelo.'
+    )
+    parser.add_argument('entradas', nargs='+', help='Directorios o patrones glob (p. ej. "V3*.xlsx")')
+    parser.add_argument('--salida', default='.', metavar='DIRECTORIO', help='Directorio de los reportes')
+    parser.add_argument('--procesos', type=int, default=None, metavar='N', help='Procesos del grupo (por defecto, uno por CPU)')
+    parser.add_argument('--perfil', default=None, metavar='ARCHIVO', help='Archivo del que se toma el perfil de esquema')
+    parser.add_argument(
+        '--peso', default=None, metavar='COLUMNA',
+        help='Columna con el factor de expansión por encuestado'
+    )
+    parser.add_argument(
+        '--asociaciones', action='store_true',
+        help='Agrega la hoja de chi-cuadrado, p-valor y V de Cramér'
+    )
+    parser.add_argument(
+        '--bloques', type=int, default=None, metavar='N',
+        help='Lee cada archivo por bloques de N registros'
+    )
+    args = parser.parse_args()
+    if args.procesos is not None and args.procesos < 1:
+        parser.error('--procesos: debe ser mayor que 0')
+    if args.bloques is not None and args.bloques < 1:
+        parser.error('--bloques: el tamaño del bloque debe ser mayor que 0')
+
+    print("=" * 80)
+    print("GENERADOR DE ANÁLISIS CRUZADO - LOTE DE ARCHIVOS")
+    print("=" * 80)
+    print()
+
+    resultados = procesar_lote(
+        args.entradas, args.salida, args.procesos, args.perfil,
+        columna_peso=args.peso, asociaciones=args.asociaciones, tamano_bloque=args.bloques
+    )
+
+    print()
+    print("=" * 80)
+    if all(resultado['estado'] == 'ok' for resultado in resultados):
+        print("Proceso completado exitosamente")
+    else:
+        print("Proceso completado con archivos pendientes (ver resumen)")
+    print("=" * 80)
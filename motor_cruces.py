@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Motor de conteo vectorizado para los análisis cruzados.
+
+Cada columna se codifica una sola vez: la condición de conteo (igualdad o
+str.contains) se evalúa sobre los valores únicos y no sobre cada registro.
+Las columnas de selección única quedan como códigos enteros y las de
+selección múltiple como matrices indicadoras. Las tablas se obtienen con un
+solo np.bincount (única × única) o con un producto de matrices (múltiple),
+sin crear máscaras ni DataFrames filtrados por cada celda.
+
+Con una columna de pesos (factor de expansión por encuestado) los mismos
+bincount y productos de matrices entregan sumas ponderadas: el peso entra
+como weights del bincount o multiplicando la matriz indicadora de la
+pregunta, sin pasadas adicionales.
+
+Las coocurrencias opción × opción entre preguntas de selección múltiple se
+obtienen igual: las matrices indicadoras de todas las preguntas se apilan y
+un solo producto I.T @ I entrega todos los pares a la vez.
+
+Como los conteos son sumas sobre registros, una tabla calculada por bloques
+de registros se obtiene sumando las tablas de cada bloque (sumar_tablas).
+
+Una subpoblación (filtro --where, preguntas condicionales) se indica con una
+máscara de registros: las columnas se codifican sobre la encuesta completa
+y la máscara selecciona filas de los códigos y de las indicadoras, sin
+copiar el DataFrame. Las variables ya codificadas se pueden reutilizar
+entre preguntas (parámetro codificadas).
+
+Autor: Generado automáticamente
+Fecha: 2025
+"""
+
+import pandas as pd
+import numpy as np
+
+# Versión del motor: cambia si cambia la forma o el significado de las tablas
+# (los archivos de agregados parciales la guardan y se verifica al combinarlos)
+VERSION_MOTOR = 1
+
+def predicado_igualdad(valores, categoria):
+    """Condición de conteo para columnas de selección única: valor == categoría."""
+    return valores == categoria
+
+def predicado_contiene(valores, categoria):
+    """Condición de conteo para opciones de preguntas con combinaciones (texto literal)."""
+    return valores.astype(str).str.contains(categoria, na=False, regex=False)
+
+def predicado_contiene_regex(valores, categoria):
+    """Condición de conteo para variables de cruce múltiples (P3, P39)."""
+    return valores.astype(str).str.contains(categoria, na=False)
+
+def predicado_de_variable(var_info):
+    """Condición de conteo de una variable de cruce según su definición."""
+    return predicado_contiene_regex if var_info.get('usa_contains') else predicado_igualdad
+
+def codificar_valores_unicos(serie, categorias, predicado=predicado_igualdad):
+    """
+    Evalúa la condición de conteo una sola vez por valor único de la columna.
+    Retorna (codigos_unicos, pertenencia): el índice del valor único de cada
+    registro (los nulos forman su propio valor) y la matriz booleana
+    valores únicos × categorías.
+    """
+    codigos_unicos, _ = pd.factorize(serie, use_na_sentinel=False)
+    codigos_unicos = np.asarray(codigos_unicos, dtype=np.int64)
+    _, posiciones = np.unique(codigos_unicos, return_index=True)
+
+    # Un registro representativo por valor único (mismo dtype que la columna original)
+    muestra = serie.iloc[posiciones]
+    pertenencia = np.zeros((len(posiciones), len(categorias)), dtype=bool)
+    for k, cat in enumerate(categorias):
+        pertenencia[:, k] = np.asarray(predicado(muestra, cat), dtype=bool)
+    return codigos_unicos, pertenencia
+
+def codificar_patrones(serie, categorias, predicado=predicado_igualdad, incluir_respuesta=False):
+    """
+    Codifica una columna como patrones de pertenencia: registros con el mismo
+    conjunto de categorías comparten el mismo código.
+    Si incluir_respuesta es True se agrega una última columna al patrón que
+    indica si el registro tiene respuesta (no nulo).
+    Retorna (codigos, patrones) con patrones de forma num_patrones × categorías.
+    """
+    codigos_unicos, pertenencia = codificar_valores_unicos(serie, categorias, predicado)
+    if incluir_respuesta:
+        con_respuesta = np.zeros(len(pertenencia), dtype=bool)
+        con_respuesta[np.unique(codigos_unicos[serie.notna().to_numpy()])] = True
+        pertenencia = np.column_stack([pertenencia, con_respuesta])
+    if len(pertenencia) == 0:
+        return codigos_unicos, np.zeros((0, pertenencia.shape[1]), dtype=bool)
+    patrones, inverso = np.unique(pertenencia, axis=0, return_inverse=True)
+    return inverso.reshape(-1)[codigos_unicos], patrones
+
+def codificar_columna(serie, categorias, predicado=predicado_igualdad):
+    """
+    Codifica una columna contra una lista de categorías.
+
+    Retorna un diccionario con:
+        categorias: la lista de categorías
+        multiple: True si algún valor pertenece a más de una categoría
+        codigos: código de categoría por registro (-1 si no pertenece a ninguna),
+                 solo para columnas de selección única
+        indicadora: matriz registros × categorías (float64), solo para
+                    columnas de selección múltiple
+    """
+    codigos_unicos, pertenencia = codificar_valores_unicos(serie, categorias, predicado)
+
+    columna = {'categorias': list(categorias)}
+    if len(pertenencia) and pertenencia.sum(axis=1).max() > 1:
+        columna['multiple'] = True
+        columna['indicadora'] = pertenencia[codigos_unicos].astype(np.float64)
+    else:
+        if pertenencia.shape[1] == 0:
+            # Sin categorías (p. ej. una pregunta sin respuestas en un parcial)
+            mapa = np.full(len(pertenencia), -1, dtype=np.int64)
+        else:
+            mapa = np.where(pertenencia.any(axis=1), pertenencia.argmax(axis=1), -1)
+        columna['multiple'] = False
+        columna['codigos'] = mapa[codigos_unicos] if len(mapa) else codigos_unicos
+    return columna
+
+def indicadora(columna):
+    """Matriz indicadora registros × categorías de una columna codificada."""
+    if columna['multiple']:
+        return columna['indicadora']
+    codigos = columna['codigos']
+    matriz = np.zeros((len(codigos), len(columna['categorias']) + 1), dtype=np.float64)
+    matriz[np.arange(len(codigos)), codigos] = 1.0
+    # La columna extra recibe los códigos -1 (sin categoría) y se descarta
+    return matriz[:, :-1]
+
+def combinar_columnas(col_externa, col_interna):
+    """
+    Columna anidada (agregación por dos claves): cada categoría externa se abre
+    en las categorías internas, con código externa * K_interna + interna.
+    """
+    num_interna = len(col_interna['categorias'])
+    columna = {
+        'categorias': [(a, b) for a in col_externa['categorias'] for b in col_interna['categorias']]
+    }
+    if not col_externa['multiple'] and not col_interna['multiple']:
+        codigos_ext, codigos_int = col_externa['codigos'], col_interna['codigos']
+        columna['multiple'] = False
+        columna['codigos'] = np.where(
+            (codigos_ext >= 0) & (codigos_int >= 0), codigos_ext * num_interna + codigos_int, -1
+        )
+    else:
+        producto = indicadora(col_externa)[:, :, None] * indicadora(col_interna)[:, None, :]
+        columna['multiple'] = True
+        columna['indicadora'] = producto.reshape(len(producto), -1)
+    return columna
+
+def codificar_variable(df, var_info):
+    """
+    Codifica una variable de cruce según su definición; los grupos anidados
+    ('niveles') combinan la variable externa con la interna.
+    """
+    if 'niveles' in var_info:
+        externa, interna = var_info['niveles']
+        return combinar_columnas(codificar_variable(df, externa), codificar_variable(df, interna))
+    return codificar_columna(df[var_info['columna']], var_info['categorias'], predicado_de_variable(var_info))
+
+def seleccionar_filas(columna, filas):
+    """Columna codificada restringida a los registros de una máscara, sin volver a codificar."""
+    seleccion = dict(columna)
+    if columna['multiple']:
+        seleccion['indicadora'] = columna['indicadora'][filas]
+    else:
+        seleccion['codigos'] = columna['codigos'][filas]
+    return seleccion
+
+def contar_bincount(codigos_q, num_q, codigos_d, num_d, pesos=None):
+    """
+    Tabla num_q × num_d para dos columnas de selección única.
+    Combina los códigos como code_q * K + code_d y ejecuta un solo np.bincount.
+    Los códigos -1 se desplazan a la fila/columna 0, que luego se descarta.
+    pesos: vector opcional por registro (la tabla queda como suma de pesos).
+    """
+    combinados = (codigos_q + 1) * (num_d + 1) + (codigos_d + 1)
+    tabla = np.bincount(combinados, weights=pesos, minlength=(num_q + 1) * (num_d + 1))
+    return tabla.reshape(num_q + 1, num_d + 1)[1:, 1:]
+
+def contar_cruce(col_q, col_d, pesos=None):
+    """Tabla de conteos opciones × categorías entre dos columnas codificadas."""
+    num_q, num_d = len(col_q['categorias']), len(col_d['categorias'])
+    if not col_q['multiple'] and not col_d['multiple']:
+        return contar_bincount(col_q['codigos'], num_q, col_d['codigos'], num_d, pesos)
+    if pesos is not None:
+        # El peso multiplica las filas de la indicadora de la pregunta: mismo producto
+        return (indicadora(col_q) * pesos[:, None]).T @ indicadora(col_d)
+    producto = indicadora(col_q).T @ indicadora(col_d)
+    return np.rint(producto).astype(np.int64)
+
+def contar_marginal(columna, filas=None, pesos=None):
+    """
+    Conteo por categoría de una columna codificada.
+    filas: máscara booleana opcional de registros a considerar.
+    pesos: vector opcional por registro (suma de pesos en lugar de conteo).
+    """
+    num = len(columna['categorias'])
+    if pesos is not None and filas is not None:
+        pesos = pesos[filas]
+    if columna['multiple']:
+        matriz = columna['indicadora'] if filas is None else columna['indicadora'][filas]
+        if pesos is not None:
+            return pesos @ matriz
+        return np.rint(matriz.sum(axis=0)).astype(np.int64)
+    codigos = columna['codigos'] if filas is None else columna['codigos'][filas]
+    return np.bincount(codigos + 1, weights=pesos, minlength=num + 1)[1:]
+
+def obtener_pesos(df, columna_peso):
+    """
+    Vector de pesos por registro a partir de la columna de factores de
+    expansión. Los valores vacíos o no numéricos pesan 0.
+    """
+    pesos = pd.to_numeric(df[columna_peso], errors='coerce').to_numpy(dtype=np.float64)
+    return np.nan_to_num(pesos, nan=0.0)
+
+def calcular_tabla_cruzada(df, pregunta_col, opciones, predicado_pregunta, variables, columna_peso=None,
+                           filas=None, codificadas=None):
+    """
+    Calcula todos los conteos de una pregunta contra las variables de cruce.
+    columna_peso: columna opcional de pesos; si se indica, todos los conteos
+    y totales son sumas ponderadas.
+    filas: máscara booleana opcional de los registros de la población; la
+    tabla es la misma que con df[filas], sin copiar df.
+    codificadas: {var_nombre: columna codificada sobre todo df} opcional,
+    para no volver a codificar las variables en cada pregunta.
+
+    Retorna un diccionario con:
+        totales_opcion: registros por opción (columna TOTAL)
+        conteos: {var_nombre: matriz opciones × categorías}
+        totales_categoria: {var_nombre: registros por categoría con respuesta a la pregunta}
+        total_general: total de registros de la población
+        sin_ponderar: solo con pesos, las bases sin ponderar (N de registros):
+                      {total_general, totales_categoria}
+    """
+    col_q = codificar_columna(df[pregunta_col], opciones, predicado_pregunta)
+    con_respuesta = df[pregunta_col].notna().to_numpy()
+    pesos = None if columna_peso is None else obtener_pesos(df, columna_peso)
+    num_registros = len(df)
+    if filas is not None:
+        col_q = seleccionar_filas(col_q, filas)
+        con_respuesta = con_respuesta[filas]
+        pesos = None if pesos is None else pesos[filas]
+        num_registros = int(np.count_nonzero(filas))
+
+    conteos = {}
+    totales_categoria = {}
+    bases_sin_ponderar = {}
+    for var_nombre, var_info in variables.items():
+        if codificadas is not None and var_nombre in codificadas:
+            col_d = codificadas[var_nombre]
+        else:
+            col_d = codificar_variable(df, var_info)
+        if filas is not None:
+            col_d = seleccionar_filas(col_d, filas)
+        conteos[var_nombre] = contar_cruce(col_q, col_d, pesos)
+        totales_categoria[var_nombre] = contar_marginal(col_d, con_respuesta, pesos)
+        if pesos is not None:
+            bases_sin_ponderar[var_nombre] = contar_marginal(col_d, con_respuesta)
+
+    tabla = {
+        'totales_opcion': contar_marginal(col_q, pesos=pesos),
+        'conteos': conteos,
+        'totales_categoria': totales_categoria,
+        'total_general': num_registros if pesos is None else float(pesos.sum())
+    }
+    if pesos is not None:
+        tabla['sin_ponderar'] = {
+            'total_general': num_registros,
+            'totales_categoria': bases_sin_ponderar
+        }
+    return tabla
+
+def sumar_tablas(acumulada, parcial):
+    """
+    Suma dos resultados de calcular_tabla_cruzada (o de calcular_coocurrencias)
+    calculados sobre bloques distintos de registros. Los conteos son lineales
+    en los registros, así que la suma de los bloques es la tabla completa.
+    """
+    if acumulada is None:
+        return parcial
+    if isinstance(acumulada, dict):
+        return {clave: sumar_tablas(acumulada[clave], parcial[clave]) for clave in acumulada}
+    return acumulada + parcial
+
+def calcular_coocurrencias(df, preguntas, pares, filas=None):
+    """
+    Calcula las coocurrencias opción × opción de varios pares de preguntas.
+
+    preguntas: {pregunta_col: (opciones, predicado)}
+    pares: lista de (pregunta_a, pregunta_b)
+    filas: máscara booleana opcional de los registros a considerar
+    Las indicadoras de todas las preguntas, más una columna de "respondió" por
+    pregunta, se apilan en una sola matriz I y se calcula G = I.T @ I una vez.
+
+    Retorna {(pregunta_a, pregunta_b): tabla}, con tabla de la misma forma que
+    calcular_tabla_cruzada:
+        totales_opcion: registros por opción de A
+        conteos: matriz opciones A × opciones B (registros que eligieron ambas)
+        totales_categoria: registros por opción de B que respondieron A
+        total_respondieron: registros que respondieron A (base de la fila TOTAL)
+        total_general: total de registros
+    """
+    bloques = []
+    posiciones = {}
+    inicio = 0
+    for pregunta_col, (opciones, predicado) in preguntas.items():
+        columna = codificar_columna(df[pregunta_col], opciones, predicado)
+        respondio = df[pregunta_col].notna().to_numpy(dtype=np.float64)
+        bloques.append(np.column_stack([indicadora(columna), respondio]))
+        posiciones[pregunta_col] = (inicio, inicio + len(opciones))
+        inicio += len(opciones) + 1
+
+    matriz = np.hstack(bloques) if bloques else np.zeros((len(df), 0))
+    if filas is not None:
+        matriz = matriz[filas]
+    gram = np.rint(matriz.T @ matriz).astype(np.int64)
+
+    tablas = {}
+    for pregunta_a, pregunta_b in pares:
+        ini_a, fin_a = posiciones[pregunta_a]
+        ini_b, fin_b = posiciones[pregunta_b]
+        tablas[(pregunta_a, pregunta_b)] = {
+            'totales_opcion': np.diagonal(gram)[ini_a:fin_a],
+            'conteos': gram[ini_a:fin_a, ini_b:fin_b],
+            'totales_categoria': gram[fin_a, ini_b:fin_b],
+            'total_respondieron': gram[fin_a, fin_a],
+            'total_general': len(matriz)
+        }
+    return tablas
@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Agregados parciales combinables para procesar la encuesta por partes.
+
+Cada archivo de la encuesta (p. ej. el de una oficina regional) se procesa
+por separado con el motor de todos.py y se guarda como un agregado parcial:
+conteos por valor de cada pregunta × categorías de las variables de cruce,
+marginales, frecuencias de los valores (el vocabulario de opciones) y la
+versión del motor. Los parciales no contienen registros individuales.
+
+Las tablas de un parcial se cuentan por valor distinto de la pregunta y no
+por opción, porque las opciones dependen de las frecuencias de todos los
+archivos juntos. Al combinar, los vocabularios se unen, los conteos se
+suman y las opciones se calculan sobre las frecuencias combinadas; cada
+opción es la suma de los valores que la contienen (o que son iguales a
+ella), igual que en la lectura completa.
+
+Uso:
+    python parciales.py crear archivo_entrada archivo_parcial [--peso COLUMNA] [--bloques N]
+    python parciales.py combinar archivo_salida parcial1 [parcial2 ...] [--asociaciones]
+
+Autor: Generado automáticamente
+Fecha: 2025
+"""
+
+import pandas as pd
+import numpy as np
+import argparse
+import json
+import os
+import sys
+
+from motor_cruces import (
+    VERSION_MOTOR, calcular_tabla_cruzada, predicado_contiene, predicado_igualdad, sumar_tablas
+)
+from todos import (
+    VARIABLES_CRUCE, agregar_columnas_derivadas, contar_valores, frecuencias_como_float,
+    generar_todos_analisis, leer_bloques, leer_encuesta, listar_preguntas, mascara_poblacion,
+    opciones_desde_frecuencias, tiene_comas
+)
+
+VERSION_PARCIAL = 1
+
+def construir_parcial(df, variables=VARIABLES_CRUCE, columna_peso=None):
+    """
+    Construye el agregado parcial de un archivo (o de un bloque de registros).
+
+    Retorna un diccionario con:
+        version, version_motor, total_registros, columnas, columna_peso, variables
+        preguntas: {pregunta_col: {num, valores, frecuencias, con_nulos, tabla}}
+    'valores' son los valores distintos de la pregunta, 'frecuencias' sus
+    registros en todo el archivo y 'tabla' el resultado de
+    calcular_tabla_cruzada sobre la población de la pregunta, con los
+    valores como opciones.
+    """
+    df_base = agregar_columnas_derivadas(df.copy())
+
+    preguntas = {}
+    for _, pregunta_col, num_str in listar_preguntas(df):
+        frecuencias = contar_valores(df[pregunta_col])
+        valores = list(frecuencias)
+
+        # Población de la pregunta (P6, P7 y P8 son condicionales)
+        mask_p3, _ = mascara_poblacion(df_base, pregunta_col)
+        poblacion = df_base if mask_p3 is None else df_base[mask_p3]
+
+        preguntas[pregunta_col] = {
+            'num': num_str,
+            'valores': valores,
+            'frecuencias': np.array(list(frecuencias.values()), dtype=np.int64),
+            'con_nulos': bool(df[pregunta_col].isna().any()),
+            'tabla': calcular_tabla_cruzada(
+                poblacion, pregunta_col, valores, predicado_igualdad, variables, columna_peso
+            )
+        }
+
+    return {
+        'version': VERSION_PARCIAL,
+        'version_motor': VERSION_MOTOR,
+        'total_registros': len(df),
+        'columnas': df.columns.tolist(),
+        'columna_peso': columna_peso,
+        'variables': variables,
+        'preguntas': preguntas
+    }
+
+def reindexar_tabla(tabla, posiciones, num_valores):
+    """
+    Lleva las filas por valor de una tabla parcial al vocabulario combinado
+    (posiciones: índice de cada valor del parcial en el vocabulario).
+    """
+    def expandir(arreglo):
+        expandido = np.zeros((num_valores,) + arreglo.shape[1:], dtype=arreglo.dtype)
+        expandido[posiciones] = arreglo
+        return expandido
+
+    reindexada = dict(tabla)
+    reindexada['totales_opcion'] = expandir(tabla['totales_opcion'])
+    reindexada['conteos'] = {var: expandir(conteos) for var, conteos in tabla['conteos'].items()}
+    return reindexada
+
+def firma_variables(variables):
+    """Representación comparable de las variables de cruce de un parcial."""
+    return json.dumps(variables, sort_keys=True, ensure_ascii=False)
+
+def combinar_parciales(parciales):
+    """
+    Suma varios agregados parciales en uno solo. Los parciales deben venir
+    del mismo motor, con las mismas variables de cruce y la misma columna de
+    pesos. El orden de los parciales define el orden de primera aparición de
+    los valores (desempate de opciones con la misma frecuencia).
+    """
+    if not parciales:
+        raise ValueError("No hay parciales para combinar")
+    primero = parciales[0]
+    for parcial in parciales:
+        if parcial['version'] != VERSION_PARCIAL or parcial['version_motor'] != VERSION_MOTOR:
+            raise ValueError(
+                f"Parcial de otra versión (formato {parcial['version']}, motor {parcial['version_motor']}); "
+                f"se esperaba formato {VERSION_PARCIAL}, motor {VERSION_MOTOR}"
+            )
+        if firma_variables(parcial['variables']) != firma_variables(primero['variables']):
+            raise ValueError("Los parciales tienen variables de cruce distintas")
+        if parcial['columna_peso'] != primero['columna_peso']:
+            raise ValueError("Los parciales tienen columnas de pesos distintas")
+
+    columnas = []
+    for parcial in parciales:
+        columnas.extend(col for col in parcial['columnas'] if col not in columnas)
+
+    # Vocabulario combinado de cada pregunta: valores en orden de primera aparición
+    preguntas = {}
+    for parcial in parciales:
+        for pregunta_col, preg in parcial['preguntas'].items():
+            combinada = preguntas.setdefault(pregunta_col, {
+                'num': preg['num'], 'indice': {}, 'frecuencias': None, 'con_nulos': False, 'tabla': None
+            })
+            for valor in preg['valores']:
+                combinada['indice'].setdefault(valor, len(combinada['indice']))
+            combinada['con_nulos'] = combinada['con_nulos'] or preg['con_nulos']
+
+    # Sumar frecuencias y tablas, con las filas de cada parcial en su posición del vocabulario
+    for parcial in parciales:
+        for pregunta_col, preg in parcial['preguntas'].items():
+            combinada = preguntas[pregunta_col]
+            num_valores = len(combinada['indice'])
+            posiciones = np.array([combinada['indice'][valor] for valor in preg['valores']], dtype=np.int64)
+            frecuencias = np.zeros(num_valores, dtype=np.int64)
+            frecuencias[posiciones] = preg['frecuencias']
+            combinada['frecuencias'] = sumar_tablas(combinada['frecuencias'], frecuencias)
+            combinada['tabla'] = sumar_tablas(
+                combinada['tabla'], reindexar_tabla(preg['tabla'], posiciones, num_valores)
+            )
+
+    for combinada in preguntas.values():
+        combinada['valores'] = list(combinada.pop('indice'))
+        # Al restar un parcial (actualización incremental) pueden quedar valores sin registros
+        conservar = np.flatnonzero(combinada['frecuencias'] != 0)
+        if len(conservar) < len(combinada['valores']):
+            tabla = combinada['tabla']
+            combinada['valores'] = [combinada['valores'][i] for i in conservar]
+            combinada['frecuencias'] = combinada['frecuencias'][conservar]
+            combinada['tabla'] = dict(
+                tabla,
+                totales_opcion=tabla['totales_opcion'][conservar],
+                conteos={var: conteos[conservar] for var, conteos in tabla['conteos'].items()}
+            )
+
+    return {
+        'version': VERSION_PARCIAL,
+        'version_motor': VERSION_MOTOR,
+        'total_registros': sum(parcial['total_registros'] for parcial in parciales),
+        'columnas': columnas,
+        'columna_peso': primero['columna_peso'],
+        'variables': primero['variables'],
+        'preguntas': preguntas
+    }
+
+def escalar_parcial(parcial, factor):
+    """
+    Multiplica todos los conteos de un parcial por un factor; con factor -1,
+    combinarlo resta sus registros (correcciones y eliminaciones).
+    """
+    def escalar(valor):
+        if isinstance(valor, dict):
+            return {clave: escalar(v) for clave, v in valor.items()}
+        return valor * factor
+
+    preguntas = {
+        pregunta_col: dict(preg, frecuencias=preg['frecuencias'] * factor, tabla=escalar(preg['tabla']))
+        for pregunta_col, preg in parcial['preguntas'].items()
+    }
+    return dict(parcial, total_registros=parcial['total_registros'] * factor, preguntas=preguntas)
+
+def tablas_desde_parcial(parcial):
+    """
+    Convierte un parcial (normalmente ya combinado) en las tablas por opción
+    que usa generar_todos_analisis (misma forma que calcular_tablas_por_bloques).
+    """
+    preguntas = listar_preguntas(pd.DataFrame(columns=parcial['columnas']))
+    info = {}
+    tablas = {}
+    for _, pregunta_col, _ in preguntas:
+        preg = parcial['preguntas'][pregunta_col]
+        frecuencias = dict(zip(preg['valores'], preg['frecuencias'].tolist()))
+        if preg['con_nulos']:
+            frecuencias = frecuencias_como_float(frecuencias)
+        tiene_combinaciones = tiene_comas(pregunta_col, frecuencias)
+        opciones = opciones_desde_frecuencias(frecuencias, tiene_combinaciones)
+        info[pregunta_col] = (tiene_combinaciones, opciones)
+        if len(opciones) == 0:
+            continue
+
+        # Pertenencia valor → opción: la misma condición de conteo del motor
+        predicado = predicado_contiene if tiene_combinaciones else predicado_igualdad
+        valores = pd.Series(list(frecuencias), dtype=object)
+        pertenencia = np.array(
+            [predicado(valores, opcion).to_numpy(dtype=bool) for opcion in opciones], dtype=np.int64
+        ).reshape(len(opciones), len(valores))
+
+        tabla = preg['tabla']
+        tablas[pregunta_col] = dict(
+            tabla,
+            totales_opcion=pertenencia @ tabla['totales_opcion'],
+            conteos={var: pertenencia @ conteos for var, conteos in tabla['conteos'].items()}
+        )
+
+    return {
+        'total_registros': parcial['total_registros'],
+        'columnas': parcial['columnas'],
+        'preguntas': preguntas,
+        'info': info,
+        'tablas': tablas,
+        'multiples': {},
+        'coocurrencias': {}
+    }
+
+def guardar_parcial(parcial, archivo):
+    """
+    Guarda el parcial en un archivo .npz comprimido: arreglos por pregunta y
+    variable, más los vocabularios y escalares como JSON (igual que el cubo).
+    """
+    nombres_variables = list(parcial['variables'])
+    arreglos = {}
+    metadatos = {
+        'version': parcial['version'],
+        'version_motor': parcial['version_motor'],
+        'total_registros': parcial['total_registros'],
+        'columnas': parcial['columnas'],
+        'columna_peso': parcial['columna_peso'],
+        'variables': parcial['variables'],
+        'preguntas': []
+    }
+    for i, (pregunta_col, preg) in enumerate(parcial['preguntas'].items()):
+        tabla = preg['tabla']
+        meta = {
+            'columna': pregunta_col,
+            'num': preg['num'],
+            'valores': preg['valores'],
+            'con_nulos': preg['con_nulos'],
+            'total_general': tabla['total_general']
+        }
+        arreglos[f'preg{i}_frecuencias'] = preg['frecuencias']
+        arreglos[f'preg{i}_totales_opcion'] = tabla['totales_opcion']
+        for j, var_nombre in enumerate(nombres_variables):
+            arreglos[f'preg{i}_var{j}_conteos'] = tabla['conteos'][var_nombre]
+            arreglos[f'preg{i}_var{j}_totales'] = tabla['totales_categoria'][var_nombre]
+        if 'sin_ponderar' in tabla:
+            meta['sin_ponderar_total_general'] = tabla['sin_ponderar']['total_general']
+            for j, var_nombre in enumerate(nombres_variables):
+                arreglos[f'preg{i}_var{j}_sin_ponderar'] = tabla['sin_ponderar']['totales_categoria'][var_nombre]
+        metadatos['preguntas'].append(meta)
+    arreglos['metadatos'] = np.array(json.dumps(metadatos, ensure_ascii=False, default=str))
+
+    with open(archivo, 'wb') as f:
+        np.savez_compressed(f, **arreglos)
+
+def cargar_parcial(archivo):
+    """
+    Carga un parcial guardado con guardar_parcial.
+    """
+    with np.load(archivo, allow_pickle=False) as datos:
+        metadatos = json.loads(str(datos['metadatos']))
+        if metadatos['version'] != VERSION_PARCIAL:
+            raise ValueError(
+                f"Versión de parcial no soportada: {metadatos['version']} (se esperaba {VERSION_PARCIAL})"
+            )
+        nombres_variables = list(metadatos['variables'])
+        preguntas = {}
+        for i, meta in enumerate(metadatos['preguntas']):
+            tabla = {
+                'totales_opcion': datos[f'preg{i}_totales_opcion'],
+                'conteos': {var: datos[f'preg{i}_var{j}_conteos'] for j, var in enumerate(nombres_variables)},
+                'totales_categoria': {var: datos[f'preg{i}_var{j}_totales'] for j, var in enumerate(nombres_variables)},
+                'total_general': meta['total_general']
+            }
+            if 'sin_ponderar_total_general' in meta:
+                tabla['sin_ponderar'] = {
+                    'total_general': meta['sin_ponderar_total_general'],
+                    'totales_categoria': {
+                        var: datos[f'preg{i}_var{j}_sin_ponderar'] for j, var in enumerate(nombres_variables)
+                    }
+                }
+            preguntas[meta['columna']] = {
+                'num': meta['num'],
+                'valores': meta['valores'],
+                'frecuencias': datos[f'preg{i}_frecuencias'],
+                'con_nulos': meta['con_nulos'],
+                'tabla': tabla
+            }
+    return {
+        'version': metadatos['version'],
+        'version_motor': metadatos['version_motor'],
+        'total_registros': metadatos['total_registros'],
+        'columnas': metadatos['columnas'],
+        'columna_peso': metadatos['columna_peso'],
+        'variables': metadatos['variables'],
+        'preguntas': preguntas
+    }
+
+def generar_parcial(archivo_entrada, archivo_parcial, columna_peso=None, tamano_bloque=None):
+    """
+    Función principal del paso 'crear': lee un archivo de la encuesta (completo
+    o por bloques), construye su parcial y lo guarda en disco.
+    """
+    print(f"Leyendo archivo: {archivo_entrada}")
+
+    if not os.path.exists(archivo_entrada):
+        print(f"ERROR: No se encontró el archivo {archivo_entrada}")
+        sys.exit(1)
+
+    try:
+        if tamano_bloque is None:
+            df = leer_encuesta(archivo_entrada)
+            if columna_peso is not None and columna_peso not in df.columns:
+                print(f"ERROR: No se encontró la columna de pesos '{columna_peso}'")
+                sys.exit(1)
+            parcial = construir_parcial(df, columna_peso=columna_peso)
+        else:
+            # Cada bloque es un parcial; se combinan a medida que se leen
+            parcial = None
+            for bloque in leer_bloques(archivo_entrada, tamano_bloque):
+                if columna_peso is not None and columna_peso not in bloque.columns:
+                    print(f"ERROR: No se encontró la columna de pesos '{columna_peso}'")
+                    sys.exit(1)
+                parcial_bloque = construir_parcial(bloque, columna_peso=columna_peso)
+                parcial = parcial_bloque if parcial is None else combinar_parciales([parcial, parcial_bloque])
+        print(f"Archivo leído exitosamente. Total de registros: {parcial['total_registros']}")
+    except Exception as e:
+        print(f"ERROR al leer el archivo: {e}")
+        sys.exit(1)
+
+    print(f"  Preguntas: {len(parcial['preguntas'])}")
+    print(f"  Valores distintos: {sum(len(preg['valores']) for preg in parcial['preguntas'].values())}")
+
+    print(f"Guardando parcial: {archivo_parcial}")
+    try:
+        guardar_parcial(parcial, archivo_parcial)
+        print(f"✓ Parcial generado exitosamente: {archivo_parcial}")
+    except Exception as e:
+        print(f"ERROR al guardar el parcial: {e}")
+        sys.exit(1)
+
+def generar_desde_parciales(archivos_parciales, archivo_salida, asociaciones=False):
+    """
+    Función principal del paso 'combinar': carga los parciales, los suma y
+    genera los reportes de todos.py (versión con pestañas y en una sola hoja).
+    """
+    parciales = []
+    for archivo in archivos_parciales:
+        print(f"Leyendo parcial: {archivo}")
+        if not os.path.exists(archivo):
+            print(f"ERROR: No se encontró el archivo {archivo}")
+            sys.exit(1)
+        try:
+            parciales.append(cargar_parcial(archivo))
+        except Exception as e:
+            print(f"ERROR al leer el parcial: {e}")
+            sys.exit(1)
+
+    try:
+        combinado = combinar_parciales(parciales)
+    except ValueError as e:
+        print(f"ERROR al combinar los parciales: {e}")
+        sys.exit(1)
+    print(f"Parciales combinados: {len(parciales)} ({combinado['total_registros']} registros)")
+
+    generar_todos_analisis(
+        None, archivo_salida, combinado['variables'], asociaciones=asociaciones,
+        columna_peso=combinado['columna_peso'], agregados=tablas_desde_parcial(combinado)
+    )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Agregados parciales por archivo y combinación en los reportes de todos.py.'
+    )
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    parser_crear = subparsers.add_parser('crear', help='Genera el parcial de un archivo de la encuesta')
+    parser_crear.add_argument('archivo_entrada')
+    parser_crear.add_argument('archivo_parcial')
+    parser_crear.add_argument(
+        '--peso', default=None, metavar='COLUMNA',
+        help='Columna con el factor de expansión por encuestado'
+    )
+    parser_crear.add_argument(
+        '--bloques', type=int, default=None, metavar='N',
+        help='Lee el archivo por bloques de N registros'
+    )
+
+    parser_combinar = subparsers.add_parser('combinar', help='Suma parciales y genera los reportes')
+    parser_combinar.add_argument('archivo_salida')
+    parser_combinar.add_argument('archivos_parciales', nargs='+')
+    parser_combinar.add_argument(
+        '--asociaciones', action='store_true',
+        help='Agrega la hoja de chi-cuadrado, p-valor y V de Cramér'
+    )
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("AGREGADOS PARCIALES")
+    print("=" * 80)
+    print()
+
+    if args.comando == 'crear':
+        if args.bloques is not None and args.bloques < 1:
+            parser.error('--bloques: el tamaño del bloque debe ser mayor que 0')
+        generar_parcial(args.archivo_entrada, args.archivo_parcial, args.peso, args.bloques)
+    else:
+        generar_desde_parciales(args.archivos_parciales, args.archivo_salida, args.asociaciones)
+
+    print()
+    print("=" * 80)
+    print("Proceso completado exitosamente")
+    print("=" * 80)
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Perfil de ejecución (--profile) de todos.py, P3-Cruzado.py y P4-Cruzado.py.
+
+La corrida se ejecuta bajo cProfile (perfil determinista: cada llamada a
+función). El perfil completo se guarda en <salida>-Perfil.prof, que se
+puede abrir con pstats, snakeviz o gprof2dot. Al terminar se muestra el
+tiempo propio de las funciones agrupado por parte del proceso:
+
+    calculo            pandas, NumPy y el motor de conteo
+    estilos            construcción de Font, Border, Side, PatternFill...
+    escritura_celdas   ws.cell, celdas y combinación de celdas de openpyxl
+    guardado           serialización XML y compresión del libro
+    lectura            lectura del Excel/CSV de entrada
+    reporte            el código propio de los scripts (ciclos de las hojas)
+
+El grupo sale del módulo de cada función. Las funciones internas de Python
+(len, isinstance, append...) se reparten entre los grupos de quienes las
+llaman, en proporción al tiempo de cada llamador.
+
+Autor: Generado automáticamente
+Fecha: 2025
+"""
+
+import cProfile
+import os
+import pstats
+
+# Grupo de cada función según la ruta de su módulo (la primera coincidencia gana)
+GRUPOS_PERFIL = (
+    ('guardado', (
+        'openpyxl/writer/', 'openpyxl/worksheet/_writer', 'openpyxl/cell/_writer', 'openpyxl/xml/',
+        'openpyxl/packaging/', 'openpyxl/workbook/_writer', 'openpyxl/styles/stylesheet', 'openpyxl/compat/', 'et_xmlfile/',
+        'xml/etree/', 'zipfile'
+    )),
+    ('lectura', (
+        'pandas/io/', 'openpyxl/reader/', 'openpyxl/worksheet/_reader', 'openpyxl/worksheet/_read_only'
+    )),
+    ('estilos', ('openpyxl/styles/', 'openpyxl/descriptors/')),
+    ('escritura_celdas', ('openpyxl/worksheet/', 'openpyxl/cell/', 'openpyxl/utils/', 'openpyxl/workbook/')),
+    ('calculo', (
+        'pandas/', 'numpy/', 'scipy/', 'motor_cruces.py', 'filtros.py', 'porcentajes.py', 'estadisticas.py',
+        'bootstrap.py'
+    )),
+    ('reporte', ('todos.py', 'P3-Cruzado.py', 'P4-Cruzado.py', 'formato_largo.py', 'almacen.py')),
+)
+
+GRUPO_OTROS = 'otros'
+
+def archivo_perfil(archivo_salida):
+    """<salida>-Perfil.prof (salida sin .xlsx)."""
+    base = archivo_salida[:-len('.xlsx')] if archivo_salida.endswith('.xlsx') else archivo_salida
+    return f'{base}-Perfil.prof'
+
+def grupo_de_archivo(archivo):
+    """Grupo de GRUPOS_PERFIL de un módulo, o None para las funciones internas."""
+    if archivo == '~' or archivo.startswith('<'):
+        return None
+    ruta = archivo.replace(os.sep, '/')
+    for grupo, patrones in GRUPOS_PERFIL:
+        if any(patron in ruta for patron in patrones):
+            return grupo
+    return GRUPO_OTROS
+
+def nombre_funcion(funcion):
+    """'paquete/modulo.py:linea(funcion)' de una clave de pstats."""
+    archivo, linea, nombre = funcion
+    if archivo == '~':
+        return nombre
+    archivo = archivo.replace(os.sep, '/')
+    archivo = archivo.split('site-packages/')[-1] if 'site-packages/' in archivo else os.path.basename(archivo)
+    return f"{archivo}:{linea}({nombre})"
+
+def agrupar_perfil(estadisticas):
+    """
+    Tiempo propio por grupo y funciones de cada grupo.
+    estadisticas: pstats.Stats.
+    Retorna {grupo: {'segundos': tiempo propio, 'funciones': [(segundos, llamadas, acumulado, funcion)]}}.
+    """
+    grupos = {}
+
+    def sumar(grupo, segundos, llamadas, acumulado, funcion):
+        datos = grupos.setdefault(grupo, {'segundos': 0.0, 'funciones': {}})
+        datos['segundos'] += segundos
+        anterior = datos['funciones'].get(funcion, (0.0, 0, 0.0))
+        datos['funciones'][funcion] = (anterior[0] + segundos, anterior[1] + llamadas, anterior[2] + acumulado)
+
+    for funcion, (_, llamadas, propio, acumulado, llamadores) in estadisticas.stats.items():
+        grupo = grupo_de_archivo(funcion[0])
+        if grupo is not None:
+            sumar(grupo, propio, llamadas, acumulado, funcion)
+            continue
+        # Función interna: su tiempo va al grupo de cada llamador
+        repartido = 0.0
+        for llamador, (_, llamadas_llamador, propio_llamador, acumulado_llamador) in llamadores.items():
+            grupo_llamador = grupo_de_archivo(llamador[0]) or GRUPO_OTROS
+            sumar(grupo_llamador, propio_llamador, llamadas_llamador, acumulado_llamador, funcion)
+            repartido += propio_llamador
+        if propio > repartido:
+            sumar(GRUPO_OTROS, propio - repartido, 0, 0.0, funcion)
+
+    return {
+        grupo: {
+            'segundos': datos['segundos'],
+            'funciones': sorted(
+                ((segundos, llamadas, acumulado, funcion) for funcion, (segundos, llamadas, acumulado) in datos['funciones'].items()),
+                reverse=True
+            )
+        }
+        for grupo, datos in grupos.items()
+    }
+
+def imprimir_perfil(grupos, funciones_por_grupo=5):
+    """Resumen del perfil: grupos por tiempo propio y sus funciones más costosas."""
+    total = sum(datos['segundos'] for datos in grupos.values()) or 1.0
+    print(f"\nPERFIL (tiempo propio de las funciones por grupo, {total:.2f} s)")
+    print(f"{'Grupo':<18} {'Segundos':>9} {'%':>6}")
+    print("-" * 35)
+    ordenados = sorted(grupos.items(), key=lambda par: -par[1]['segundos'])
+    for grupo, datos in ordenados:
+        print(f"{grupo:<18} {datos['segundos']:>9.2f} {datos['segundos'] / total:>6.1%}")
+
+    for grupo, datos in ordenados:
+        print(f"\n[{grupo}]  {'Propio s':>9} {'Llamadas':>11} {'Acum. s':>9}")
+        for segundos, llamadas, acumulado, funcion in datos['funciones'][:funciones_por_grupo]:
+            print(f"  {nombre_funcion(funcion)[:70]:<70} {segundos:>9.2f} {llamadas:>11,} {acumulado:>9.2f}")
+
+def ejecutar_con_perfil(archivo_salida, funcion, *args, **kwargs):
+    """
+    Ejecuta funcion(*args, **kwargs) bajo cProfile, guarda el perfil en
+    <archivo_salida sin .xlsx>-Perfil.prof y muestra el resumen por grupo.
+    El perfil se guarda aunque la corrida termine con sys.exit.
+    Retorna el resultado de la función.
+    """
+    perfil = cProfile.Profile()
+    destino = archivo_perfil(archivo_salida)
+    try:
+        return perfil.runcall(funcion, *args, **kwargs)
+    finally:
+        perfil.dump_stats(destino)
+        imprimir_perfil(agrupar_perfil(pstats.Stats(perfil)))
+        print(f"\n✓ Perfil completo: {destino} (python -m pstats {destino})")
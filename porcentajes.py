@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cálculo vectorizado de las tablas de porcentajes.
+
+Recibe la matriz de conteos (opciones × categorías) y el vector de
+denominadores, y entrega la tabla completa ya redondeada en una sola
+llamada. La base del porcentaje y la política de redondeo son parámetros
+explícitos:
+
+    base:
+        'vertical'    conteo / total de la columna (categoría)
+        'horizontal'  conteo / total de la fila (opción)
+        'total'       conteo / total general
+    redondeo:
+        'truncar_centesimas'   dos decimales truncados, formato '0.00%'
+                               (reportes de todos.py)
+        'entero_medio_arriba'  porcentaje entero, .5 o más hacia arriba,
+                               formato '0%' (reportes P3 y P4)
+
+La fila TOTAL es la suma por columna de los porcentajes ya redondeados,
+calculada sobre el arreglo en unidades enteras (sin leer celdas).
+
+Autor: Generado automáticamente
+Fecha: 2025
+"""
+
+import numpy as np
+
+# Política de redondeo: unidades por punto porcentual y formato de Excel
+POLITICAS_REDONDEO = {
+    'truncar_centesimas': {'unidades_por_punto': 100, 'formato': '0.00%'},
+    'entero_medio_arriba': {'unidades_por_punto': 1, 'formato': '0%'}
+}
+
+BASES = ('vertical', 'horizontal', 'total')
+
+def redondear_unidades(porcentajes, redondeo):
+    """
+    Convierte porcentajes (0-100) a enteros en las unidades de la política:
+    centésimas de punto truncadas o puntos enteros con .5 hacia arriba.
+    """
+    if redondeo == 'truncar_centesimas':
+        # Igual que int(p * 100): truncar (los porcentajes no son negativos)
+        return np.trunc(porcentajes * 100).astype(np.int64)
+    if redondeo == 'entero_medio_arriba':
+        enteros = np.floor(porcentajes)
+        return (enteros + (np.mod(porcentajes, 1) >= 0.5)).astype(np.int64)
+    raise ValueError(f"Política de redondeo no válida: {redondeo}")
+
+def calcular_porcentajes(conteos, denominadores, base='vertical', redondeo='truncar_centesimas'):
+    """
+    Calcula la tabla de porcentajes de una matriz de conteos.
+
+    conteos: matriz opciones × categorías (o vector de una sola columna)
+    denominadores: vector por categoría (base 'vertical'), por opción
+                   (base 'horizontal') o escalar (base 'total')
+    Los denominadores en cero dan 0% (se muestran como "---").
+
+    Retorna un diccionario con:
+        unidades: enteros en las unidades de la política (misma forma que conteos)
+        valores: fracciones listas para Excel (unidades / 100 / unidades_por_punto)
+        suma_unidades: suma por columna de las unidades (fila TOTAL)
+        suma_valores: la fila TOTAL como fracciones
+        formato: formato de número de Excel de la política
+    """
+    if base not in BASES:
+        raise ValueError(f"Base de porcentaje no válida: {base}")
+    politica = POLITICAS_REDONDEO[redondeo]
+
+    conteos = np.asarray(conteos, dtype=np.float64)
+    denominadores = np.asarray(denominadores, dtype=np.float64)
+    if base == 'horizontal' and conteos.ndim == 2:
+        denominadores = denominadores[:, None]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Mismo orden de operaciones que conteo / total * 100
+        porcentajes = np.where(denominadores > 0, conteos / denominadores * 100, 0.0)
+
+    tabla = redondear_porcentajes(porcentajes, redondeo)
+    suma_unidades = tabla['unidades'].sum(axis=0)
+    tabla['suma_unidades'] = suma_unidades
+    tabla['suma_valores'] = suma_unidades / (100 * politica['unidades_por_punto'])
+    return tabla
+
+def redondear_porcentajes(porcentajes, redondeo='truncar_centesimas'):
+    """
+    Aplica la política de redondeo a porcentajes ya calculados (0-100), por
+    ejemplo los límites de un intervalo de confianza.
+    Retorna un diccionario con unidades, valores y formato (sin fila TOTAL).
+    """
+    politica = POLITICAS_REDONDEO[redondeo]
+    unidades = redondear_unidades(np.asarray(porcentajes, dtype=np.float64), redondeo)
+    return {
+        'unidades': unidades,
+        'valores': unidades / (100 * politica['unidades_por_punto']),
+        'formato': politica['formato']
+    }
+
+def celda_porcentaje(unidades, valor):
+    """Valor a escribir en la celda: "---" si el porcentaje redondeado es 0."""
+    return "---" if unidades == 0 else float(valor)
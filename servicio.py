@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Servicio HTTP local de tablas cruzadas.
+
+Lee la encuesta una sola vez (p. ej. V3.xlsx, sin conexión a internet) y la
+mantiene en memoria en un grupo de procesos: cada proceso recibe la
+encuesta con las columnas derivadas, las variables de cruce ya
+codificadas (motor_cruces.py) y las poblaciones de P6, P7 y P8, de modo que
+una consulta nueva solo codifica la pregunta: los filtros y la población se
+combinan en una máscara de registros y el motor cuenta sobre los arreglos
+codificados, sin copiar la encuesta. Las respuestas ya generadas se guardan en un caché LRU en el
+proceso principal; dos consultas iguales simultáneas comparten el mismo
+cálculo.
+
+Rutas (GET):
+    /preguntas                      preguntas disponibles
+    /variables                      variables de cruce y sus categorías
+    /cruce?pregunta=P35[&variable=Region_Oficina ...][&filtro=P37=M ...]
+                                    tabla cruzada en JSON (conteos, bases y
+                                    porcentajes con la política de todos.py)
+    /hoja?pregunta=P35[&filtro=...] hoja de la pregunta en .xlsx, con el
+                                    formato de Todos-Cruzado-Pestanas.xlsx
+    /estado                         registros, caché y procesos
+
+Las variables y los filtros se indican por nombre de grupo ('P37 Género'),
+columna ('Region_Oficina') o prefijo del grupo ('P37'); sin 'variable' se
+cruzan todas las de VARIABLES_CRUCE. Varios filtros se combinan con Y.
+
+Uso:
+    python servicio.py [archivo_entrada] [--puerto 8765] [--procesos N] [--cache N] [--precalentar]
+
+Autor: Generado automáticamente
+Fecha: 2025
+"""
+
+import numpy as np
+import argparse
+import io
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from openpyxl import Workbook
+
+from motor_cruces import (
+    calcular_tabla_cruzada, codificar_variable, predicado_contiene, predicado_igualdad
+)
+from porcentajes import calcular_porcentajes
+from todos import (
+    VARIABLES_CRUCE, agregar_columnas_derivadas, detectar_combinaciones_multiples, generar_hoja_pregunta,
+    leer_encuesta, listar_preguntas, mascara_poblacion, obtener_opciones_unicas
+)
+
+TIPO_JSON = 'application/json; charset=utf-8'
+TIPO_XLSX = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Estado de cada proceso del grupo (se llena en iniciar_trabajador)
+ENCUESTA = {}
+
+def resolver_variable(texto, variables=VARIABLES_CRUCE):
+    """Nombre del grupo de VARIABLES_CRUCE por nombre, columna o prefijo del grupo."""
+    texto_min = texto.strip().lower()
+    for var_nombre, var_info in variables.items():
+        if texto_min in (var_nombre.lower(), var_info['columna'].lower(), var_nombre.split()[0].lower()):
+            return var_nombre
+    raise ValueError(f"Variable no válida: '{texto}'. Opciones: {', '.join(info['columna'] for info in variables.values())}")
+
+def resolver_filtro(texto, variables=VARIABLES_CRUCE):
+    """Filtro 'VARIABLE=CATEGORIA' como (grupo, índice de la categoría)."""
+    variable, separador, categoria = texto.partition('=')
+    if not separador:
+        raise ValueError(f"Filtro no válido: '{texto}' (se espera VARIABLE=CATEGORIA)")
+    var_nombre = resolver_variable(variable, variables)
+    categorias = variables[var_nombre]['categorias']
+    categoria = categoria.strip()
+    for criterio in (lambda cat: cat == categoria, lambda cat: cat.lower() == categoria.lower(),
+                     lambda cat: cat.lower().startswith(categoria.lower())):
+        indices = [i for i, cat in enumerate(categorias) if criterio(cat)]
+        if len(indices) == 1:
+            return var_nombre, indices[0]
+    raise ValueError(f"Categoría no válida para {var_nombre}: '{categoria}'. Opciones: {', '.join(categorias)}")
+
+def resolver_preguntas(texto, preguntas):
+    """Columnas de la pregunta por número (P35: todas sus columnas) o por nombre completo."""
+    texto = texto.strip()
+    columnas = [col for _, col, num_str in preguntas if texto == col or texto.lower() == f"p{num_str}".lower()]
+    if not columnas:
+        raise ValueError(f"Pregunta no encontrada: '{texto}' (ver /preguntas)")
+    return columnas
+
+def normalizar_consulta(tipo, parametros, preguntas):
+    """
+    Valida los parámetros de una consulta y la lleva a una clave canónica
+    (tipo, columnas de la pregunta, variables, filtros), que es también la
+    clave del caché.
+    """
+    if 'pregunta' not in parametros:
+        raise ValueError("Falta el parámetro 'pregunta'")
+    columnas = tuple(resolver_preguntas(parametros['pregunta'][0], preguntas))
+    nombres = [resolver_variable(texto) for texto in parametros.get('variable', [])]
+    variables = tuple(dict.fromkeys(nombres)) if nombres else tuple(VARIABLES_CRUCE)
+    filtros = tuple(sorted(set(resolver_filtro(texto) for texto in parametros.get('filtro', []))))
+    return (tipo, columnas, variables if tipo == 'cruce' else (), filtros)
+
+def iniciar_trabajador(df):
+    """
+    Inicializa un proceso del grupo: columnas derivadas, opciones de cada
+    pregunta, población de las preguntas condicionales y variables de cruce
+    codificadas una sola vez. La salida de
+    todos.py se descarta (cada hoja imprime su avance).
+    """
+    sys.stdout = open(os.devnull, 'w')
+    df = agregar_columnas_derivadas(df.copy())
+    ENCUESTA['df'] = df
+    ENCUESTA['info'] = {}
+    ENCUESTA['poblaciones'] = {}
+    for _, pregunta_col, num_str in listar_preguntas(df):
+        tiene_combinaciones = detectar_combinaciones_multiples(df, pregunta_col)
+        ENCUESTA['info'][pregunta_col] = (
+            num_str, tiene_combinaciones, obtener_opciones_unicas(df, pregunta_col, tiene_combinaciones)
+        )
+        mask_p3, _ = mascara_poblacion(df, pregunta_col)
+        if mask_p3 is not None:
+            ENCUESTA['poblaciones'][pregunta_col] = mask_p3.to_numpy()
+    ENCUESTA['codificadas'] = {
+        var_nombre: codificar_variable(df, var_info) for var_nombre, var_info in VARIABLES_CRUCE.items()
+    }
+
+def mascara_filtros(filtros):
+    """Registros que cumplen todos los filtros, desde las variables ya codificadas."""
+    mascara = np.ones(len(ENCUESTA['df']), dtype=bool)
+    for var_nombre, indice in filtros:
+        columna = ENCUESTA['codificadas'][var_nombre]
+        if columna['multiple']:
+            mascara &= columna['indicadora'][:, indice] > 0
+        else:
+            mascara &= columna['codigos'] == indice
+    return mascara
+
+def tabla_consulta(pregunta_col, variables, mascara=None):
+    """
+    Tabla del motor de una pregunta sobre los registros de la máscara de
+    filtros y de su población (P6, P7, P8), con las variables ya codificadas.
+    """
+    _, tiene_combinaciones, opciones = ENCUESTA['info'][pregunta_col]
+    predicado = predicado_contiene if tiene_combinaciones else predicado_igualdad
+    filas = mascara
+    poblacion = ENCUESTA['poblaciones'].get(pregunta_col)
+    if poblacion is not None:
+        filas = poblacion if filas is None else filas & poblacion
+    return calcular_tabla_cruzada(
+        ENCUESTA['df'], pregunta_col, opciones, predicado, variables, filas=filas, codificadas=ENCUESTA['codificadas']
+    )
+
+def tabla_json(pregunta_col, opciones, tabla, variables):
+    """Tabla de conteos del motor como diccionario serializable, con porcentajes en puntos."""
+    porcentajes_total = calcular_porcentajes(tabla['totales_opcion'], tabla['total_general'], base='total')
+    resultado = {
+        'pregunta_col': pregunta_col,
+        'opciones': opciones,
+        'total_general': np.asarray(tabla['total_general']).tolist(),
+        'totales_opcion': np.asarray(tabla['totales_opcion']).tolist(),
+        'porcentajes_total': (porcentajes_total['unidades'] / 100).tolist(),
+        'variables': {}
+    }
+    for var_nombre in variables:
+        porcentajes = calcular_porcentajes(
+            tabla['conteos'][var_nombre], tabla['totales_categoria'][var_nombre], base='vertical'
+        )
+        resultado['variables'][var_nombre] = {
+            'columna': VARIABLES_CRUCE[var_nombre]['columna'],
+            'categorias': list(VARIABLES_CRUCE[var_nombre]['categorias']),
+            'conteos': np.asarray(tabla['conteos'][var_nombre]).tolist(),
+            'totales': np.asarray(tabla['totales_categoria'][var_nombre]).tolist(),
+            'porcentajes': (porcentajes['unidades'] / 100).tolist()
+        }
+    return resultado
+
+def calcular_consulta(clave):
+    """
+    Calcula una consulta en un proceso del grupo.
+    Retorna (tipo de contenido, cuerpo en bytes).
+    """
+    tipo, columnas, variables, filtros = clave
+    df = ENCUESTA['df']
+    mascara = mascara_filtros(filtros) if filtros else None
+
+    if tipo == 'hoja':
+        wb = Workbook()
+        wb.remove(wb.active)
+        for pregunta_col in columnas:
+            num_str, tiene_combinaciones, opciones = ENCUESTA['info'][pregunta_col]
+            generar_hoja_pregunta(wb, df, num_str, pregunta_col, pregunta_col, tiene_combinaciones,
+                                  opciones=opciones, tabla=tabla_consulta(pregunta_col, VARIABLES_CRUCE, mascara))
+        salida = io.BytesIO()
+        wb.save(salida)
+        return TIPO_XLSX, salida.getvalue()
+
+    seleccion = {var_nombre: VARIABLES_CRUCE[var_nombre] for var_nombre in variables}
+    tablas = []
+    for pregunta_col in columnas:
+        _, _, opciones = ENCUESTA['info'][pregunta_col]
+        tabla = tabla_consulta(pregunta_col, seleccion, mascara)
+        tablas.append(tabla_json(pregunta_col, opciones, tabla, variables))
+    cuerpo = {
+        'filtros': [
+            {'variable': var_nombre, 'categoria': VARIABLES_CRUCE[var_nombre]['categorias'][indice]}
+            for var_nombre, indice in filtros
+        ],
+        'registros': len(df) if mascara is None else int(np.count_nonzero(mascara)),
+        'tablas': tablas
+    }
+    return TIPO_JSON, json.dumps(cuerpo, ensure_ascii=False, default=str).encode('utf-8')
+
+def crear_cache(capacidad):
+    """Caché LRU de respuestas, compartido por los hilos del servidor."""
+    return {
+        'entradas': OrderedDict(), 'pendientes': {}, 'capacidad': capacidad,
+        'aciertos': 0, 'fallos': 0, 'candado': threading.Lock()
+    }
+
+def responder_consulta(servicio, clave):
+    """
+    Respuesta de una consulta: desde el caché si ya se calculó; si no, se
+    envía al grupo de procesos (o se espera el cálculo en curso de la misma
+    clave) y se guarda en el caché.
+    """
+    cache = servicio['cache']
+    with cache['candado']:
+        if clave in cache['entradas']:
+            cache['entradas'].move_to_end(clave)
+            cache['aciertos'] += 1
+            return cache['entradas'][clave]
+        cache['fallos'] += 1
+        futuro = cache['pendientes'].get(clave)
+        if futuro is None:
+            futuro = servicio['grupo'].submit(calcular_consulta, clave)
+            cache['pendientes'][clave] = futuro
+
+    try:
+        respuesta = futuro.result()
+    finally:
+        with cache['candado']:
+            cache['pendientes'].pop(clave, None)
+
+    with cache['candado']:
+        cache['entradas'][clave] = respuesta
+        cache['entradas'].move_to_end(clave)
+        while len(cache['entradas']) > cache['capacidad']:
+            cache['entradas'].popitem(last=False)
+    return respuesta
+
+def crear_manejador(servicio):
+    """Manejador HTTP (una instancia por solicitud) ligado al estado del servicio."""
+
+    class Manejador(BaseHTTPRequestHandler):
+        def enviar(self, codigo, tipo, cuerpo, nombre_archivo=None):
+            self.send_response(codigo)
+            self.send_header('Content-Type', tipo)
+            self.send_header('Content-Length', str(len(cuerpo)))
+            if nombre_archivo:
+                self.send_header('Content-Disposition', f'attachment; filename="{nombre_archivo}"')
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def enviar_json(self, codigo, datos):
+            self.enviar(codigo, TIPO_JSON, json.dumps(datos, ensure_ascii=False, default=str).encode('utf-8'))
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            parametros = parse_qs(url.query)
+            inicio = time.perf_counter()
+            try:
+                if url.path == '/preguntas':
+                    self.enviar_json(200, servicio['catalogo'])
+                elif url.path == '/variables':
+                    self.enviar_json(200, {
+                        var_nombre: {'columna': info['columna'], 'categorias': info['categorias']}
+                        for var_nombre, info in VARIABLES_CRUCE.items()
+                    })
+                elif url.path == '/estado':
+                    cache = servicio['cache']
+                    self.enviar_json(200, {
+                        'archivo': servicio['archivo'], 'registros': servicio['registros'],
+                        'procesos': servicio['procesos'], 'cache': {
+                            'entradas': len(cache['entradas']), 'capacidad': cache['capacidad'],
+                            'aciertos': cache['aciertos'], 'fallos': cache['fallos']
+                        }
+                    })
+                elif url.path in ('/cruce', '/hoja'):
+                    clave = normalizar_consulta(url.path[1:], parametros, servicio['preguntas'])
+                    tipo, cuerpo = responder_consulta(servicio, clave)
+                    nombre = f"{parametros['pregunta'][0]}.xlsx" if url.path == '/hoja' else None
+                    self.enviar(200, tipo, cuerpo, nombre)
+                else:
+                    self.enviar_json(404, {'error': f"Ruta no encontrada: {url.path}"})
+            except ValueError as e:
+                self.enviar_json(400, {'error': str(e)})
+            except Exception as e:
+                self.enviar_json(500, {'error': f"Error al procesar la consulta: {e}"})
+            self.log_message('%s (%.1f ms)', self.path, (time.perf_counter() - inicio) * 1000)
+
+        def log_request(self, codigo='-', tamano='-'):
+            # Cada solicitud se registra una vez, con su tiempo, al final de do_GET
+            pass
+
+        def log_message(self, formato, *argumentos):
+            print(f"  {self.address_string()} {formato % argumentos}")
+
+    return Manejador
+
+def iniciar_servicio(archivo_entrada='V3.xlsx', puerto=8765, procesos=None, capacidad_cache=256,
+                     precalentar=False, host='127.0.0.1'):
+    """
+    Función principal: lee la encuesta, inicia el grupo de procesos y
+    atiende solicitudes hasta Ctrl+C.
+    """
+    print(f"Leyendo archivo: {archivo_entrada}")
+    if not os.path.exists(archivo_entrada):
+        print(f"ERROR: No se encontró el archivo {archivo_entrada}")
+        sys.exit(1)
+    try:
+        df = leer_encuesta(archivo_entrada)
+        print(f"Archivo leído exitosamente. Total de registros: {len(df)}")
+    except Exception as e:
+        print(f"ERROR al leer el archivo: {e}")
+        sys.exit(1)
+
+    preguntas = listar_preguntas(df)
+    procesos = procesos or os.cpu_count() or 1
+    servicio = {
+        'archivo': os.path.basename(archivo_entrada),
+        'registros': len(df),
+        'preguntas': preguntas,
+        'catalogo': [{'pregunta': f"P{num_str}", 'pregunta_col': col} for _, col, num_str in preguntas],
+        'procesos': procesos,
+        'cache': crear_cache(capacidad_cache),
+        'grupo': ProcessPoolExecutor(max_workers=procesos, initializer=iniciar_trabajador, initargs=(df,))
+    }
+
+    if precalentar:
+        print(f"Precalculando las {len(preguntas)} tablas con todas las variables...")
+        inicio = time.perf_counter()
+        claves = [('cruce', (col,), tuple(VARIABLES_CRUCE), ()) for _, col, _ in preguntas]
+        hilos = [threading.Thread(target=responder_consulta, args=(servicio, clave)) for clave in claves]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        print(f"✓ Tablas en caché en {time.perf_counter() - inicio:.1f} s")
+
+    servidor = ThreadingHTTPServer((host, puerto), crear_manejador(servicio))
+    print(f"✓ Servicio escuchando en http://{host}:{puerto} ({procesos} procesos, caché de {capacidad_cache} respuestas)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        print("\nDeteniendo el servicio...")
+    finally:
+        servidor.server_close()
+        servicio['grupo'].shutdown(cancel_futures=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Servicio HTTP local de tablas cruzadas de la encuesta.')
+    parser.add_argument('archivo_entrada', nargs='?', default='V3.xlsx')
+    parser.add_argument('--puerto', type=int, default=8765)
+    parser.add_argument('--host', default='127.0.0.1', help='Dirección de escucha (por defecto solo el equipo local)')
+    parser.add_argument('--procesos', type=int, default=None, metavar='N', help='Procesos para consultas nuevas (por defecto, uno por CPU)')
+    parser.add_argument('--cache', type=int, default=256, metavar='N', help='Respuestas guardadas en el caché LRU')
+    parser.add_argument('--precalentar', action='store_true', help='Calcula al iniciar la tabla de cada pregunta con todas las variables')
+    args = parser.parse_args()
+    if args.procesos is not None and args.procesos < 1:
+        parser.error('--procesos: debe ser mayor que 0')
+    if args.cache < 1:
+        parser.error('--cache: debe ser mayor que 0')
+
+    print("=" * 80)
+    print("SERVICIO DE ANÁLISIS CRUZADO")
+    print("=" * 80)
+    print()
+
+    iniciar_servicio(args.archivo_entrada, args.puerto, args.procesos, args.cache, args.precalentar, args.host)
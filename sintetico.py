@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Encuestas sintéticas con la forma de V3.xlsx para medir el rendimiento de
+los reportes con 10 mil, 100 mil o 1 millón de registros.
+
+El esquema se aprende del archivo real: columnas y tipos, el vocabulario de
+opciones de cada pregunta (las combinaciones de las preguntas múltiples se
+conservan como aparecen, con su tasa de selección múltiple) y los vacíos de
+las preguntas condicionales. En cada columna se generan primero los vacíos y
+después los valores, cada parte condicionada a una columna anterior (su
+"padre", elegido por información mutua con penalización BIC). Así se
+mantienen relaciones como P3 → P6/P7/P8, P9 → P9 Otra Personería o
+P43 Tipo de Punto → P44 Región Aduana → P44 Aduana. Las distribuciones de
+cada columna y de cada par columna-padre coinciden con las del archivo real;
+las demás relaciones no se conservan.
+
+ID Encuesta se numera de nuevo y Fecha Entrevista se reparte en el mismo
+periodo. Se escribe en Excel (modo write_only de openpyxl, por bloques) y en
+formato columnar: CSV y, si está instalado pyarrow (o fastparquet), Parquet.
+
+Uso:
+    python sintetico.py [V3.xlsx] [--filas 10000 100000 1000000] [--formatos xlsx csv parquet]
+
+Autor: Generado automáticamente
+Fecha: 2025
+"""
+
+import pandas as pd
+import numpy as np
+import argparse
+import math
+import os
+import sys
+import time
+from openpyxl import Workbook
+
+from todos import contar_valores, leer_encuesta, tiene_comas
+
+# Categorías (con el vacío) que puede tener una columna para servir de padre
+MAX_CATEGORIAS_PADRE = 40
+
+# Filas máximas de una hoja de Excel (con el encabezado)
+MAX_FILAS_EXCEL = 1048576
+
+# Registros por bloque al escribir el Excel
+FILAS_POR_BLOQUE = 50000
+
+FORMATOS = ('xlsx', 'csv', 'parquet')
+
+def codificar(serie):
+    """Códigos de los valores de una columna; el vacío es el último código."""
+    codigos, unicos = pd.factorize(serie)
+    codigos = np.asarray(codigos, dtype=np.int64)
+    codigos[codigos < 0] = len(unicos)
+    return codigos, unicos
+
+def puntaje_padre(codigos_hijo, num_hijo, codigos_padre, num_padre):
+    """
+    n·I(hijo; padre) − ½·ln(n)·(grados de libertad): mayor que 0 si el padre
+    explica el hijo más de lo que se espera por azar.
+    """
+    n = len(codigos_hijo)
+    conjunta = np.bincount(codigos_padre * num_hijo + codigos_hijo, minlength=num_padre * num_hijo)
+    conjunta = conjunta.reshape(num_padre, num_hijo).astype(np.float64)
+    por_padre = conjunta.sum(axis=1, keepdims=True)
+    por_hijo = conjunta.sum(axis=0, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        terminos = conjunta * np.log(conjunta * n / (por_padre * por_hijo))
+    informacion = np.nansum(terminos)
+    return informacion - 0.5 * math.log(n) * (num_padre - 1) * (num_hijo - 1)
+
+def es_secuencia(serie):
+    """Columna entera sin vacíos ni repetidos en orden creciente (ID Encuesta)."""
+    return (
+        pd.api.types.is_integer_dtype(serie.dtype) and len(serie) > 1
+        and serie.is_unique and serie.is_monotonic_increasing
+    )
+
+def distribucion(codigos, num_valores, codificadas, filas=None):
+    """
+    Padre y probabilidades de unos códigos (solo los registros de filas, si
+    se indican): la columna de codificadas que más los explica y la
+    distribución de los valores por categoría del padre, o la distribución
+    marginal (una fila) si ninguna los explica.
+    Retorna (padre, probabilidades).
+    """
+    padre, mejor = None, 0.0
+    for candidata, (codigos_padre, num_padre) in codificadas.items():
+        if filas is not None:
+            codigos_padre = codigos_padre[filas]
+        puntaje = puntaje_padre(codigos, num_valores, codigos_padre, num_padre)
+        if puntaje > mejor:
+            padre, mejor = candidata, puntaje
+
+    marginal = np.bincount(codigos, minlength=num_valores)[np.newaxis, :]
+    if padre is None:
+        conteos = marginal
+    else:
+        codigos_padre, num_padre = codificadas[padre]
+        if filas is not None:
+            codigos_padre = codigos_padre[filas]
+        conteos = np.bincount(codigos_padre * num_valores + codigos, minlength=num_padre * num_valores)
+        conteos = conteos.reshape(num_padre, num_valores)
+        # Categorías del padre sin registros: distribución marginal
+        conteos[conteos.sum(axis=1) == 0] = marginal[0]
+    return padre, conteos / conteos.sum(axis=1, keepdims=True)
+
+def aprender_esquema(df):
+    """
+    Esquema de la encuesta: por columna, su tipo ('secuencia', 'fecha' o
+    'categorica') y, para las categóricas, sus valores y dos distribuciones
+    condicionadas a un padre: la de los vacíos ('padre_vacio',
+    'probabilidades_vacio') y la de los valores en los registros no vacíos
+    ('padre', 'probabilidades').
+    """
+    columnas = {}
+    codificadas = {}
+    for columna in df.columns:
+        serie = df[columna]
+        if es_secuencia(serie):
+            columnas[columna] = {'tipo': 'secuencia', 'inicio': int(serie.iloc[0])}
+            continue
+        if pd.api.types.is_datetime64_any_dtype(serie.dtype):
+            columnas[columna] = {'tipo': 'fecha', 'minimo': serie.min(), 'maximo': serie.max()}
+            continue
+
+        codigos, unicos = codificar(serie)
+        vacios = codigos == len(unicos)
+        padre_vacio, probabilidades_vacio = distribucion(vacios.astype(np.int64), 2, codificadas)
+        padre, probabilidades = None, np.zeros((1, 0))
+        if not vacios.all():
+            filas = np.flatnonzero(~vacios)
+            padre, probabilidades = distribucion(codigos[filas], len(unicos), codificadas, filas)
+
+        columnas[columna] = {
+            'tipo': 'categorica',
+            'valores': unicos,
+            'entero': pd.api.types.is_integer_dtype(serie.dtype),
+            'padre_vacio': padre_vacio,
+            'probabilidades_vacio': probabilidades_vacio,
+            'padre': padre,
+            'probabilidades': probabilidades
+        }
+        if len(unicos) + 1 <= MAX_CATEGORIAS_PADRE:
+            codificadas[columna] = (codigos, len(unicos) + 1)
+
+    return {'registros': len(df), 'columnas': columnas}
+
+def muestrear(rng, probabilidades, cantidad):
+    """Códigos de valores según una fila de probabilidades."""
+    acumuladas = np.cumsum(probabilidades)
+    codigos = np.searchsorted(acumuladas, rng.random(cantidad) * acumuladas[-1], side='right')
+    return np.minimum(codigos, len(probabilidades) - 1)
+
+def muestrear_condicionado(rng, probabilidades, codigos_padre, cantidad):
+    """
+    Códigos de cantidad registros; con padre (codigos_padre), cada registro
+    según la fila de probabilidades de su categoría.
+    """
+    if codigos_padre is None:
+        return muestrear(rng, probabilidades[0], cantidad)
+    codigos = np.empty(cantidad, dtype=np.int64)
+    # Registros agrupados por categoría del padre: un muestreo por grupo
+    orden = np.argsort(codigos_padre, kind='stable')
+    limites = np.searchsorted(codigos_padre[orden], np.arange(len(probabilidades) + 1))
+    for categoria in range(len(probabilidades)):
+        indices = orden[limites[categoria]:limites[categoria + 1]]
+        if len(indices):
+            codigos[indices] = muestrear(rng, probabilidades[categoria], len(indices))
+    return codigos
+
+def columna_desde_codigos(info, codigos):
+    """Columna del DataFrame: categórica para el texto, numérica para los números."""
+    valores = info['valores']
+    vacio = len(valores)
+    if pd.api.types.is_numeric_dtype(valores.dtype) and not pd.api.types.is_bool_dtype(valores.dtype):
+        if info['entero'] and not (codigos == vacio).any():
+            return np.asarray(valores)[codigos]
+        return np.append(np.asarray(valores, dtype=np.float64), np.nan)[codigos]
+    codigos = np.where(codigos == vacio, -1, codigos)
+    return pd.Categorical.from_codes(codigos, categories=pd.Index(valores, dtype=object))
+
+def generar_encuesta(esquema, filas, semilla=None):
+    """DataFrame sintético de filas registros con el esquema aprendido."""
+    rng = np.random.default_rng(semilla)
+    generadas = {}
+    codigos_por_columna = {}
+    for columna, info in esquema['columnas'].items():
+        if info['tipo'] == 'secuencia':
+            generadas[columna] = np.arange(info['inicio'], info['inicio'] + filas, dtype=np.int64)
+            continue
+        if info['tipo'] == 'fecha':
+            segundos = int((info['maximo'] - info['minimo']).total_seconds())
+            desplazamientos = pd.to_timedelta(np.sort(rng.integers(0, segundos + 1, filas)), unit='s')
+            generadas[columna] = info['minimo'] + desplazamientos
+            continue
+
+        padre_vacio = codigos_por_columna.get(info['padre_vacio'])
+        vacios = muestrear_condicionado(rng, info['probabilidades_vacio'], padre_vacio, filas).astype(bool)
+        codigos = np.full(filas, len(info['valores']), dtype=np.int64)
+        no_vacios = np.flatnonzero(~vacios)
+        if len(no_vacios):
+            padre = codigos_por_columna.get(info['padre'])
+            codigos[no_vacios] = muestrear_condicionado(
+                rng, info['probabilidades'], None if padre is None else padre[no_vacios], len(no_vacios)
+            )
+        codigos_por_columna[columna] = codigos
+        generadas[columna] = columna_desde_codigos(info, codigos)
+    return pd.DataFrame(generadas)
+
+def resumen_forma(df):
+    """
+    Tasa de selección múltiple de las preguntas con combinaciones y
+    proporción de vacíos de cada columna.
+    """
+    multiples = {}
+    for columna in df.columns:
+        frecuencias = contar_valores(df[columna])
+        if tiene_comas(columna, frecuencias):
+            multiples[columna] = sum(
+                frecuencia for valor, frecuencia in frecuencias.items() if ',' in str(valor)
+            ) / len(df)
+    return multiples, df.isna().mean().to_dict()
+
+def imprimir_comparacion(df_real, df_sintetico):
+    """Compara la forma de la encuesta real con la de la sintética."""
+    multiples_real, vacios_real = resumen_forma(df_real)
+    multiples_sintetico, vacios_sintetico = resumen_forma(df_sintetico)
+    print(f"  {'Selección múltiple':<45} {'Real':>7} {'Sintética':>10}")
+    for columna, tasa in multiples_real.items():
+        print(f"  {columna[:45]:<45} {tasa:>7.1%} {multiples_sintetico.get(columna, 0.0):>10.1%}")
+    diferencias = {columna: abs(vacios_sintetico[columna] - vacios_real[columna]) for columna in vacios_real}
+    peor = max(diferencias, key=diferencias.get)
+    print(f"  Mayor diferencia en vacíos: {peor} ({vacios_real[peor]:.1%} real, {vacios_sintetico[peor]:.1%} sintética)")
+
+def etiqueta_filas(filas):
+    """10000 → '10k', 1000000 → '1M'."""
+    if filas % 1000000 == 0:
+        return f'{filas // 1000000}M'
+    if filas % 1000 == 0:
+        return f'{filas // 1000}k'
+    return str(filas)
+
+def escribir_excel(df, archivo):
+    """Escribe la encuesta en una hoja, por bloques y en modo write_only."""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Sheet1')
+    ws.append(list(df.columns))
+    for inicio in range(0, len(df), FILAS_POR_BLOQUE):
+        bloque = df.iloc[inicio:inicio + FILAS_POR_BLOQUE].astype(object)
+        bloque = bloque.where(bloque.notna(), None)
+        for fila in bloque.itertuples(index=False, name=None):
+            ws.append(fila)
+    wb.save(archivo)
+
+def escribir_columnar(df, base, formatos):
+    """
+    Escribe <base>.csv y <base>.parquet (si está en formatos y hay un motor
+    de Parquet instalado). Retorna la lista de archivos escritos.
+    """
+    archivos = []
+    if 'csv' in formatos:
+        archivo_csv = f'{base}.csv'
+        df.to_csv(archivo_csv, index=False, encoding='utf-8')
+        archivos.append(archivo_csv)
+    if 'parquet' in formatos:
+        archivo_parquet = f'{base}.parquet'
+        try:
+            df.to_parquet(archivo_parquet, index=False)
+            archivos.append(archivo_parquet)
+        except ImportError:
+            print("  ⚠ No hay motor de Parquet instalado (pyarrow o fastparquet): no se escribe el Parquet")
+    return archivos
+
+def generar_sinteticas(archivo_entrada, tamanos, formatos=FORMATOS, directorio='.', prefijo=None, semilla=2025):
+    """
+    Aprende el esquema de archivo_entrada y escribe una encuesta sintética
+    por tamaño: <prefijo>-<10k|100k|1M>.<formato>. Retorna los archivos escritos.
+    """
+    if not os.path.exists(archivo_entrada):
+        print(f"ERROR: No se encontró el archivo {archivo_entrada}")
+        sys.exit(1)
+    df_real = leer_encuesta(archivo_entrada)
+    esquema = aprender_esquema(df_real)
+    categoricas = [info for info in esquema['columnas'].values() if info['tipo'] == 'categorica']
+    condicionadas = sum(info['padre'] is not None or info['padre_vacio'] is not None for info in categoricas)
+    print(f"✓ Esquema aprendido de {archivo_entrada}: {len(df_real)} registros, {len(esquema['columnas'])} columnas "
+          f"({condicionadas} condicionadas a otra columna)")
+
+    if prefijo is None:
+        prefijo = os.path.splitext(os.path.basename(archivo_entrada))[0] + '-Sintetico'
+    os.makedirs(directorio, exist_ok=True)
+
+    archivos = []
+    for indice, filas in enumerate(tamanos):
+        inicio = time.perf_counter()
+        base = os.path.join(directorio, f'{prefijo}-{etiqueta_filas(filas)}')
+        df = generar_encuesta(esquema, filas, None if semilla is None else semilla + indice)
+        print(f"\n{etiqueta_filas(filas)}: {filas:,} registros generados en {time.perf_counter() - inicio:.1f} s")
+        imprimir_comparacion(df_real, df)
+
+        if 'xlsx' in formatos:
+            if filas + 1 > MAX_FILAS_EXCEL:
+                print(f"  ⚠ {filas:,} registros no caben en una hoja de Excel: no se escribe el .xlsx")
+            else:
+                escribir_excel(df, f'{base}.xlsx')
+                archivos.append(f'{base}.xlsx')
+        archivos.extend(escribir_columnar(df, base, formatos))
+        print(f"  ✓ Escrito en {time.perf_counter() - inicio:.1f} s")
+    return archivos
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Genera encuestas sintéticas con la forma de la encuesta real para medir el rendimiento.'
+    )
+    parser.add_argument('archivo_entrada', nargs='?', default='V3.xlsx', help='Encuesta real (Excel o CSV)')
+    parser.add_argument(
+        '--filas', type=int, nargs='+', default=[10000, 100000, 1000000], metavar='N',
+        help='Registros de cada encuesta sintética (por defecto 10000 100000 1000000)'
+    )
+    parser.add_argument(
+        '--formatos', nargs='+', choices=FORMATOS, default=list(FORMATOS),
+        help='Formatos de salida (por defecto xlsx csv parquet)'
+    )
+    parser.add_argument('--salida', default='.', metavar='DIRECTORIO', help='Directorio de las encuestas')
+    parser.add_argument('--prefijo', default=None, help='Prefijo de los archivos (por defecto <entrada>-Sintetico)')
+    parser.add_argument('--semilla', type=int, default=2025, help='Semilla del generador aleatorio')
+    args = parser.parse_args()
+    if any(filas < 1 for filas in args.filas):
+        parser.error('--filas: debe ser mayor que 0')
+
+    print("=" * 80)
+    print("GENERADOR DE ENCUESTAS SINTÉTICAS")
+    print("=" * 80)
+    print()
+
+    archivos = generar_sinteticas(
+        args.archivo_entrada, args.filas, args.formatos, args.salida, args.prefijo, args.semilla
+    )
+
+    print()
+    for archivo in archivos:
+        print(f"✓ {archivo}")
+    print()
+    print("=" * 80)
+    print("Proceso completado exitosamente")
+    print("=" * 80)
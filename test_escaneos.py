@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Prueba de regresión del contador de escaneos: genera los reportes de
+todos.py sobre V3-1.xlsx con el contador activo y falla si alguna hoja
+vuelve a escanear la encuesta por celda (str.contains, máscaras de
+igualdad o DataFrames filtrados).
+
+Uso:
+    python -m pytest -q test_escaneos.py
+
+Autor: Generado automáticamente
+Fecha: 2025
+"""
+
+import os
+
+from instrumentacion import activar_contador_escaneos, afirmar_limite_escaneos, desactivar_contador_escaneos
+from todos import generar_todos_analisis
+
+ARCHIVO_ENCUESTA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'V3-1.xlsx')
+
+# En V3-1 la hoja que más escanea (P10) hace hoy 364 escaneos sobre 16,796
+# filas (sobre los valores únicos de cada columna). Contar por celda serían
+# miles de escaneos sobre los 1,330 registros cada uno
+MAXIMO_ESCANEOS_POR_HOJA = 500
+MAXIMO_FILAS_POR_HOJA = 50_000
+
+def test_escaneos_por_hoja(tmp_path):
+    activar_contador_escaneos()
+    try:
+        resumen = generar_todos_analisis(ARCHIVO_ENCUESTA, str(tmp_path / 'Todos-Cruzado.xlsx'))
+    finally:
+        desactivar_contador_escaneos()
+    assert not resumen['errores']
+    afirmar_limite_escaneos(MAXIMO_ESCANEOS_POR_HOJA, maximo_filas=MAXIMO_FILAS_POR_HOJA)
@@ -10,12 +10,33 @@ Fecha: 2025
 
 import pandas as pd
 import numpy as np
-from openpyxl import Workbook
+from openpyxl import Workbook, load_workbook
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
 import os
 import sys
 import re
+import argparse
+import contextlib
+import functools
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from estadisticas import calcular_asociaciones
+from bootstrap import calcular_intervalos_bootstrap
+from almacen import clave_origen, guardar_resultados
+from filtros import compilar_filtro, particionar_registros
+from formato_largo import construir_tabla_larga, exportar_tabla_larga
+from instrumentacion import (
+    activar_contador_escaneos, activar_perfil_memoria, afirmar_limite_escaneos, etapa, iniciar_registro,
+    terminar_registro
+)
+from perfilador import ejecutar_con_perfil
+from porcentajes import calcular_porcentajes, celda_porcentaje, redondear_porcentajes
+from motor_cruces import (
+    calcular_coocurrencias, calcular_tabla_cruzada, codificar_variable, obtener_pesos, predicado_contiene,
+    predicado_igualdad, sumar_tablas
+)
 
 def crear_rango_edad(edad):
     """
@@ -96,47 +117,55 @@ def obtener_region_aduana(aduana):
     
     return None
 
-def detectar_combinaciones_multiples(df, columna):
+def contar_valores(serie):
     """
-    Detecta si una columna tiene combinaciones múltiples (valores con comas).
+    Frecuencia de cada valor no nulo de una columna, en orden de primera
+    aparición. Es todo lo que necesitan detectar_combinaciones_multiples y
+    obtener_opciones_unicas, y se puede acumular por bloques.
+    """
+    valores = serie.dropna()
+    codigos, unicos = pd.factorize(valores)
+    return dict(zip(unicos.tolist(), np.bincount(codigos, minlength=len(unicos)).tolist()))
+
+def frecuencias_como_float(frecuencias):
+    """
+    Convierte a float los valores enteros de unas frecuencias. read_excel lee
+    como float las columnas enteras con vacíos; las frecuencias acumuladas
+    por partes (bloques, archivos) se convierten igual para que las opciones
+    coincidan con las de la lectura completa.
+    """
+    return {
+        (float(valor) if isinstance(valor, (int, np.integer)) and not isinstance(valor, bool) else valor): frecuencia
+        for valor, frecuencia in frecuencias.items()
+    }
+
+def tiene_comas(columna, frecuencias):
+    """
+    Detecta combinaciones múltiples a partir de las frecuencias de una columna.
     """
-    if columna not in df.columns:
-        return False
-    
     # EXCEPCIÓN: P43 tiene comas pero es una sola opción, no múltiple
     if columna == 'P43 - Tipo de Punto':
         return False
-    
-    valores = df[columna].dropna()
-    if len(valores) == 0:
-        return False
-    
-    valores_con_comas = valores.astype(str).str.contains(',', na=False)
-    return valores_con_comas.sum() > 0
+    return any(',' in str(valor) for valor in frecuencias)
 
-def obtener_opciones_unicas(df, columna, tiene_combinaciones):
+def opciones_desde_frecuencias(frecuencias, tiene_combinaciones):
     """
-    Obtiene las opciones únicas de una pregunta.
-    Si tiene combinaciones, extrae las opciones principales (que aparecen más frecuentemente).
-    Si no tiene combinaciones, devuelve los valores únicos.
+    Opciones de una pregunta a partir de las frecuencias de sus valores
+    (ver obtener_opciones_unicas).
     """
-    if columna not in df.columns:
-        return []
-    
-    valores = df[columna].dropna()
-    if len(valores) == 0:
+    if len(frecuencias) == 0:
         return []
     
     if tiene_combinaciones:
         # Extraer todas las opciones individuales de las combinaciones
         opciones_contador = {}
-        for valor in valores:
+        for valor, frecuencia in frecuencias.items():
             valor_str = str(valor).strip()
             # Dividir por comas y limpiar
             partes = [p.strip() for p in valor_str.split(',')]
             for parte in partes:
                 if parte:
-                    opciones_contador[parte] = opciones_contador.get(parte, 0) + 1
+                    opciones_contador[parte] = opciones_contador.get(parte, 0) + frecuencia
         
         # Ordenar por frecuencia y devolver las más comunes
         # Para preguntas con formato "a. Opción", "b. Opción", etc., estas serán las principales
@@ -156,40 +185,494 @@ def obtener_opciones_unicas(df, columna, tiene_combinaciones):
             return [op for op, _ in opciones_ordenadas]
     else:
         # Sin combinaciones, devolver valores únicos
-        return sorted(valores.unique().tolist())
+        return sorted(frecuencias)
 
-def normalizar_combinaciones(valor, opciones_principales):
+def detectar_combinaciones_multiples(df, columna):
     """
-    Normaliza valores con combinaciones múltiples.
-    Detecta qué opciones principales están presentes y las ordena.
+    Detecta si una columna tiene combinaciones múltiples (valores con comas).
     """
-    if pd.isna(valor):
-        return None
-    valor_str = str(valor).strip()
+    if columna not in df.columns:
+        return False
+    return tiene_comas(columna, contar_valores(df[columna]))
+
+def obtener_opciones_unicas(df, columna, tiene_combinaciones):
+    """
+    Obtiene las opciones únicas de una pregunta.
+    Si tiene combinaciones, extrae las opciones principales (que aparecen más frecuentemente).
+    Si no tiene combinaciones, devuelve los valores únicos.
+    """
+    if columna not in df.columns:
+        return []
+    return opciones_desde_frecuencias(contar_valores(df[columna]), tiene_combinaciones)
+
+# Variables de cruce: cada grupo de columnas del reporte con su columna de origen
+# y sus categorías. 'usa_contains' marca las columnas con combinaciones múltiples.
+VARIABLES_CRUCE = {
+    'P37 Género': {
+        'columna': 'P37 - Género',
+        'categorias': ['H', 'M', 'No deseo responder'],
+        'col_inicio': 3
+    },
+    'P3 Medios SAT utilizados': {
+        'columna': 'P3 - Medios SAT Utilizados',
+        'categorias': ['a. Presencial', 'b. Contact Center', 'c. Servicios Electrónicos'],
+        'col_inicio': 6,
+        'usa_contains': True  # Marcar que usa str.contains() para contar
+    },
+    'Rango de edad': {
+        'columna': 'Rango_Edad',
+        'categorias': ['18 - 25', '26 - 35', '36 - 45', '46 - 60', 'Más de 61'],
+        'col_inicio': 9
+    },
+    'P40 Nivel académico': {
+        'columna': 'P40 - Nivel Académico',
+        'categorias': [
+            'a. Ninguno', 'b. Primaria incompleta', 'c. Primaria completa',
+            'd. Secundaria incompleta (1ro a 3ro básico)', 'e. Secundaria Completa (1ro a 3ro básico)',
+            'f. Diversificado incompleto', 'g. Diversificado completo', 'h. Técnico',
+            'i. Universidad incompleta', 'j. Universidad Completa', 'k. Maestría / Posgrado'
+        ],
+        'col_inicio': 14
+    },
+    'P39 Idiomas': {
+        'columna': 'P39 - Idiomas',
+        'categorias': [
+            'a. Achi', 'b. Qánjob\'al', 'c. Q\'eqchi', 'd. Akateco', 'e. Kaqchikel',
+            'f. Sakapulteko', 'h. Kiché', 'i. Sipakapense', 'k. Mam', 'n. Mopan',
+            'p. Ixil', 'q. Poqomam', 's. Jakalteco', 't. Poqomchi', 'u. Ninguno',
+            'v. Inglés', 'w. Otro'
+        ],
+        'col_inicio': 25,
+        'usa_contains': True
+    },
+    'P44 Oficina/Agencia/Delegación': {
+        'columna': 'P44 - Oficina/Agencia/Delegación',
+        'categorias': [
+            'Alta Verapaz', 'Baja Verapaz', 'Chimaltenango', 'Chiquimula', 'El Progreso',
+            'Escuintla', 'Guatemala', 'Huehuetenango', 'Izabal', 'Jalapa', 'Jutiapa',
+            'Petén', 'Quetzaltenango', 'Quiché', 'Retalhuleu', 'Sacatepéquez', 'San Marcos',
+            'Santa Rosa', 'Sololá', 'Suchitepéquez', 'Totonicapán', 'Zacapa'
+        ],
+        'col_inicio': 42
+    },
+    'P44.1 Aduana': {
+        'columna': 'P44 - Aduana',
+        'categorias': [
+            'Central Guatemala', 'El Carmen', 'Integrada Corinto', 'Integrada El Florido',
+            'La Mesilla', 'Puerto Barrios Almacenadora Pelícano, S.A -ALPELSA', 'Puerto Quetzal',
+            'San Cristóbal', 'Santo Tomás de Castilla Zona Libre de Industria y Comercio -ZOLIC-',
+            'Tikal', 'Valle Nuevo'
+        ],
+        'col_inicio': 64
+    },
+    'P9 Personería': {
+        'columna': 'P9 - Personería',
+        'categorias': [
+            'a. Contribuyente/Propietario.', 'b. Representante Legal', 'c. Abogado y Notario',
+            'd. Mandatario', 'e. Contador/auxiliar', 'f. Contador Público y Auditor',
+            'g. Gestor Tributario', 'h. Importador', 'i. Exportador', 'j. Asistente de Agente',
+            'k. Auxiliar Gestor Tributario', 'm. Consolidador/Descons.', 'n. Transportista Ad',
+            'p. Mensajero', 'r. Otro'
+        ],
+        'col_inicio': 75
+    },
+    'P38 Etnia': {
+        'columna': 'P38 - Etnia',
+        'categorias': ['Garifuna', 'Ladino', 'Maya', 'Otro', 'Xinca'],
+        'col_inicio': 90
+    },
+    'Oficina/Agencia/Delegación': {
+        'columna': 'Region_Oficina',
+        'categorias': ['Central', 'Occidente', 'Sur', 'Nororiente'],
+        'col_inicio': 95
+    },
+    'Aduana': {
+        'columna': 'Region_Aduana',
+        'categorias': ['Central', 'Occidente', 'Sur', 'Nororiente'],
+        'col_inicio': 99
+    }
+}
+
+# Preguntas condicionales: solo se analizan los registros que marcaron la opción indicada en P3
+FILTROS_POBLACION = {
+    'P6 - Gestión Contact Center': 'b. Contact Center',
+    'P7 - Medio Contact Center': 'b. Contact Center',
+    'P8 - Gestión Visita Presencial': 'a. Presencial'
+}
+
+def definir_grupo_anidado(externa, interna, variables=VARIABLES_CRUCE):
+    """
+    Define un grupo de columnas anidado: cada categoría de la variable externa
+    se abre en las categorías de la interna (p. ej. Género dentro de
+    Region_Oficina). externa e interna son nombres de grupos de 'variables'.
+    Retorna (nombre, definición) para agregar al diccionario de variables.
+    """
+    info_externa = variables[externa]
+    info_interna = variables[interna]
+    nombre = f'{externa} / {interna}'
+    return nombre, {
+        'externa': externa,
+        'interna': interna,
+        'niveles': [info_externa, info_interna],
+        'categorias': [
+            f'{cat_externa} / {cat_interna}'
+            for cat_externa in info_externa['categorias']
+            for cat_interna in info_interna['categorias']
+        ]
+    }
+
+# Columna de la encuesta de la que se obtiene cada columna derivada
+COLUMNAS_DERIVADAS = {
+    'Rango_Edad': 'P36 - Edad',
+    'Region_Oficina': 'P44 - Oficina/Agencia/Delegación',
+    'Region_Aduana': 'P44 - Aduana'
+}
+
+def cruza_consigo_misma(pregunta_col, var_info):
+    """
+    Indica si la variable de cruce sale de la misma pregunta que pregunta_col:
+    compara el prefijo de la pregunta (p. ej. 'P44'), de modo que las columnas
+    derivadas (Region_Oficina, Region_Aduana) también se omiten frente a las
+    demás columnas de P44 ('P44 - Región Oficina', 'P44 - Aduana', ...).
+    """
+    prefijo = pregunta_col.split(' - ')[0].strip()
+    for nivel in var_info.get('niveles', [var_info]):
+        origen = COLUMNAS_DERIVADAS.get(nivel['columna'], nivel['columna'])
+        if origen.split(' - ')[0].strip() == prefijo:
+            return True
+    return False
+
+def agregar_columnas_derivadas(df):
+    """
+    Agrega las columnas Rango_Edad, Region_Oficina y Region_Aduana al DataFrame.
+    """
+    df['Rango_Edad'] = df['P36 - Edad'].apply(crear_rango_edad)
+    df['Region_Oficina'] = df['P44 - Oficina/Agencia/Delegación'].apply(obtener_region_oficina)
+    df['Region_Aduana'] = df['P44 - Aduana'].apply(obtener_region_aduana)
+    return df
+
+def mascara_poblacion(df, pregunta_col):
+    """
+    Máscara de los registros que forman la población de una pregunta
+    condicional (P6, P7, P8). Retorna (mascara, opcion_filtro), o (None, None)
+    si la pregunta se analiza sobre todos los registros.
+    """
+    opcion_filtro = FILTROS_POBLACION.get(pregunta_col)
+    p3_col = 'P3 - Medios SAT Utilizados'
+    if opcion_filtro is None or p3_col not in df.columns:
+        return None, None
+    mask_p3 = df[p3_col].astype(str).str.contains(opcion_filtro, na=False)
+    return mask_p3, opcion_filtro
+
+def preparar_poblacion(df, pregunta_col):
+    """
+    Prepara los datos de una pregunta: aplica el filtro de las preguntas
+    condicionales (P6, P7, P8) y crea las columnas derivadas.
+    Retorna (df_work, opcion_filtro); opcion_filtro es None si no se filtró.
+    """
+    mask_p3, opcion_filtro = mascara_poblacion(df, pregunta_col)
+    if mask_p3 is None:
+        df_work = df.copy()
+    else:
+        df_work = df[mask_p3].copy()
     
-    opciones_presentes = []
-    for opcion in opciones_principales:
-        if opcion in valor_str:
-            opciones_presentes.append(opcion)
+    agregar_columnas_derivadas(df_work)
+    return df_work, opcion_filtro
+
+def listar_preguntas(df):
+    """
+    Obtiene TODAS las preguntas desde P3 (incluyendo todas las variantes).
+    Retorna una lista de (número, columna, número como texto) ordenada por número.
+    """
+    preguntas = []
     
-    if len(opciones_presentes) == 0:
-        return None
+    for col in df.columns.tolist():
+        if col.startswith('P') and ' - ' in col:
+            # Extraer número de pregunta (puede ser P3, P11.1, P12.1, etc.)
+            num_pregunta_str = col.split(' - ')[0].replace('P', '')
+            try:
+                # Intentar convertir a float para manejar P11.1, P12.1, etc.
+                num = float(num_pregunta_str)
+                if num >= 3:
+                    # Incluir TODAS las variantes (no solo la primera)
+                    preguntas.append((num, col, num_pregunta_str))
+            except:
+                pass
+    
+    # Ordenar por número
+    preguntas.sort(key=lambda x: x[0])
+    return preguntas
+
+def escribir_encabezados(ws, fila, variables, borde_superior, ultima_columna=None):
+    """
+    Escribe los encabezados de una tabla a partir de la fila indicada: la fila
+    de grupos de variables (combinada por grupo) y la fila de categorías.
+    Si hay grupos anidados se agrega una fila: las categorías de la variable
+    externa quedan combinadas sobre las de la interna y las categorías de los
+    demás grupos se combinan en vertical.
+    borde_superior: borde superior de la fila de grupos.
+    ultima_columna: si se indica, esa columna lleva borde derecho medium (marco
+    de la tabla), también en las celdas combinadas.
+    Retorna la primera fila de datos.
+    """
+    thin_side = Side(style='thin', color='FFD0D0D0')
+    medium_side = Side(style='medium')
+    thin_border = Border(left=thin_side, right=thin_side, top=thin_side, bottom=thin_side)
+    fill_header = PatternFill(start_color='FFE7E6E6', end_color='FFE7E6E6', fill_type='solid')
+    
+    hay_anidados = any('niveles' in var_info for var_info in variables.values())
+    fila_categorias = fila + 1
+    fila_final = fila + 2 if hay_anidados else fila + 1
+    
+    # Fila de grupos
+    col_actual = 1
+    ws.cell(row=fila, column=col_actual, value='')
+    ws.cell(row=fila, column=col_actual).fill = fill_header
+    ws.cell(row=fila, column=col_actual).border = Border(left=medium_side, right=medium_side, top=borde_superior, bottom=thin_side)
+    col_actual += 1
+    
+    ws.cell(row=fila, column=col_actual, value='TOTAL')
+    ws.cell(row=fila, column=col_actual).fill = fill_header
+    ws.cell(row=fila, column=col_actual).border = Border(left=medium_side, right=medium_side, top=borde_superior, bottom=thin_side)
+    ws.cell(row=fila, column=col_actual).font = Font(bold=True)
+    ws.cell(row=fila, column=col_actual).alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
+    col_actual += 1
+    
+    for var_nombre, var_info in variables.items():
+        num_cols = len(var_info['categorias'])
+        inicio = col_actual
+        fin = col_actual + num_cols - 1
+        
+        ws.merge_cells(start_row=fila, start_column=inicio, end_row=fila, end_column=fin)
+        ws.cell(row=fila, column=inicio, value=var_nombre)
+        ws.cell(row=fila, column=inicio).fill = fill_header
+        ws.cell(row=fila, column=inicio).border = Border(left=medium_side, right=medium_side, top=borde_superior, bottom=thin_side)
+        ws.cell(row=fila, column=inicio).font = Font(bold=True)
+        ws.cell(row=fila, column=inicio).alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
+        if fin == ultima_columna and fin != inicio:
+            ws.cell(row=fila, column=fin).border = Border(right=medium_side)
+        
+        col_actual = fin + 1
+    
+    # Fila(s) de categorías
+    col_actual = 1
+    ws.cell(row=fila_categorias, column=col_actual, value='')
+    ws.cell(row=fila_categorias, column=col_actual).border = thin_border
+    col_actual += 1
+    
+    ws.cell(row=fila_categorias, column=col_actual, value='')
+    ws.cell(row=fila_categorias, column=col_actual).border = Border(
+        left=medium_side, 
+        right=medium_side, 
+        top=Side(style='medium'), 
+        bottom=Side(style='thin', color='FFD0D0D0')
+    )
+    col_actual += 1
+    
+    if hay_anidados:
+        ws.merge_cells(start_row=fila_categorias, start_column=1, end_row=fila_final, end_column=1)
+        ws.merge_cells(start_row=fila_categorias, start_column=2, end_row=fila_final, end_column=2)
+    
+    for var_nombre, var_info in variables.items():
+        num_cats = len(var_info['categorias'])
+        
+        if 'niveles' in var_info:
+            # Grupo anidado: categorías externas combinadas sobre las internas
+            externa, interna = var_info['niveles']
+            num_internas = len(interna['categorias'])
+            for j, cat_externa in enumerate(externa['categorias']):
+                inicio = col_actual + j * num_internas
+                fin = inicio + num_internas - 1
+                ws.merge_cells(start_row=fila_categorias, start_column=inicio, end_row=fila_categorias, end_column=fin)
+                ws.cell(row=fila_categorias, column=inicio, value=cat_externa)
+                ws.cell(row=fila_categorias, column=inicio).font = Font(bold=True)
+                ws.cell(row=fila_categorias, column=inicio).border = Border(
+                    left=Side(style='medium', color='FFD0D0D0'),
+                    right=medium_side if inicio == ultima_columna else Side(style='medium', color='FFD0D0D0'),
+                    top=Side(style='medium'),
+                    bottom=Side(style='thin', color='FFD0D0D0')
+                )
+                ws.cell(row=fila_categorias, column=inicio).alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
+                if fin == ultima_columna and fin != inicio:
+                    ws.cell(row=fila_categorias, column=fin).border = Border(right=medium_side)
+            
+            for i in range(num_cats):
+                es_primera = (i == 0)
+                es_ultima = (i == num_cats - 1)
+                ws.cell(row=fila_final, column=col_actual, value=interna['categorias'][i % num_internas])
+                ws.cell(row=fila_final, column=col_actual).font = Font(bold=True)
+                border = Border(
+                    left=Side(style='medium' if es_primera else 'thin', color='FFD0D0D0'),
+                    right=medium_side if col_actual == ultima_columna else Side(style='medium' if es_ultima else 'thin', color='FFD0D0D0'),
+                    top=Side(style='thin', color='FFD0D0D0'),
+                    bottom=Side(style='thin', color='FFD0D0D0')
+                )
+                ws.cell(row=fila_final, column=col_actual).border = border
+                ws.cell(row=fila_final, column=col_actual).alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
+                col_actual += 1
+            continue
+        
+        for i, cat in enumerate(var_info['categorias']):
+            es_primera = (i == 0)
+            es_ultima = (i == num_cats - 1)
+            ws.cell(row=fila_categorias, column=col_actual, value=cat)
+            ws.cell(row=fila_categorias, column=col_actual).font = Font(bold=True)
+            border = Border(
+                left=Side(style='medium' if es_primera else 'thin', color='FFD0D0D0'),
+                right=medium_side if col_actual == ultima_columna else Side(style='medium' if es_ultima else 'thin', color='FFD0D0D0'),
+                top=Side(style='medium'),
+                bottom=Side(style='thin', color='FFD0D0D0')
+            )
+            ws.cell(row=fila_categorias, column=col_actual).border = border
+            ws.cell(row=fila_categorias, column=col_actual).alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
+            if hay_anidados:
+                ws.merge_cells(start_row=fila_categorias, start_column=col_actual, end_row=fila_final, end_column=col_actual)
+                if col_actual == ultima_columna:
+                    ws.cell(row=fila_final, column=col_actual).border = Border(right=medium_side)
+            col_actual += 1
     
-    return ', '.join(opciones_presentes)
+    return fila_final + 1
 
-def redondear_porcentaje(valor):
-    """Redondea porcentajes: si tiene .5 o más, redondea hacia arriba"""
-    if pd.isna(valor) or valor == 0:
-        return 0
-    # Si el decimal es >= 0.5, redondear hacia arriba
-    if valor % 1 >= 0.5:
-        return int(valor) + 1
+# Formato de los conteos ponderados (sumas de pesos, se muestran sin decimales)
+FORMATO_CONTEO_PONDERADO = '#,##0'
+
+def escribir_conteo(ws, fila, columna, valor):
+    """
+    Escribe un conteo en la celda: entero, o suma de pesos (float) con el
+    formato de conteo ponderado.
+    """
+    if isinstance(valor, (float, np.floating)):
+        ws.cell(row=fila, column=columna, value=float(valor))
+        ws.cell(row=fila, column=columna).number_format = FORMATO_CONTEO_PONDERADO
     else:
-        return int(valor)
+        ws.cell(row=fila, column=columna, value=int(valor))
+
+def escribir_fila_sin_ponderar(ws, fila, variables, sin_ponderar, ultima_columna):
+    """
+    Escribe la fila con las bases sin ponderar (N de registros) de una tabla
+    ponderada: total general y registros por categoría con respuesta.
+    Retorna la fila escrita.
+    """
+    inferior = Side(style='medium')
+    ws.cell(row=fila, column=1, value='N (sin ponderar)')
+    ws.cell(row=fila, column=1).font = Font(italic=True)
+    ws.cell(row=fila, column=1).border = Border(
+        left=Side(style='thin', color='FFD0D0D0'),
+        right=Side(style='thin', color='FFD0D0D0'),
+        top=Side(style='thin', color='FFD0D0D0'),
+        bottom=inferior
+    )
+    ws.cell(row=fila, column=1).alignment = Alignment(horizontal='center', vertical='center')
+    
+    ws.cell(row=fila, column=2, value=int(sin_ponderar['total_general']))
+    ws.cell(row=fila, column=2).font = Font(italic=True)
+    ws.cell(row=fila, column=2).border = Border(
+        left=Side(style='medium'),
+        right=Side(style='medium'),
+        top=Side(style='thin', color='FFD0D0D0'),
+        bottom=inferior
+    )
+    ws.cell(row=fila, column=2).alignment = Alignment(horizontal='center', vertical='center')
+    
+    col_actual = 3
+    for var_nombre, var_info in variables.items():
+        num_cats = len(var_info['categorias'])
+        for i in range(num_cats):
+            ws.cell(row=fila, column=col_actual, value=int(sin_ponderar['totales_categoria'][var_nombre][i]))
+            ws.cell(row=fila, column=col_actual).font = Font(italic=True)
+            ws.cell(row=fila, column=col_actual).border = Border(
+                left=Side(style='medium' if i == 0 else 'thin', color='FFD0D0D0'),
+                right=Side(style='medium') if col_actual == ultima_columna else Side(style='medium' if i == num_cats - 1 else 'thin', color='FFD0D0D0'),
+                top=Side(style='thin', color='FFD0D0D0'),
+                bottom=inferior
+            )
+            ws.cell(row=fila, column=col_actual).alignment = Alignment(horizontal='center', vertical='center')
+            col_actual += 1
+    
+    return fila
+
+def escribir_tabla_intervalo(ws, fila, titulo, opciones, variables, limites_total, limites_vars, ultima_columna):
+    """
+    Escribe una tabla con un límite del intervalo de confianza de cada
+    porcentaje (misma forma que la tabla de porcentajes, sin fila TOTAL).
+    limites_total: vector por opción; limites_vars: {var_nombre: matriz
+    opciones × categorías}, ambos en porcentaje (0-100).
+    Retorna la última fila escrita.
+    """
+    medium_side = Side(style='medium')
+    
+    ws.cell(row=fila, column=1, value=titulo)
+    ws.cell(row=fila, column=1).font = Font(bold=True)
+    fila_datos = escribir_encabezados(ws, fila + 1, variables, medium_side, ultima_columna)
+    
+    total = redondear_porcentajes(limites_total)
+    por_variable = {var_nombre: redondear_porcentajes(limites_vars[var_nombre]) for var_nombre in variables}
+    
+    for idx_opcion, opcion in enumerate(opciones):
+        es_primera_fila = (idx_opcion == 0)
+        es_ultima_fila = (idx_opcion == len(opciones) - 1)
+        inferior = Side(style='medium') if es_ultima_fila else Side(style='thin', color='FFD0D0D0')
+        col_actual = 1
+        
+        ws.cell(row=fila_datos, column=col_actual, value=opcion)
+        ws.cell(row=fila_datos, column=col_actual).border = Border(
+            left=Side(style='thin', color='FFD0D0D0'),
+            right=Side(style='thin', color='FFD0D0D0'),
+            top=Side(style='medium' if es_primera_fila else 'thin', color='FFD0D0D0'),
+            bottom=inferior
+        )
+        ws.cell(row=fila_datos, column=col_actual).alignment = Alignment(horizontal='left', vertical='center')
+        col_actual += 1
+        
+        ws.cell(row=fila_datos, column=col_actual, value=celda_porcentaje(
+            total['unidades'][idx_opcion], total['valores'][idx_opcion]))
+        if total['unidades'][idx_opcion] != 0:
+            ws.cell(row=fila_datos, column=col_actual).number_format = total['formato']
+        ws.cell(row=fila_datos, column=col_actual).border = Border(
+            left=Side(style='medium'),
+            right=Side(style='medium'),
+            top=Side(style='medium' if es_primera_fila else 'thin', color='FFD0D0D0'),
+            bottom=inferior
+        )
+        ws.cell(row=fila_datos, column=col_actual).alignment = Alignment(horizontal='center', vertical='center')
+        col_actual += 1
+        
+        for var_nombre, var_info in variables.items():
+            num_cats = len(var_info['categorias'])
+            
+            for i in range(num_cats):
+                es_primera = (i == 0)
+                es_ultima = (i == num_cats - 1)
+                
+                unidades = por_variable[var_nombre]['unidades'][idx_opcion, i]
+                ws.cell(row=fila_datos, column=col_actual, value=celda_porcentaje(
+                    unidades, por_variable[var_nombre]['valores'][idx_opcion, i]))
+                if unidades != 0:
+                    ws.cell(row=fila_datos, column=col_actual).number_format = por_variable[var_nombre]['formato']
+                ws.cell(row=fila_datos, column=col_actual).border = Border(
+                    left=Side(style='medium' if es_primera else 'thin', color='FFD0D0D0'),
+                    right=Side(style='medium') if col_actual == ultima_columna else Side(style='medium' if es_ultima else 'thin', color='FFD0D0D0'),
+                    top=Side(style='medium' if es_primera_fila else 'thin', color='FFD0D0D0'),
+                    bottom=inferior
+                )
+                ws.cell(row=fila_datos, column=col_actual).alignment = Alignment(horizontal='center', vertical='center')
+                col_actual += 1
+        
+        fila_datos += 1
+    
+    return fila_datos - 1
 
-def generar_hoja_pregunta(wb, df, pregunta_num, pregunta_col, pregunta_nombre, tiene_combinaciones):
+def generar_hoja_pregunta(wb, df, pregunta_num, pregunta_col, pregunta_nombre, tiene_combinaciones, variables=None,
+                          intervalos=None, columna_peso=None, opciones=None, tabla=None):
     """
     Genera una hoja completa para una pregunta específica.
+    columna_peso: columna opcional de pesos; los conteos y porcentajes quedan
+    ponderados y se agrega la fila con el N sin ponderar.
+    intervalos: límites bootstrap de la pregunta (calcular_intervalos_preguntas);
+    si se indican se agregan las tablas de límite inferior y superior.
+    opciones, tabla: opciones y tabla de conteos ya calculadas (lectura por
+    bloques); si se indican no se vuelve a recorrer df.
+    Retorna la tabla de conteos calculada (None si la pregunta no tiene opciones).
     """
     print(f"\n{'='*80}")
     print(f"Procesando {pregunta_nombre}")
@@ -199,7 +682,9 @@ def generar_hoja_pregunta(wb, df, pregunta_num, pregunta_col, pregunta_nombre, t
     ws = wb.create_sheet(title=f"P{pregunta_num}")
     
     # Obtener opciones de la pregunta
-    opciones = obtener_opciones_unicas(df, pregunta_col, tiene_combinaciones)
+    if opciones is None:
+        with etapa('perfil_esquema'):
+            opciones = obtener_opciones_unicas(df, pregunta_col, tiene_combinaciones)
     
     if len(opciones) == 0:
         print(f"  ⚠ No se encontraron opciones para {pregunta_nombre}")
@@ -211,58 +696,18 @@ def generar_hoja_pregunta(wb, df, pregunta_num, pregunta_col, pregunta_nombre, t
     else:
         print(f"  Tipo: Sin combinaciones múltiples")
     
-    # Preparar datos
-    df_work = df.copy()
-    
-    # FILTRO ESPECIAL PARA P6: Solo incluir registros con "b. Contact Center" en P3
-    if pregunta_col == 'P6 - Gestión Contact Center':
-        p3_col = 'P3 - Medios SAT Utilizados'
-        if p3_col in df_work.columns:
-            # Filtrar solo registros que tienen "b. Contact Center" en P3
-            mask_p3_contact = df_work[p3_col].astype(str).str.contains('b. Contact Center', na=False)
-            df_work = df_work[mask_p3_contact].copy()
-            print(f"  ⚠ P6 es condicional: Filtrando solo registros con 'b. Contact Center' en P3")
-            print(f"  Registros después del filtro: {len(df_work)}")
-    
-    # FILTRO ESPECIAL PARA P7: Solo incluir registros con "b. Contact Center" en P3
-    if pregunta_col == 'P7 - Medio Contact Center':
-        p3_col = 'P3 - Medios SAT Utilizados'
-        if p3_col in df_work.columns:
-            # Filtrar solo registros que tienen "b. Contact Center" en P3
-            mask_p3_contact = df_work[p3_col].astype(str).str.contains('b. Contact Center', na=False)
-            df_work = df_work[mask_p3_contact].copy()
-            print(f"  ⚠ P7 es condicional: Filtrando solo registros con 'b. Contact Center' en P3")
-            print(f"  Registros después del filtro: {len(df_work)}")
-    
-    # FILTRO ESPECIAL PARA P8: Solo incluir registros con "a. Presencial" en P3
-    if pregunta_col == 'P8 - Gestión Visita Presencial':
-        p3_col = 'P3 - Medios SAT Utilizados'
-        if p3_col in df_work.columns:
-            # Filtrar solo registros que tienen "a. Presencial" en P3
-            mask_p3_presencial = df_work[p3_col].astype(str).str.contains('a. Presencial', na=False)
-            df_work = df_work[mask_p3_presencial].copy()
-            print(f"  ⚠ P8 es condicional: Filtrando solo registros con 'a. Presencial' en P3")
+    # Preparar datos (filtro de preguntas condicionales + columnas derivadas)
+    if tabla is None:
+        with etapa('columnas_derivadas', registros=len(df)):
+            df_work, opcion_filtro = preparar_poblacion(df, pregunta_col)
+        if opcion_filtro is not None:
+            print(f"  ⚠ {pregunta_col.split(' - ')[0]} es condicional: Filtrando solo registros con '{opcion_filtro}' en P3")
             print(f"  Registros después del filtro: {len(df_work)}")
     
-    # Crear rangos de edad
-    df_work['Rango_Edad'] = df_work['P36 - Edad'].apply(crear_rango_edad)
-    
-    # Crear regiones
-    df_work['Region_Oficina'] = df_work['P44 - Oficina/Agencia/Delegación'].apply(obtener_region_oficina)
-    df_work['Region_Aduana'] = df_work['P44 - Aduana'].apply(obtener_region_aduana)
-    
-    # Si tiene combinaciones, normalizar
-    if tiene_combinaciones:
-        df_work[f'{pregunta_col}_norm'] = df_work[pregunta_col].apply(
-            lambda x: normalizar_combinaciones(x, opciones)
-        )
-    
     # Definir estilos
     thin_side = Side(style='thin', color='FFD0D0D0')
     medium_side = Side(style='medium')
-    thin_border = Border(left=thin_side, right=thin_side, top=thin_side, bottom=thin_side)
     fill_fila1 = PatternFill(start_color='FFD9E1F2', end_color='FFD9E1F2', fill_type='solid')
-    fill_header = PatternFill(start_color='FFE7E6E6', end_color='FFE7E6E6', fill_type='solid')
     
     # Fila 1: Título de la pregunta
     ws.cell(row=1, column=1, value=pregunta_nombre)
@@ -270,98 +715,19 @@ def generar_hoja_pregunta(wb, df, pregunta_num, pregunta_col, pregunta_nombre, t
     ws.cell(row=1, column=1).alignment = Alignment(horizontal='left', vertical='center')
     ws.cell(row=1, column=1).fill = fill_fila1
     
-    # Definir variables de cruce (igual que P3/P4)
-    col = 1
-    variables = {
-        'P37 Género': {
-            'columna': 'P37 - Género',
-            'categorias': ['H', 'M', 'No deseo responder'],
-            'col_inicio': col + 2
-        },
-        'P3 Medios SAT utilizados': {
-            'columna': 'P3 - Medios SAT Utilizados',
-            'categorias': ['a. Presencial', 'b. Contact Center', 'c. Servicios Electrónicos'],
-            'col_inicio': col + 5,
-            'usa_contains': True  # Marcar que usa str.contains() para contar
-        },
-        'Rango de edad': {
-            'columna': 'Rango_Edad',
-            'categorias': ['18 - 25', '26 - 35', '36 - 45', '46 - 60', 'Más de 61'],
-            'col_inicio': col + 8
-        },
-        'P40 Nivel académico': {
-            'columna': 'P40 - Nivel Académico',
-            'categorias': [
-                'a. Ninguno', 'b. Primaria incompleta', 'c. Primaria completa',
-                'd. Secundaria incompleta (1ro a 3ro básico)', 'e. Secundaria Completa (1ro a 3ro básico)',
-                'f. Diversificado incompleto', 'g. Diversificado completo', 'h. Técnico',
-                'i. Universidad incompleta', 'j. Universidad Completa', 'k. Maestría / Posgrado'
-            ],
-            'col_inicio': col + 13
-        },
-        'P39 Idiomas': {
-            'columna': 'P39 - Idiomas',
-            'categorias': [
-                'a. Achi', 'b. Qánjob\'al', 'c. Q\'eqchi', 'd. Akateco', 'e. Kaqchikel',
-                'f. Sakapulteko', 'h. Kiché', 'i. Sipakapense', 'k. Mam', 'n. Mopan',
-                'p. Ixil', 'q. Poqomam', 's. Jakalteco', 't. Poqomchi', 'u. Ninguno',
-                'v. Inglés', 'w. Otro'
-            ],
-            'col_inicio': col + 24
-        },
-        'P44 Oficina/Agencia/Delegación': {
-            'columna': 'P44 - Oficina/Agencia/Delegación',
-            'categorias': [
-                'Alta Verapaz', 'Baja Verapaz', 'Chimaltenango', 'Chiquimula', 'El Progreso',
-                'Escuintla', 'Guatemala', 'Huehuetenango', 'Izabal', 'Jalapa', 'Jutiapa',
-                'Petén', 'Quetzaltenango', 'Quiché', 'Retalhuleu', 'Sacatepéquez', 'San Marcos',
-                'Santa Rosa', 'Sololá', 'Suchitepéquez', 'Totonicapán', 'Zacapa'
-            ],
-            'col_inicio': col + 41
-        },
-        'P44.1 Aduana': {
-            'columna': 'P44 - Aduana',
-            'categorias': [
-                'Central Guatemala', 'El Carmen', 'Integrada Corinto', 'Integrada El Florido',
-                'La Mesilla', 'Puerto Barrios Almacenadora Pelícano, S.A -ALPELSA', 'Puerto Quetzal',
-                'San Cristóbal', 'Santo Tomás de Castilla Zona Libre de Industria y Comercio -ZOLIC-',
-                'Tikal', 'Valle Nuevo'
-            ],
-            'col_inicio': col + 63
-        },
-        'P9 Personería': {
-            'columna': 'P9 - Personería',
-            'categorias': [
-                'a. Contribuyente/Propietario.', 'b. Representante Legal', 'c. Abogado y Notario',
-                'd. Mandatario', 'e. Contador/auxiliar', 'f. Contador Público y Auditor',
-                'g. Gestor Tributario', 'h. Importador', 'i. Exportador', 'j. Asistente de Agente',
-                'k. Auxiliar Gestor Tributario', 'm. Consolidador/Descons.', 'n. Transportista Ad',
-                'p. Mensajero', 'r. Otro'
-            ],
-            'col_inicio': col + 74
-        },
-        'P38 Etnia': {
-            'columna': 'P38 - Etnia',
-            'categorias': ['Garifuna', 'Ladino', 'Maya', 'Otro', 'Xinca'],
-            'col_inicio': col + 89
-        },
-        'Oficina/Agencia/Delegación': {
-            'columna': 'Region_Oficina',
-            'categorias': ['Central', 'Occidente', 'Sur', 'Nororiente'],
-            'col_inicio': col + 94
-        },
-        'Aduana': {
-            'columna': 'Region_Aduana',
-            'categorias': ['Central', 'Occidente', 'Sur', 'Nororiente'],
-            'col_inicio': col + 98
-        }
-    }
+    # Variables de cruce (igual que P3/P4)
+    if variables is None:
+        variables = VARIABLES_CRUCE
     
     # Calcular total de columnas
     total_columnas = 2  # Columna vacía + TOTAL
     for var_nombre, var_info in variables.items():
         total_columnas += len(var_info['categorias'])
     
+    # La última columna lleva borde derecho medium en todas las filas (marco de la
+    # hoja); se aplica al escribir cada celda, sin volver a leer la hoja
+    ultima_columna = total_columnas
+    
     # Aplicar merge y bordes al título
     ws.merge_cells(start_row=1, start_column=1, end_row=1, end_column=total_columnas)
     ws.cell(row=1, column=1).border = Border(
@@ -370,6 +736,7 @@ def generar_hoja_pregunta(wb, df, pregunta_num, pregunta_col, pregunta_nombre, t
         top=medium_side,
         bottom=thin_side
     )
+    ws.cell(row=1, column=ultima_columna).border = Border(right=medium_side)
     
     # Fila 2: Vacía con fondo gris
     for col_idx in range(1, total_columnas + 1):
@@ -377,81 +744,22 @@ def generar_hoja_pregunta(wb, df, pregunta_num, pregunta_col, pregunta_nombre, t
         cell.fill = fill_fila1
         cell.border = Border(
             left=thin_side, 
-            right=thin_side, 
+            right=medium_side if col_idx == ultima_columna else thin_side, 
             top=thin_side, 
             bottom=thin_side
         )
     
-    # Fila 3: Encabezados principales
-    col_actual = 1
-    ws.cell(row=3, column=col_actual, value='')
-    ws.cell(row=3, column=col_actual).fill = fill_header
-    ws.cell(row=3, column=col_actual).border = Border(left=medium_side, right=medium_side, top=thin_side, bottom=thin_side)
-    col_actual += 1
-    
-    ws.cell(row=3, column=col_actual, value='TOTAL')
-    ws.cell(row=3, column=col_actual).fill = fill_header
-    ws.cell(row=3, column=col_actual).border = Border(left=medium_side, right=medium_side, top=thin_side, bottom=thin_side)
-    ws.cell(row=3, column=col_actual).font = Font(bold=True)
-    ws.cell(row=3, column=col_actual).alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-    col_actual += 1
-    
-    for var_nombre, var_info in variables.items():
-        num_cols = len(var_info['categorias'])
-        inicio = col_actual
-        fin = col_actual + num_cols - 1
-        
-        ws.merge_cells(start_row=3, start_column=inicio, end_row=3, end_column=fin)
-        ws.cell(row=3, column=inicio, value=var_nombre)
-        ws.cell(row=3, column=inicio).fill = fill_header
-        ws.cell(row=3, column=inicio).border = Border(left=medium_side, right=medium_side, top=thin_side, bottom=thin_side)
-        ws.cell(row=3, column=inicio).font = Font(bold=True)
-        ws.cell(row=3, column=inicio).alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-        
-        col_actual = fin + 1
-    
-    # Fila 4: Sub-encabezados
-    col_actual = 1
-    ws.cell(row=4, column=col_actual, value='')
-    ws.cell(row=4, column=col_actual).border = thin_border
-    col_actual += 1
-    
-    ws.cell(row=4, column=col_actual, value='')
-    ws.cell(row=4, column=col_actual).border = Border(
-        left=medium_side, 
-        right=medium_side, 
-        top=Side(style='medium'), 
-        bottom=Side(style='thin', color='FFD0D0D0')
-    )
-    col_actual += 1
-    
-    for var_nombre, var_info in variables.items():
-        num_cats = len(var_info['categorias'])
-        for i, cat in enumerate(var_info['categorias']):
-            es_primera = (i == 0)
-            es_ultima = (i == num_cats - 1)
-            ws.cell(row=4, column=col_actual, value=cat)
-            ws.cell(row=4, column=col_actual).font = Font(bold=True)
-            border = Border(
-                left=Side(style='medium' if es_primera else 'thin', color='FFD0D0D0'),
-                right=Side(style='medium' if es_ultima else 'thin', color='FFD0D0D0'),
-                top=Side(style='medium'),
-                bottom=Side(style='thin', color='FFD0D0D0')
-            )
-            ws.cell(row=4, column=col_actual).border = border
-            ws.cell(row=4, column=col_actual).alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-            col_actual += 1
+    # Filas 3 y 4: Encabezados principales y sub-encabezados
+    fila = escribir_encabezados(ws, 3, variables, thin_side, ultima_columna)
     
     # Filas de datos
-    fila = 5
     
-    # Filtrar solo registros con respuesta a esta pregunta
-    if tiene_combinaciones:
-        # Para combinaciones, incluir todos los registros que tengan al menos una opción
-        # Usar la columna original, no la normalizada
-        df_pregunta = df_work[df_work[pregunta_col].notna()].copy()
-    else:
-        df_pregunta = df_work[df_work[pregunta_col].notna()].copy()
+    # Calcular todos los conteos de una vez (códigos enteros + bincount, o matrices
+    # indicadoras para las columnas con combinaciones múltiples)
+    if tabla is None:
+        predicado_pregunta = predicado_contiene if tiene_combinaciones else predicado_igualdad
+        with etapa('calculo', registros=len(df_work)):
+            tabla = calcular_tabla_cruzada(df_work, pregunta_col, opciones, predicado_pregunta, variables, columna_peso)
     
     for idx_opcion, opcion in enumerate(opciones):
         col_actual = 1
@@ -469,12 +777,7 @@ def generar_hoja_pregunta(wb, df, pregunta_num, pregunta_col, pregunta_nombre, t
         col_actual += 1
         
         # TOTAL
-        if tiene_combinaciones:
-            total = len(df_work[df_work[pregunta_col].astype(str).str.contains(opcion, na=False, regex=False)])
-        else:
-            total = len(df_work[df_work[pregunta_col] == opcion])
-        
-        ws.cell(row=fila, column=col_actual, value=total)
+        escribir_conteo(ws, fila, col_actual, tabla['totales_opcion'][idx_opcion])
         border = Border(
             left=Side(style='medium'),
             right=Side(style='medium'),
@@ -487,7 +790,6 @@ def generar_hoja_pregunta(wb, df, pregunta_num, pregunta_col, pregunta_nombre, t
         
         # Datos por variable
         for var_nombre, var_info in variables.items():
-            col_original = var_info['columna']
             num_cats = len(var_info['categorias'])
             
             for i, cat in enumerate(var_info['categorias']):
@@ -495,63 +797,10 @@ def generar_hoja_pregunta(wb, df, pregunta_num, pregunta_col, pregunta_nombre, t
                 es_ultima = (i == num_cats - 1)
                 
                 # Contar intersección
-                if tiene_combinaciones:
-                    if col_original == 'Rango_Edad':
-                        count = len(df_work[
-                            (df_work[pregunta_col].astype(str).str.contains(opcion, na=False, regex=False)) & 
-                            (df_work[col_original] == cat)
-                        ])
-                    elif col_original == 'P39 - Idiomas':
-                        count = len(df_work[
-                            (df_work[pregunta_col].astype(str).str.contains(opcion, na=False, regex=False)) & 
-                            (df_work[col_original].astype(str).str.contains(cat, na=False))
-                        ])
-                    elif col_original == 'P3 - Medios SAT Utilizados':
-                        count = len(df_work[
-                            (df_work[pregunta_col].astype(str).str.contains(opcion, na=False, regex=False)) & 
-                            (df_work[col_original].astype(str).str.contains(cat, na=False))
-                        ])
-                    elif col_original == 'Region_Oficina' or col_original == 'Region_Aduana':
-                        count = len(df_work[
-                            (df_work[pregunta_col].astype(str).str.contains(opcion, na=False, regex=False)) & 
-                            (df_work[col_original] == cat)
-                        ])
-                    else:
-                        count = len(df_work[
-                            (df_work[pregunta_col].astype(str).str.contains(opcion, na=False, regex=False)) & 
-                            (df_work[col_original] == cat)
-                        ])
-                else:
-                    if col_original == 'Rango_Edad':
-                        count = len(df_work[
-                            (df_work[pregunta_col] == opcion) & 
-                            (df_work[col_original] == cat)
-                        ])
-                    elif col_original == 'P39 - Idiomas':
-                        count = len(df_work[
-                            (df_work[pregunta_col] == opcion) & 
-                            (df_work[col_original].astype(str).str.contains(cat, na=False))
-                        ])
-                    elif col_original == 'P3 - Medios SAT Utilizados':
-                        count = len(df_work[
-                            (df_work[pregunta_col] == opcion) & 
-                            (df_work[col_original].astype(str).str.contains(cat, na=False))
-                        ])
-                    elif col_original == 'Region_Oficina' or col_original == 'Region_Aduana':
-                        count = len(df_work[
-                            (df_work[pregunta_col] == opcion) & 
-                            (df_work[col_original] == cat)
-                        ])
-                    else:
-                        count = len(df_work[
-                            (df_work[pregunta_col] == opcion) & 
-                            (df_work[col_original] == cat)
-                        ])
-                
-                ws.cell(row=fila, column=col_actual, value=count)
+                escribir_conteo(ws, fila, col_actual, tabla['conteos'][var_nombre][idx_opcion, i])
                 border = Border(
                     left=Side(style='medium' if es_primera else 'thin', color='FFD0D0D0'),
-                    right=Side(style='medium' if es_ultima else 'thin', color='FFD0D0D0'),
+                    right=Side(style='medium') if col_actual == ultima_columna else Side(style='medium' if es_ultima else 'thin', color='FFD0D0D0'),
                     top=Side(style='medium' if idx_opcion == 0 else 'thin', color='FFD0D0D0'),
                     bottom=Side(style='thin', color='FFD0D0D0')
                 )
@@ -561,19 +810,6 @@ def generar_hoja_pregunta(wb, df, pregunta_num, pregunta_col, pregunta_nombre, t
         
         fila += 1
     
-    # Asegurar bordes right=medium en última columna
-    for row in range(1, fila + 1):
-        cell = ws.cell(row=row, column=total_columnas)
-        if cell.border:
-            current_border = cell.border
-            new_border = Border(
-                left=current_border.left,
-                right=Side(style='medium'),
-                top=current_border.top,
-                bottom=current_border.bottom
-            )
-            cell.border = new_border
-    
     # Fila TOTAL
     col_actual = 1
     ws.cell(row=fila, column=col_actual, value='TOTAL')
@@ -588,8 +824,8 @@ def generar_hoja_pregunta(wb, df, pregunta_num, pregunta_col, pregunta_nombre, t
     col_actual += 1
     
     # TOTAL general (usar el total de registros del dataset, no solo los que tienen respuesta)
-    total_general = len(df_work)
-    ws.cell(row=fila, column=col_actual, value=total_general)
+    total_general = tabla['total_general']
+    escribir_conteo(ws, fila, col_actual, total_general)
     ws.cell(row=fila, column=col_actual).font = Font(bold=True)
     ws.cell(row=fila, column=col_actual).border = Border(
         left=Side(style='medium'),
@@ -602,29 +838,17 @@ def generar_hoja_pregunta(wb, df, pregunta_num, pregunta_col, pregunta_nombre, t
     
     # Totales por categoría
     for var_nombre, var_info in variables.items():
-        col_original = var_info['columna']
         num_cats = len(var_info['categorias'])
         
         for i, cat in enumerate(var_info['categorias']):
             es_primera = (i == 0)
             es_ultima = (i == num_cats - 1)
             
-            if col_original == 'Rango_Edad':
-                total_cat = len(df_pregunta[df_pregunta[col_original] == cat])
-            elif col_original == 'P39 - Idiomas':
-                total_cat = len(df_pregunta[df_pregunta[col_original].astype(str).str.contains(cat, na=False)])
-            elif col_original == 'P3 - Medios SAT Utilizados':
-                total_cat = len(df_pregunta[df_pregunta[col_original].astype(str).str.contains(cat, na=False)])
-            elif col_original == 'Region_Oficina' or col_original == 'Region_Aduana':
-                total_cat = len(df_pregunta[df_pregunta[col_original] == cat])
-            else:
-                total_cat = len(df_pregunta[df_pregunta[col_original] == cat])
-            
-            ws.cell(row=fila, column=col_actual, value=total_cat)
+            escribir_conteo(ws, fila, col_actual, tabla['totales_categoria'][var_nombre][i])
             ws.cell(row=fila, column=col_actual).font = Font(bold=True)
             border = Border(
                 left=Side(style='medium' if es_primera else 'thin', color='FFD0D0D0'),
-                right=Side(style='medium' if es_ultima else 'thin', color='FFD0D0D0'),
+                right=Side(style='medium') if col_actual == ultima_columna else Side(style='medium' if es_ultima else 'thin', color='FFD0D0D0'),
                 top=Side(style='thin', color='FFD0D0D0'),
                 bottom=Side(style='medium')
             )
@@ -632,89 +856,28 @@ def generar_hoja_pregunta(wb, df, pregunta_num, pregunta_col, pregunta_nombre, t
             ws.cell(row=fila, column=col_actual).alignment = Alignment(horizontal='center', vertical='center')
             col_actual += 1
     
-    # Asegurar bordes en última fila
-    for col_idx in range(1, total_columnas + 1):
-        cell = ws.cell(row=fila, column=col_idx)
-        if cell.border:
-            current_border = cell.border
-            right_style = Side(style='medium') if col_idx == total_columnas else current_border.right
-            new_border = Border(
-                left=current_border.left,
-                right=right_style,
-                top=current_border.top,
-                bottom=Side(style='medium')
-            )
-            cell.border = new_border
+    # Base sin ponderar (N de registros) debajo de la fila TOTAL ponderada
+    if 'sin_ponderar' in tabla:
+        fila = escribir_fila_sin_ponderar(ws, fila + 1, variables, tabla['sin_ponderar'], ultima_columna)
     
-    # Agregar dos filas vacías
+    # Agregar dos filas vacías (la primera conserva el marco derecho)
+    ws.cell(row=fila + 1, column=ultima_columna).border = Border(right=medium_side)
     fila += 2
     
     # TABLA DE PORCENTAJES
-    fila_porcentajes = fila
-    
-    # Fila de encabezados principales
-    col_actual = 1
-    ws.cell(row=fila_porcentajes, column=col_actual, value='')
-    ws.cell(row=fila_porcentajes, column=col_actual).fill = fill_header
-    ws.cell(row=fila_porcentajes, column=col_actual).border = Border(left=medium_side, right=medium_side, top=medium_side, bottom=thin_side)
-    col_actual += 1
-    
-    ws.cell(row=fila_porcentajes, column=col_actual, value='TOTAL')
-    ws.cell(row=fila_porcentajes, column=col_actual).fill = fill_header
-    ws.cell(row=fila_porcentajes, column=col_actual).border = Border(left=medium_side, right=medium_side, top=medium_side, bottom=thin_side)
-    ws.cell(row=fila_porcentajes, column=col_actual).font = Font(bold=True)
-    ws.cell(row=fila_porcentajes, column=col_actual).alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-    col_actual += 1
-    
-    for var_nombre, var_info in variables.items():
-        num_cols = len(var_info['categorias'])
-        inicio = col_actual
-        fin = col_actual + num_cols - 1
-        
-        ws.merge_cells(start_row=fila_porcentajes, start_column=inicio, end_row=fila_porcentajes, end_column=fin)
-        ws.cell(row=fila_porcentajes, column=inicio, value=var_nombre)
-        ws.cell(row=fila_porcentajes, column=inicio).fill = fill_header
-        ws.cell(row=fila_porcentajes, column=inicio).border = Border(left=medium_side, right=medium_side, top=medium_side, bottom=thin_side)
-        ws.cell(row=fila_porcentajes, column=inicio).font = Font(bold=True)
-        ws.cell(row=fila_porcentajes, column=inicio).alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-        
-        col_actual = fin + 1
-    
-    # Fila de sub-encabezados
-    fila_porcentajes += 1
-    col_actual = 1
-    ws.cell(row=fila_porcentajes, column=col_actual, value='')
-    ws.cell(row=fila_porcentajes, column=col_actual).border = thin_border
-    col_actual += 1
-    
-    ws.cell(row=fila_porcentajes, column=col_actual, value='')
-    ws.cell(row=fila_porcentajes, column=col_actual).border = Border(
-        left=medium_side, 
-        right=medium_side, 
-        top=Side(style='medium'), 
-        bottom=Side(style='thin', color='FFD0D0D0')
-    )
-    col_actual += 1
-    
-    for var_nombre, var_info in variables.items():
-        num_cats = len(var_info['categorias'])
-        for i, cat in enumerate(var_info['categorias']):
-            es_primera = (i == 0)
-            es_ultima = (i == num_cats - 1)
-            ws.cell(row=fila_porcentajes, column=col_actual, value=cat)
-            ws.cell(row=fila_porcentajes, column=col_actual).font = Font(bold=True)
-            border = Border(
-                left=Side(style='medium' if es_primera else 'thin', color='FFD0D0D0'),
-                right=Side(style='medium' if es_ultima else 'thin', color='FFD0D0D0'),
-                top=Side(style='medium'),
-                bottom=Side(style='thin', color='FFD0D0D0')
-            )
-            ws.cell(row=fila_porcentajes, column=col_actual).border = border
-            ws.cell(row=fila_porcentajes, column=col_actual).alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-            col_actual += 1
+    fila_porcentajes = escribir_encabezados(ws, fila, variables, medium_side, ultima_columna)
+    
+    # Porcentajes de toda la tabla en una sola llamada por grupo: la columna
+    # TOTAL sobre el total general y las categorías en vertical
+    porcentajes_total = calcular_porcentajes(tabla['totales_opcion'], total_general, base='total')
+    porcentajes_vars = {
+        var_nombre: calcular_porcentajes(
+            tabla['conteos'][var_nombre], tabla['totales_categoria'][var_nombre], base='vertical'
+        )
+        for var_nombre in variables
+    }
     
     # Filas de datos con porcentajes
-    fila_porcentajes += 1
     for idx_opcion, opcion in enumerate(opciones):
         col_actual = 1
         
@@ -730,22 +893,11 @@ def generar_hoja_pregunta(wb, df, pregunta_num, pregunta_col, pregunta_nombre, t
         ws.cell(row=fila_porcentajes, column=col_actual).alignment = Alignment(horizontal='left', vertical='center')
         col_actual += 1
         
-        # TOTAL - calcular porcentaje
-        if tiene_combinaciones:
-            total_absoluto = len(df_work[df_work[pregunta_col].astype(str).str.contains(opcion, na=False, regex=False)])
-        else:
-            total_absoluto = len(df_work[df_work[pregunta_col] == opcion])
-        
-        porcentaje_total = (total_absoluto / total_general * 100) if total_general > 0 else 0
-        # Truncar a dos decimales sin redondear (almacenar como decimal)
-        # Ejemplo: 13.456% -> int(13.456 * 100) = 1345 -> 1345/10000 = 0.1345 (representa 13.45%)
-        porcentaje_decimal = int(porcentaje_total * 100) / 10000
-        
-        if porcentaje_decimal == 0:
-            ws.cell(row=fila_porcentajes, column=col_actual, value="---")
-        else:
-            ws.cell(row=fila_porcentajes, column=col_actual, value=porcentaje_decimal)
-            ws.cell(row=fila_porcentajes, column=col_actual).number_format = '0.00%'
+        # TOTAL - porcentaje sobre el total general
+        ws.cell(row=fila_porcentajes, column=col_actual, value=celda_porcentaje(
+            porcentajes_total['unidades'][idx_opcion], porcentajes_total['valores'][idx_opcion]))
+        if porcentajes_total['unidades'][idx_opcion] != 0:
+            ws.cell(row=fila_porcentajes, column=col_actual).number_format = porcentajes_total['formato']
         
         border = Border(
             left=Side(style='medium'),
@@ -759,92 +911,22 @@ def generar_hoja_pregunta(wb, df, pregunta_num, pregunta_col, pregunta_nombre, t
         
         # Datos por variable (porcentajes)
         for var_nombre, var_info in variables.items():
-            col_original = var_info['columna']
             num_cats = len(var_info['categorias'])
             
             for i, cat in enumerate(var_info['categorias']):
                 es_primera = (i == 0)
                 es_ultima = (i == num_cats - 1)
                 
-                # Contar intersección
-                if tiene_combinaciones:
-                    if col_original == 'Rango_Edad':
-                        count = len(df_work[
-                            (df_work[pregunta_col].astype(str).str.contains(opcion, na=False, regex=False)) & 
-                            (df_work[col_original] == cat)
-                        ])
-                    elif col_original == 'P39 - Idiomas':
-                        count = len(df_work[
-                            (df_work[pregunta_col].astype(str).str.contains(opcion, na=False, regex=False)) & 
-                            (df_work[col_original].astype(str).str.contains(cat, na=False))
-                        ])
-                    elif col_original == 'P3 - Medios SAT Utilizados':
-                        count = len(df_work[
-                            (df_work[pregunta_col].astype(str).str.contains(opcion, na=False, regex=False)) & 
-                            (df_work[col_original].astype(str).str.contains(cat, na=False))
-                        ])
-                    elif col_original == 'Region_Oficina' or col_original == 'Region_Aduana':
-                        count = len(df_work[
-                            (df_work[pregunta_col].astype(str).str.contains(opcion, na=False, regex=False)) & 
-                            (df_work[col_original] == cat)
-                        ])
-                    else:
-                        count = len(df_work[
-                            (df_work[pregunta_col].astype(str).str.contains(opcion, na=False, regex=False)) & 
-                            (df_work[col_original] == cat)
-                        ])
-                else:
-                    if col_original == 'Rango_Edad':
-                        count = len(df_work[
-                            (df_work[pregunta_col] == opcion) & 
-                            (df_work[col_original] == cat)
-                        ])
-                    elif col_original == 'P39 - Idiomas':
-                        count = len(df_work[
-                            (df_work[pregunta_col] == opcion) & 
-                            (df_work[col_original].astype(str).str.contains(cat, na=False))
-                        ])
-                    elif col_original == 'P3 - Medios SAT Utilizados':
-                        count = len(df_work[
-                            (df_work[pregunta_col] == opcion) & 
-                            (df_work[col_original].astype(str).str.contains(cat, na=False))
-                        ])
-                    elif col_original == 'Region_Oficina' or col_original == 'Region_Aduana':
-                        count = len(df_work[
-                            (df_work[pregunta_col] == opcion) & 
-                            (df_work[col_original] == cat)
-                        ])
-                    else:
-                        count = len(df_work[
-                            (df_work[pregunta_col] == opcion) & 
-                            (df_work[col_original] == cat)
-                        ])
-                
-                # Calcular porcentaje VERTICAL (sobre el total de esa categoría)
-                if col_original == 'Rango_Edad':
-                    total_categoria = len(df_pregunta[df_pregunta[col_original] == cat])
-                elif col_original == 'P39 - Idiomas':
-                    total_categoria = len(df_pregunta[df_pregunta[col_original].astype(str).str.contains(cat, na=False)])
-                elif col_original == 'P3 - Medios SAT Utilizados':
-                    total_categoria = len(df_pregunta[df_pregunta[col_original].astype(str).str.contains(cat, na=False)])
-                elif col_original == 'Region_Oficina' or col_original == 'Region_Aduana':
-                    total_categoria = len(df_pregunta[df_pregunta[col_original] == cat])
-                else:
-                    total_categoria = len(df_pregunta[df_pregunta[col_original] == cat])
-                
-                porcentaje = (count / total_categoria * 100) if total_categoria > 0 else 0
-                # Truncar a dos decimales sin redondear (almacenar como decimal con 2 decimales)
-                porcentaje_decimal = int(porcentaje * 100) / 10000
-                
-                if porcentaje_decimal == 0:
-                    ws.cell(row=fila_porcentajes, column=col_actual, value="---")
-                else:
-                    ws.cell(row=fila_porcentajes, column=col_actual, value=porcentaje_decimal)
-                    ws.cell(row=fila_porcentajes, column=col_actual).number_format = '0.00%'
+                # Porcentaje VERTICAL (sobre el total de esa categoría)
+                unidades = porcentajes_vars[var_nombre]['unidades'][idx_opcion, i]
+                ws.cell(row=fila_porcentajes, column=col_actual, value=celda_porcentaje(
+                    unidades, porcentajes_vars[var_nombre]['valores'][idx_opcion, i]))
+                if unidades != 0:
+                    ws.cell(row=fila_porcentajes, column=col_actual).number_format = porcentajes_vars[var_nombre]['formato']
                 
                 border = Border(
                     left=Side(style='medium' if es_primera else 'thin', color='FFD0D0D0'),
-                    right=Side(style='medium' if es_ultima else 'thin', color='FFD0D0D0'),
+                    right=Side(style='medium') if col_actual == ultima_columna else Side(style='medium' if es_ultima else 'thin', color='FFD0D0D0'),
                     top=Side(style='medium' if idx_opcion == 0 else 'thin', color='FFD0D0D0'),
                     bottom=Side(style='thin', color='FFD0D0D0')
                 )
@@ -867,30 +949,11 @@ def generar_hoja_pregunta(wb, df, pregunta_num, pregunta_col, pregunta_nombre, t
     ws.cell(row=fila_porcentajes, column=col_actual).alignment = Alignment(horizontal='center', vertical='center')
     col_actual += 1
     
-    # TOTAL general - suma VERTICAL de porcentajes (suma de los porcentajes de arriba en esta columna)
-    suma_total = 0
-    for idx_opcion in range(len(opciones)):
-        fila_anterior = fila_porcentajes - len(opciones) + idx_opcion
-        valor_celda = ws.cell(row=fila_anterior, column=col_actual).value
-        if valor_celda is not None and valor_celda != "---":
-            if isinstance(valor_celda, (int, float)) and valor_celda > 0:
-                # Los valores están en formato decimal (0.13), multiplicar por 10000 para obtener centésimas
-                suma_total += int(valor_celda * 10000)
-            elif isinstance(valor_celda, str) and valor_celda != "---" and '%' in valor_celda:
-                # Extraer el número del porcentaje
-                try:
-                    num_porcentaje = float(valor_celda.replace('%', '').strip())
-                    suma_total += int(num_porcentaje * 100)  # Convertir a centésimas
-                except:
-                    pass
-    
-    if suma_total == 0:
-        ws.cell(row=fila_porcentajes, column=col_actual, value="---")
-    else:
-        # Truncar a dos decimales sin redondear (almacenar como decimal con 2 decimales)
-        total_decimal = int(suma_total) / 10000
-        ws.cell(row=fila_porcentajes, column=col_actual, value=total_decimal)
-        ws.cell(row=fila_porcentajes, column=col_actual).number_format = '0.00%'
+    # TOTAL general - suma VERTICAL de los porcentajes de la columna (desde el arreglo)
+    ws.cell(row=fila_porcentajes, column=col_actual, value=celda_porcentaje(
+        porcentajes_total['suma_unidades'], porcentajes_total['suma_valores']))
+    if porcentajes_total['suma_unidades'] != 0:
+        ws.cell(row=fila_porcentajes, column=col_actual).number_format = porcentajes_total['formato']
     
     ws.cell(row=fila_porcentajes, column=col_actual).font = Font(bold=True)
     ws.cell(row=fila_porcentajes, column=col_actual).border = Border(
@@ -904,37 +967,23 @@ def generar_hoja_pregunta(wb, df, pregunta_num, pregunta_col, pregunta_nombre, t
     
     # Totales por categoría - suma vertical de porcentajes
     for var_nombre, var_info in variables.items():
-        col_original = var_info['columna']
         num_cats = len(var_info['categorias'])
         
         for i, cat in enumerate(var_info['categorias']):
             es_primera = (i == 0)
             es_ultima = (i == num_cats - 1)
             
-            # Sumar los porcentajes verticalmente
-            suma_porcentajes = 0
-            for idx_opcion in range(len(opciones)):
-                fila_anterior = fila_porcentajes - len(opciones) + idx_opcion
-                valor_celda = ws.cell(row=fila_anterior, column=col_actual).value
-                if valor_celda is not None:
-                    if isinstance(valor_celda, (int, float)):
-                        # Los valores están en formato decimal (0.13), multiplicar por 10000 para obtener centésimas
-                        suma_porcentajes += int(valor_celda * 10000)
-                    elif isinstance(valor_celda, str) and valor_celda != "---" and '%' in valor_celda:
-                        suma_porcentajes += int(valor_celda.replace('%', '')) * 100
-            
-            if suma_porcentajes == 0:
-                ws.cell(row=fila_porcentajes, column=col_actual, value="---")
-            else:
-                # Truncar a dos decimales sin redondear (almacenar como decimal con 2 decimales)
-                suma_decimal = int(suma_porcentajes) / 10000
-                ws.cell(row=fila_porcentajes, column=col_actual, value=suma_decimal)
-                ws.cell(row=fila_porcentajes, column=col_actual).number_format = '0.00%'
+            # Suma vertical de los porcentajes de la columna (desde el arreglo)
+            suma_unidades = porcentajes_vars[var_nombre]['suma_unidades'][i]
+            ws.cell(row=fila_porcentajes, column=col_actual, value=celda_porcentaje(
+                suma_unidades, porcentajes_vars[var_nombre]['suma_valores'][i]))
+            if suma_unidades != 0:
+                ws.cell(row=fila_porcentajes, column=col_actual).number_format = porcentajes_vars[var_nombre]['formato']
             
             ws.cell(row=fila_porcentajes, column=col_actual).font = Font(bold=True)
             border = Border(
                 left=Side(style='medium' if es_primera else 'thin', color='FFD0D0D0'),
-                right=Side(style='medium' if es_ultima else 'thin', color='FFD0D0D0'),
+                right=Side(style='medium') if col_actual == ultima_columna else Side(style='medium' if es_ultima else 'thin', color='FFD0D0D0'),
                 top=Side(style='thin', color='FFD0D0D0'),
                 bottom=Side(style='medium')
             )
@@ -942,32 +991,17 @@ def generar_hoja_pregunta(wb, df, pregunta_num, pregunta_col, pregunta_nombre, t
             ws.cell(row=fila_porcentajes, column=col_actual).alignment = Alignment(horizontal='center', vertical='center')
             col_actual += 1
     
-    # Asegurar bordes en última fila y última columna de porcentajes
-    for col_idx in range(1, total_columnas + 1):
-        cell = ws.cell(row=fila_porcentajes, column=col_idx)
-        if cell.border:
-            current_border = cell.border
-            right_style = Side(style='medium') if col_idx == total_columnas else current_border.right
-            new_border = Border(
-                left=current_border.left,
-                right=right_style,
-                top=current_border.top,
-                bottom=Side(style='medium')
+    # Intervalos de confianza bootstrap (límite inferior y superior de cada porcentaje)
+    if intervalos is not None:
+        nivel = int(round(intervalos['nivel'] * 100))
+        for indice_limite, nombre_limite in enumerate(['LÍMITE INFERIOR', 'LÍMITE SUPERIOR']):
+            titulo = f"{nombre_limite} IC {nivel}% (bootstrap, {intervalos['remuestras']} remuestras)"
+            fila_porcentajes = escribir_tabla_intervalo(
+                ws, fila_porcentajes + 3, titulo, opciones, variables,
+                intervalos['total'][indice_limite],
+                {var_nombre: limites[indice_limite] for var_nombre, limites in intervalos['variables'].items()},
+                ultima_columna
             )
-            cell.border = new_border
-    
-    # Asegurar que la última columna de todas las filas tenga right=medium
-    for row in range(fila - 2, fila_porcentajes + 1):
-        cell = ws.cell(row=row, column=total_columnas)
-        if cell.border:
-            current_border = cell.border
-            new_border = Border(
-                left=current_border.left,
-                right=Side(style='medium'),
-                top=current_border.top,
-                bottom=current_border.bottom
-            )
-            cell.border = new_border
     
     # Ajustar ancho de columnas
     ws.column_dimensions['A'].width = 30
@@ -975,147 +1009,36 @@ def generar_hoja_pregunta(wb, df, pregunta_num, pregunta_col, pregunta_nombre, t
         ws.column_dimensions[get_column_letter(col_idx)].width = 12
     
     print(f"  ✓ Hoja P{pregunta_num} generada exitosamente")
+    return tabla
 
-def generar_analisis_en_hoja_unica(ws, df, pregunta_num, pregunta_col, pregunta_nombre, tiene_combinaciones, fila_inicio):
+def generar_analisis_en_hoja_unica(ws, df, pregunta_num, pregunta_col, pregunta_nombre, tiene_combinaciones, fila_inicio, variables=None,
+                                   columna_peso=None, opciones=None, tabla=None):
     """
     Genera el análisis de una pregunta en una hoja existente, empezando desde fila_inicio.
+    columna_peso, opciones, tabla: ver generar_hoja_pregunta.
     Retorna la siguiente fila disponible.
     """
     # Obtener opciones de la pregunta
-    opciones = obtener_opciones_unicas(df, pregunta_col, tiene_combinaciones)
+    if opciones is None:
+        with etapa('perfil_esquema'):
+            opciones = obtener_opciones_unicas(df, pregunta_col, tiene_combinaciones)
     
     if len(opciones) == 0:
         return fila_inicio
     
     # Preparar datos
-    df_work = df.copy()
-    
-    # FILTRO ESPECIAL PARA P6: Solo incluir registros con "b. Contact Center" en P3
-    if pregunta_col == 'P6 - Gestión Contact Center':
-        p3_col = 'P3 - Medios SAT Utilizados'
-        if p3_col in df_work.columns:
-            # Filtrar solo registros que tienen "b. Contact Center" en P3
-            mask_p3_contact = df_work[p3_col].astype(str).str.contains('b. Contact Center', na=False)
-            df_work = df_work[mask_p3_contact].copy()
-    
-    # FILTRO ESPECIAL PARA P7: Solo incluir registros con "b. Contact Center" en P3
-    if pregunta_col == 'P7 - Medio Contact Center':
-        p3_col = 'P3 - Medios SAT Utilizados'
-        if p3_col in df_work.columns:
-            # Filtrar solo registros que tienen "b. Contact Center" en P3
-            mask_p3_contact = df_work[p3_col].astype(str).str.contains('b. Contact Center', na=False)
-            df_work = df_work[mask_p3_contact].copy()
-    
-    # FILTRO ESPECIAL PARA P8: Solo incluir registros con "a. Presencial" en P3
-    if pregunta_col == 'P8 - Gestión Visita Presencial':
-        p3_col = 'P3 - Medios SAT Utilizados'
-        if p3_col in df_work.columns:
-            # Filtrar solo registros que tienen "a. Presencial" en P3
-            mask_p3_presencial = df_work[p3_col].astype(str).str.contains('a. Presencial', na=False)
-            df_work = df_work[mask_p3_presencial].copy()
-    
-    df_work['Rango_Edad'] = df_work['P36 - Edad'].apply(crear_rango_edad)
-    df_work['Region_Oficina'] = df_work['P44 - Oficina/Agencia/Delegación'].apply(obtener_region_oficina)
-    df_work['Region_Aduana'] = df_work['P44 - Aduana'].apply(obtener_region_aduana)
-    
-    if tiene_combinaciones:
-        df_work[f'{pregunta_col}_norm'] = df_work[pregunta_col].apply(
-            lambda x: normalizar_combinaciones(x, opciones)
-        )
+    if tabla is None:
+        with etapa('columnas_derivadas', registros=len(df)):
+            df_work, _ = preparar_poblacion(df, pregunta_col)
     
     # Definir estilos
     thin_side = Side(style='thin', color='FFD0D0D0')
     medium_side = Side(style='medium')
-    thin_border = Border(left=thin_side, right=thin_side, top=thin_side, bottom=thin_side)
     fill_fila1 = PatternFill(start_color='FFD9E1F2', end_color='FFD9E1F2', fill_type='solid')
-    fill_header = PatternFill(start_color='FFE7E6E6', end_color='FFE7E6E6', fill_type='solid')
     
-    # Definir variables de cruce
-    col = 1
-    variables = {
-        'P37 Género': {
-            'columna': 'P37 - Género',
-            'categorias': ['H', 'M', 'No deseo responder'],
-            'col_inicio': col + 2
-        },
-        'P3 Medios SAT utilizados': {
-            'columna': 'P3 - Medios SAT Utilizados',
-            'categorias': ['a. Presencial', 'b. Contact Center', 'c. Servicios Electrónicos'],
-            'col_inicio': col + 5,
-            'usa_contains': True  # Marcar que usa str.contains() para contar
-        },
-        'Rango de edad': {
-            'columna': 'Rango_Edad',
-            'categorias': ['18 - 25', '26 - 35', '36 - 45', '46 - 60', 'Más de 61'],
-            'col_inicio': col + 8
-        },
-        'P40 Nivel académico': {
-            'columna': 'P40 - Nivel Académico',
-            'categorias': [
-                'a. Ninguno', 'b. Primaria incompleta', 'c. Primaria completa',
-                'd. Secundaria incompleta (1ro a 3ro básico)', 'e. Secundaria Completa (1ro a 3ro básico)',
-                'f. Diversificado incompleto', 'g. Diversificado completo', 'h. Técnico',
-                'i. Universidad incompleta', 'j. Universidad Completa', 'k. Maestría / Posgrado'
-            ],
-            'col_inicio': col + 13
-        },
-        'P39 Idiomas': {
-            'columna': 'P39 - Idiomas',
-            'categorias': [
-                'a. Achi', 'b. Qánjob\'al', 'c. Q\'eqchi', 'd. Akateco', 'e. Kaqchikel',
-                'f. Sakapulteko', 'h. Kiché', 'i. Sipakapense', 'k. Mam', 'n. Mopan',
-                'p. Ixil', 'q. Poqomam', 's. Jakalteco', 't. Poqomchi', 'u. Ninguno',
-                'v. Inglés', 'w. Otro'
-            ],
-            'col_inicio': col + 24
-        },
-        'P44 Oficina/Agencia/Delegación': {
-            'columna': 'P44 - Oficina/Agencia/Delegación',
-            'categorias': [
-                'Alta Verapaz', 'Baja Verapaz', 'Chimaltenango', 'Chiquimula', 'El Progreso',
-                'Escuintla', 'Guatemala', 'Huehuetenango', 'Izabal', 'Jalapa', 'Jutiapa',
-                'Petén', 'Quetzaltenango', 'Quiché', 'Retalhuleu', 'Sacatepéquez', 'San Marcos',
-                'Santa Rosa', 'Sololá', 'Suchitepéquez', 'Totonicapán', 'Zacapa'
-            ],
-            'col_inicio': col + 41
-        },
-        'P44.1 Aduana': {
-            'columna': 'P44 - Aduana',
-            'categorias': [
-                'Central Guatemala', 'El Carmen', 'Integrada Corinto', 'Integrada El Florido',
-                'La Mesilla', 'Puerto Barrios Almacenadora Pelícano, S.A -ALPELSA', 'Puerto Quetzal',
-                'San Cristóbal', 'Santo Tomás de Castilla Zona Libre de Industria y Comercio -ZOLIC-',
-                'Tikal', 'Valle Nuevo'
-            ],
-            'col_inicio': col + 63
-        },
-        'P9 Personería': {
-            'columna': 'P9 - Personería',
-            'categorias': [
-                'a. Contribuyente/Propietario.', 'b. Representante Legal', 'c. Abogado y Notario',
-                'd. Mandatario', 'e. Contador/auxiliar', 'f. Contador Público y Auditor',
-                'g. Gestor Tributario', 'h. Importador', 'i. Exportador', 'j. Asistente de Agente',
-                'k. Auxiliar Gestor Tributario', 'm. Consolidador/Descons.', 'n. Transportista Ad',
-                'p. Mensajero', 'r. Otro'
-            ],
-            'col_inicio': col + 74
-        },
-        'P38 Etnia': {
-            'columna': 'P38 - Etnia',
-            'categorias': ['Garifuna', 'Ladino', 'Maya', 'Otro', 'Xinca'],
-            'col_inicio': col + 89
-        },
-        'Oficina/Agencia/Delegación': {
-            'columna': 'Region_Oficina',
-            'categorias': ['Central', 'Occidente', 'Sur', 'Nororiente'],
-            'col_inicio': col + 94
-        },
-        'Aduana': {
-            'columna': 'Region_Aduana',
-            'categorias': ['Central', 'Occidente', 'Sur', 'Nororiente'],
-            'col_inicio': col + 98
-        }
-    }
+    # Variables de cruce
+    if variables is None:
+        variables = VARIABLES_CRUCE
     
     # Calcular total de columnas
     total_columnas = 2
@@ -1124,6 +1047,10 @@ def generar_analisis_en_hoja_unica(ws, df, pregunta_num, pregunta_col, pregunta_
     
     fila = fila_inicio
     
+    # La tabla de conteos lleva borde derecho medium en la última columna; se
+    # aplica al escribir cada celda, sin volver a leer la hoja
+    ultima_columna = total_columnas
+    
     # Fila: Título de la pregunta
     ws.merge_cells(start_row=fila, start_column=1, end_row=fila, end_column=total_columnas)
     ws.cell(row=fila, column=1, value=pregunta_nombre)
@@ -1136,82 +1063,24 @@ def generar_analisis_en_hoja_unica(ws, df, pregunta_num, pregunta_col, pregunta_
         top=medium_side,
         bottom=thin_side
     )
+    ws.cell(row=fila, column=ultima_columna).border = Border(right=medium_side)
     fila += 1
     
     # Fila: Vacía con fondo gris
     for col_idx in range(1, total_columnas + 1):
         cell = ws.cell(row=fila, column=col_idx)
         cell.fill = fill_fila1
-        cell.border = Border(left=thin_side, right=thin_side, top=thin_side, bottom=thin_side)
-    fila += 1
-    
-    # Fila: Encabezados principales
-    col_actual = 1
-    ws.cell(row=fila, column=col_actual, value='')
-    ws.cell(row=fila, column=col_actual).fill = fill_header
-    ws.cell(row=fila, column=col_actual).border = Border(left=medium_side, right=medium_side, top=thin_side, bottom=thin_side)
-    col_actual += 1
-    
-    ws.cell(row=fila, column=col_actual, value='TOTAL')
-    ws.cell(row=fila, column=col_actual).fill = fill_header
-    ws.cell(row=fila, column=col_actual).border = Border(left=medium_side, right=medium_side, top=thin_side, bottom=thin_side)
-    ws.cell(row=fila, column=col_actual).font = Font(bold=True)
-    ws.cell(row=fila, column=col_actual).alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-    col_actual += 1
-    
-    for var_nombre, var_info in variables.items():
-        num_cols = len(var_info['categorias'])
-        inicio = col_actual
-        fin = col_actual + num_cols - 1
-        
-        ws.merge_cells(start_row=fila, start_column=inicio, end_row=fila, end_column=fin)
-        ws.cell(row=fila, column=inicio, value=var_nombre)
-        ws.cell(row=fila, column=inicio).fill = fill_header
-        ws.cell(row=fila, column=inicio).border = Border(left=medium_side, right=medium_side, top=thin_side, bottom=thin_side)
-        ws.cell(row=fila, column=inicio).font = Font(bold=True)
-        ws.cell(row=fila, column=inicio).alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-        
-        col_actual = fin + 1
+        cell.border = Border(left=thin_side, right=medium_side if col_idx == ultima_columna else thin_side, top=thin_side, bottom=thin_side)
     fila += 1
     
-    # Fila: Sub-encabezados
-    col_actual = 1
-    ws.cell(row=fila, column=col_actual, value='')
-    ws.cell(row=fila, column=col_actual).border = thin_border
-    col_actual += 1
-    
-    ws.cell(row=fila, column=col_actual, value='')
-    ws.cell(row=fila, column=col_actual).border = Border(
-        left=medium_side, 
-        right=medium_side, 
-        top=Side(style='medium'), 
-        bottom=Side(style='thin', color='FFD0D0D0')
-    )
-    col_actual += 1
-    
-    for var_nombre, var_info in variables.items():
-        num_cats = len(var_info['categorias'])
-        for i, cat in enumerate(var_info['categorias']):
-            es_primera = (i == 0)
-            es_ultima = (i == num_cats - 1)
-            ws.cell(row=fila, column=col_actual, value=cat)
-            ws.cell(row=fila, column=col_actual).font = Font(bold=True)
-            border = Border(
-                left=Side(style='medium' if es_primera else 'thin', color='FFD0D0D0'),
-                right=Side(style='medium' if es_ultima else 'thin', color='FFD0D0D0'),
-                top=Side(style='medium'),
-                bottom=Side(style='thin', color='FFD0D0D0')
-            )
-            ws.cell(row=fila, column=col_actual).border = border
-            ws.cell(row=fila, column=col_actual).alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-            col_actual += 1
-    fila += 1
+    # Filas: Encabezados principales y sub-encabezados
+    fila = escribir_encabezados(ws, fila, variables, thin_side, ultima_columna)
     
     # Filas de datos
-    if tiene_combinaciones:
-        df_pregunta = df_work[df_work[pregunta_col].notna()].copy()
-    else:
-        df_pregunta = df_work[df_work[pregunta_col].notna()].copy()
+    if tabla is None:
+        predicado_pregunta = predicado_contiene if tiene_combinaciones else predicado_igualdad
+        with etapa('calculo', registros=len(df_work)):
+            tabla = calcular_tabla_cruzada(df_work, pregunta_col, opciones, predicado_pregunta, variables, columna_peso)
     
     for idx_opcion, opcion in enumerate(opciones):
         col_actual = 1
@@ -1229,12 +1098,7 @@ def generar_analisis_en_hoja_unica(ws, df, pregunta_num, pregunta_col, pregunta_
         col_actual += 1
         
         # TOTAL
-        if tiene_combinaciones:
-            total = len(df_work[df_work[pregunta_col].astype(str).str.contains(opcion, na=False, regex=False)])
-        else:
-            total = len(df_work[df_work[pregunta_col] == opcion])
-        
-        ws.cell(row=fila, column=col_actual, value=total)
+        escribir_conteo(ws, fila, col_actual, tabla['totales_opcion'][idx_opcion])
         border = Border(
             left=Side(style='medium'),
             right=Side(style='medium'),
@@ -1247,7 +1111,6 @@ def generar_analisis_en_hoja_unica(ws, df, pregunta_num, pregunta_col, pregunta_
         
         # Datos por variable
         for var_nombre, var_info in variables.items():
-            col_original = var_info['columna']
             num_cats = len(var_info['categorias'])
             
             for i, cat in enumerate(var_info['categorias']):
@@ -1255,63 +1118,10 @@ def generar_analisis_en_hoja_unica(ws, df, pregunta_num, pregunta_col, pregunta_
                 es_ultima = (i == num_cats - 1)
                 
                 # Contar intersección
-                if tiene_combinaciones:
-                    if col_original == 'Rango_Edad':
-                        count = len(df_work[
-                            (df_work[pregunta_col].astype(str).str.contains(opcion, na=False, regex=False)) & 
-                            (df_work[col_original] == cat)
-                        ])
-                    elif col_original == 'P39 - Idiomas':
-                        count = len(df_work[
-                            (df_work[pregunta_col].astype(str).str.contains(opcion, na=False, regex=False)) & 
-                            (df_work[col_original].astype(str).str.contains(cat, na=False))
-                        ])
-                    elif col_original == 'P3 - Medios SAT Utilizados':
-                        count = len(df_work[
-                            (df_work[pregunta_col].astype(str).str.contains(opcion, na=False, regex=False)) & 
-                            (df_work[col_original].astype(str).str.contains(cat, na=False))
-                        ])
-                    elif col_original == 'Region_Oficina' or col_original == 'Region_Aduana':
-                        count = len(df_work[
-                            (df_work[pregunta_col].astype(str).str.contains(opcion, na=False, regex=False)) & 
-                            (df_work[col_original] == cat)
-                        ])
-                    else:
-                        count = len(df_work[
-                            (df_work[pregunta_col].astype(str).str.contains(opcion, na=False, regex=False)) & 
-                            (df_work[col_original] == cat)
-                        ])
-                else:
-                    if col_original == 'Rango_Edad':
-                        count = len(df_work[
-                            (df_work[pregunta_col] == opcion) & 
-                            (df_work[col_original] == cat)
-                        ])
-                    elif col_original == 'P39 - Idiomas':
-                        count = len(df_work[
-                            (df_work[pregunta_col] == opcion) & 
-                            (df_work[col_original].astype(str).str.contains(cat, na=False))
-                        ])
-                    elif col_original == 'P3 - Medios SAT Utilizados':
-                        count = len(df_work[
-                            (df_work[pregunta_col] == opcion) & 
-                            (df_work[col_original].astype(str).str.contains(cat, na=False))
-                        ])
-                    elif col_original == 'Region_Oficina' or col_original == 'Region_Aduana':
-                        count = len(df_work[
-                            (df_work[pregunta_col] == opcion) & 
-                            (df_work[col_original] == cat)
-                        ])
-                    else:
-                        count = len(df_work[
-                            (df_work[pregunta_col] == opcion) & 
-                            (df_work[col_original] == cat)
-                        ])
-                
-                ws.cell(row=fila, column=col_actual, value=count)
+                escribir_conteo(ws, fila, col_actual, tabla['conteos'][var_nombre][idx_opcion, i])
                 border = Border(
                     left=Side(style='medium' if es_primera else 'thin', color='FFD0D0D0'),
-                    right=Side(style='medium' if es_ultima else 'thin', color='FFD0D0D0'),
+                    right=Side(style='medium') if col_actual == ultima_columna else Side(style='medium' if es_ultima else 'thin', color='FFD0D0D0'),
                     top=Side(style='medium' if idx_opcion == 0 else 'thin', color='FFD0D0D0'),
                     bottom=Side(style='thin', color='FFD0D0D0')
                 )
@@ -1321,19 +1131,6 @@ def generar_analisis_en_hoja_unica(ws, df, pregunta_num, pregunta_col, pregunta_
         
         fila += 1
     
-    # Asegurar bordes right=medium en última columna
-    for row in range(fila_inicio, fila + 1):
-        cell = ws.cell(row=row, column=total_columnas)
-        if cell.border:
-            current_border = cell.border
-            new_border = Border(
-                left=current_border.left,
-                right=Side(style='medium'),
-                top=current_border.top,
-                bottom=current_border.bottom
-            )
-            cell.border = new_border
-    
     # Fila TOTAL
     col_actual = 1
     ws.cell(row=fila, column=col_actual, value='TOTAL')
@@ -1348,8 +1145,8 @@ def generar_analisis_en_hoja_unica(ws, df, pregunta_num, pregunta_col, pregunta_
     col_actual += 1
     
     # TOTAL general (usar el total de registros del dataset, no solo los que tienen respuesta)
-    total_general = len(df_work)
-    ws.cell(row=fila, column=col_actual, value=total_general)
+    total_general = tabla['total_general']
+    escribir_conteo(ws, fila, col_actual, total_general)
     ws.cell(row=fila, column=col_actual).font = Font(bold=True)
     ws.cell(row=fila, column=col_actual).border = Border(
         left=Side(style='medium'),
@@ -1362,29 +1159,17 @@ def generar_analisis_en_hoja_unica(ws, df, pregunta_num, pregunta_col, pregunta_
     
     # Totales por categoría
     for var_nombre, var_info in variables.items():
-        col_original = var_info['columna']
         num_cats = len(var_info['categorias'])
         
         for i, cat in enumerate(var_info['categorias']):
             es_primera = (i == 0)
             es_ultima = (i == num_cats - 1)
             
-            if col_original == 'Rango_Edad':
-                total_cat = len(df_pregunta[df_pregunta[col_original] == cat])
-            elif col_original == 'P39 - Idiomas':
-                total_cat = len(df_pregunta[df_pregunta[col_original].astype(str).str.contains(cat, na=False)])
-            elif col_original == 'P3 - Medios SAT Utilizados':
-                total_cat = len(df_pregunta[df_pregunta[col_original].astype(str).str.contains(cat, na=False)])
-            elif col_original == 'Region_Oficina' or col_original == 'Region_Aduana':
-                total_cat = len(df_pregunta[df_pregunta[col_original] == cat])
-            else:
-                total_cat = len(df_pregunta[df_pregunta[col_original] == cat])
-            
-            ws.cell(row=fila, column=col_actual, value=total_cat)
+            escribir_conteo(ws, fila, col_actual, tabla['totales_categoria'][var_nombre][i])
             ws.cell(row=fila, column=col_actual).font = Font(bold=True)
             border = Border(
                 left=Side(style='medium' if es_primera else 'thin', color='FFD0D0D0'),
-                right=Side(style='medium' if es_ultima else 'thin', color='FFD0D0D0'),
+                right=Side(style='medium') if col_actual == ultima_columna else Side(style='medium' if es_ultima else 'thin', color='FFD0D0D0'),
                 top=Side(style='thin', color='FFD0D0D0'),
                 bottom=Side(style='medium')
             )
@@ -1392,89 +1177,28 @@ def generar_analisis_en_hoja_unica(ws, df, pregunta_num, pregunta_col, pregunta_
             ws.cell(row=fila, column=col_actual).alignment = Alignment(horizontal='center', vertical='center')
             col_actual += 1
     
-    # Asegurar bordes en última fila
-    for col_idx in range(1, total_columnas + 1):
-        cell = ws.cell(row=fila, column=col_idx)
-        if cell.border:
-            current_border = cell.border
-            right_style = Side(style='medium') if col_idx == total_columnas else current_border.right
-            new_border = Border(
-                left=current_border.left,
-                right=right_style,
-                top=current_border.top,
-                bottom=Side(style='medium')
-            )
-            cell.border = new_border
+    # Base sin ponderar (N de registros) debajo de la fila TOTAL ponderada
+    if 'sin_ponderar' in tabla:
+        fila = escribir_fila_sin_ponderar(ws, fila + 1, variables, tabla['sin_ponderar'], ultima_columna)
     
     # Agregar dos filas vacías
     fila += 2
     
-    # TABLA DE PORCENTAJES
-    fila_porcentajes = fila
-    
-    # Fila de encabezados principales
-    col_actual = 1
-    ws.cell(row=fila_porcentajes, column=col_actual, value='')
-    ws.cell(row=fila_porcentajes, column=col_actual).fill = fill_header
-    ws.cell(row=fila_porcentajes, column=col_actual).border = Border(left=medium_side, right=medium_side, top=medium_side, bottom=thin_side)
-    col_actual += 1
-    
-    ws.cell(row=fila_porcentajes, column=col_actual, value='TOTAL')
-    ws.cell(row=fila_porcentajes, column=col_actual).fill = fill_header
-    ws.cell(row=fila_porcentajes, column=col_actual).border = Border(left=medium_side, right=medium_side, top=medium_side, bottom=thin_side)
-    ws.cell(row=fila_porcentajes, column=col_actual).font = Font(bold=True)
-    ws.cell(row=fila_porcentajes, column=col_actual).alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-    col_actual += 1
+    # TABLA DE PORCENTAJES (el marco derecho solo se aplica a su fila TOTAL)
+    ultima_columna = None
+    fila_porcentajes = escribir_encabezados(ws, fila, variables, medium_side)
     
-    for var_nombre, var_info in variables.items():
-        num_cols = len(var_info['categorias'])
-        inicio = col_actual
-        fin = col_actual + num_cols - 1
-        
-        ws.merge_cells(start_row=fila_porcentajes, start_column=inicio, end_row=fila_porcentajes, end_column=fin)
-        ws.cell(row=fila_porcentajes, column=inicio, value=var_nombre)
-        ws.cell(row=fila_porcentajes, column=inicio).fill = fill_header
-        ws.cell(row=fila_porcentajes, column=inicio).border = Border(left=medium_side, right=medium_side, top=medium_side, bottom=thin_side)
-        ws.cell(row=fila_porcentajes, column=inicio).font = Font(bold=True)
-        ws.cell(row=fila_porcentajes, column=inicio).alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-        
-        col_actual = fin + 1
-    
-    # Fila de sub-encabezados
-    fila_porcentajes += 1
-    col_actual = 1
-    ws.cell(row=fila_porcentajes, column=col_actual, value='')
-    ws.cell(row=fila_porcentajes, column=col_actual).border = thin_border
-    col_actual += 1
-    
-    ws.cell(row=fila_porcentajes, column=col_actual, value='')
-    ws.cell(row=fila_porcentajes, column=col_actual).border = Border(
-        left=medium_side, 
-        right=medium_side, 
-        top=Side(style='medium'), 
-        bottom=Side(style='thin', color='FFD0D0D0')
-    )
-    col_actual += 1
-    
-    for var_nombre, var_info in variables.items():
-        num_cats = len(var_info['categorias'])
-        for i, cat in enumerate(var_info['categorias']):
-            es_primera = (i == 0)
-            es_ultima = (i == num_cats - 1)
-            ws.cell(row=fila_porcentajes, column=col_actual, value=cat)
-            ws.cell(row=fila_porcentajes, column=col_actual).font = Font(bold=True)
-            border = Border(
-                left=Side(style='medium' if es_primera else 'thin', color='FFD0D0D0'),
-                right=Side(style='medium' if es_ultima else 'thin', color='FFD0D0D0'),
-                top=Side(style='medium'),
-                bottom=Side(style='thin', color='FFD0D0D0')
-            )
-            ws.cell(row=fila_porcentajes, column=col_actual).border = border
-            ws.cell(row=fila_porcentajes, column=col_actual).alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-            col_actual += 1
+    # Porcentajes de toda la tabla en una sola llamada por grupo: la columna
+    # TOTAL sobre el total general y las categorías en vertical
+    porcentajes_total = calcular_porcentajes(tabla['totales_opcion'], total_general, base='total')
+    porcentajes_vars = {
+        var_nombre: calcular_porcentajes(
+            tabla['conteos'][var_nombre], tabla['totales_categoria'][var_nombre], base='vertical'
+        )
+        for var_nombre in variables
+    }
     
     # Filas de datos con porcentajes
-    fila_porcentajes += 1
     for idx_opcion, opcion in enumerate(opciones):
         col_actual = 1
         
@@ -1490,22 +1214,11 @@ def generar_analisis_en_hoja_unica(ws, df, pregunta_num, pregunta_col, pregunta_
         ws.cell(row=fila_porcentajes, column=col_actual).alignment = Alignment(horizontal='left', vertical='center')
         col_actual += 1
         
-        # TOTAL - calcular porcentaje
-        if tiene_combinaciones:
-            total_absoluto = len(df_work[df_work[pregunta_col].astype(str).str.contains(opcion, na=False, regex=False)])
-        else:
-            total_absoluto = len(df_work[df_work[pregunta_col] == opcion])
-        
-        porcentaje_total = (total_absoluto / total_general * 100) if total_general > 0 else 0
-        # Truncar a dos decimales sin redondear (almacenar como decimal)
-        # Ejemplo: 13.456% -> int(13.456 * 100) = 1345 -> 1345/10000 = 0.1345 (representa 13.45%)
-        porcentaje_decimal = int(porcentaje_total * 100) / 10000
-        
-        if porcentaje_decimal == 0:
-            ws.cell(row=fila_porcentajes, column=col_actual, value="---")
-        else:
-            ws.cell(row=fila_porcentajes, column=col_actual, value=porcentaje_decimal)
-            ws.cell(row=fila_porcentajes, column=col_actual).number_format = '0.00%'
+        # TOTAL - porcentaje sobre el total general
+        ws.cell(row=fila_porcentajes, column=col_actual, value=celda_porcentaje(
+            porcentajes_total['unidades'][idx_opcion], porcentajes_total['valores'][idx_opcion]))
+        if porcentajes_total['unidades'][idx_opcion] != 0:
+            ws.cell(row=fila_porcentajes, column=col_actual).number_format = porcentajes_total['formato']
         
         border = Border(
             left=Side(style='medium'),
@@ -1519,92 +1232,22 @@ def generar_analisis_en_hoja_unica(ws, df, pregunta_num, pregunta_col, pregunta_
         
         # Datos por variable (porcentajes)
         for var_nombre, var_info in variables.items():
-            col_original = var_info['columna']
             num_cats = len(var_info['categorias'])
             
             for i, cat in enumerate(var_info['categorias']):
                 es_primera = (i == 0)
                 es_ultima = (i == num_cats - 1)
                 
-                # Contar intersección
-                if tiene_combinaciones:
-                    if col_original == 'Rango_Edad':
-                        count = len(df_work[
-                            (df_work[pregunta_col].astype(str).str.contains(opcion, na=False, regex=False)) & 
-                            (df_work[col_original] == cat)
-                        ])
-                    elif col_original == 'P39 - Idiomas':
-                        count = len(df_work[
-                            (df_work[pregunta_col].astype(str).str.contains(opcion, na=False, regex=False)) & 
-                            (df_work[col_original].astype(str).str.contains(cat, na=False))
-                        ])
-                    elif col_original == 'P3 - Medios SAT Utilizados':
-                        count = len(df_work[
-                            (df_work[pregunta_col].astype(str).str.contains(opcion, na=False, regex=False)) & 
-                            (df_work[col_original].astype(str).str.contains(cat, na=False))
-                        ])
-                    elif col_original == 'Region_Oficina' or col_original == 'Region_Aduana':
-                        count = len(df_work[
-                            (df_work[pregunta_col].astype(str).str.contains(opcion, na=False, regex=False)) & 
-                            (df_work[col_original] == cat)
-                        ])
-                    else:
-                        count = len(df_work[
-                            (df_work[pregunta_col].astype(str).str.contains(opcion, na=False, regex=False)) & 
-                            (df_work[col_original] == cat)
-                        ])
-                else:
-                    if col_original == 'Rango_Edad':
-                        count = len(df_work[
-                            (df_work[pregunta_col] == opcion) & 
-                            (df_work[col_original] == cat)
-                        ])
-                    elif col_original == 'P39 - Idiomas':
-                        count = len(df_work[
-                            (df_work[pregunta_col] == opcion) & 
-                            (df_work[col_original].astype(str).str.contains(cat, na=False))
-                        ])
-                    elif col_original == 'P3 - Medios SAT Utilizados':
-                        count = len(df_work[
-                            (df_work[pregunta_col] == opcion) & 
-                            (df_work[col_original].astype(str).str.contains(cat, na=False))
-                        ])
-                    elif col_original == 'Region_Oficina' or col_original == 'Region_Aduana':
-                        count = len(df_work[
-                            (df_work[pregunta_col] == opcion) & 
-                            (df_work[col_original] == cat)
-                        ])
-                    else:
-                        count = len(df_work[
-                            (df_work[pregunta_col] == opcion) & 
-                            (df_work[col_original] == cat)
-                        ])
-                
-                # Calcular porcentaje VERTICAL (sobre el total de esa categoría)
-                if col_original == 'Rango_Edad':
-                    total_categoria = len(df_pregunta[df_pregunta[col_original] == cat])
-                elif col_original == 'P39 - Idiomas':
-                    total_categoria = len(df_pregunta[df_pregunta[col_original].astype(str).str.contains(cat, na=False)])
-                elif col_original == 'P3 - Medios SAT Utilizados':
-                    total_categoria = len(df_pregunta[df_pregunta[col_original].astype(str).str.contains(cat, na=False)])
-                elif col_original == 'Region_Oficina' or col_original == 'Region_Aduana':
-                    total_categoria = len(df_pregunta[df_pregunta[col_original] == cat])
-                else:
-                    total_categoria = len(df_pregunta[df_pregunta[col_original] == cat])
-                
-                porcentaje = (count / total_categoria * 100) if total_categoria > 0 else 0
-                # Truncar a dos decimales sin redondear (almacenar como decimal con 2 decimales)
-                porcentaje_decimal = int(porcentaje * 100) / 10000
-                
-                if porcentaje_decimal == 0:
-                    ws.cell(row=fila_porcentajes, column=col_actual, value="---")
-                else:
-                    ws.cell(row=fila_porcentajes, column=col_actual, value=porcentaje_decimal)
-                    ws.cell(row=fila_porcentajes, column=col_actual).number_format = '0.00%'
+                # Porcentaje VERTICAL (sobre el total de esa categoría)
+                unidades = porcentajes_vars[var_nombre]['unidades'][idx_opcion, i]
+                ws.cell(row=fila_porcentajes, column=col_actual, value=celda_porcentaje(
+                    unidades, porcentajes_vars[var_nombre]['valores'][idx_opcion, i]))
+                if unidades != 0:
+                    ws.cell(row=fila_porcentajes, column=col_actual).number_format = porcentajes_vars[var_nombre]['formato']
                 
                 border = Border(
                     left=Side(style='medium' if es_primera else 'thin', color='FFD0D0D0'),
-                    right=Side(style='medium' if es_ultima else 'thin', color='FFD0D0D0'),
+                    right=Side(style='medium') if col_actual == ultima_columna else Side(style='medium' if es_ultima else 'thin', color='FFD0D0D0'),
                     top=Side(style='medium' if idx_opcion == 0 else 'thin', color='FFD0D0D0'),
                     bottom=Side(style='thin', color='FFD0D0D0')
                 )
@@ -1615,6 +1258,7 @@ def generar_analisis_en_hoja_unica(ws, df, pregunta_num, pregunta_col, pregunta_
         fila_porcentajes += 1
     
     # Fila TOTAL de porcentajes
+    ultima_columna = total_columnas
     col_actual = 1
     ws.cell(row=fila_porcentajes, column=col_actual, value='TOTAL')
     ws.cell(row=fila_porcentajes, column=col_actual).font = Font(bold=True)
@@ -1642,31 +1286,23 @@ def generar_analisis_en_hoja_unica(ws, df, pregunta_num, pregunta_col, pregunta_
     
     # Totales por categoría (suma vertical de porcentajes)
     for var_nombre, var_info in variables.items():
-        col_original = var_info['columna']
         num_cats = len(var_info['categorias'])
         
         for i, cat in enumerate(var_info['categorias']):
             es_primera = (i == 0)
             es_ultima = (i == num_cats - 1)
             
-            # Sumar porcentajes verticalmente
-            suma_porcentajes = 0
-            for idx_opcion, opcion in enumerate(opciones):
-                fila_opcion = fila_porcentajes - len(opciones) + idx_opcion
-                cell = ws.cell(row=fila_opcion, column=col_actual)
-                if cell.value != "---" and cell.value is not None:
-                    suma_porcentajes += cell.value if isinstance(cell.value, (int, float)) else 0
-            
-            if suma_porcentajes == 0:
-                ws.cell(row=fila_porcentajes, column=col_actual, value="---")
-            else:
-                ws.cell(row=fila_porcentajes, column=col_actual, value=suma_porcentajes)
+            # Suma vertical de los porcentajes de la columna (desde el arreglo)
+            suma_unidades = porcentajes_vars[var_nombre]['suma_unidades'][i]
+            ws.cell(row=fila_porcentajes, column=col_actual, value=celda_porcentaje(
+                suma_unidades, porcentajes_vars[var_nombre]['suma_valores'][i]))
+            if suma_unidades != 0:
                 ws.cell(row=fila_porcentajes, column=col_actual).number_format = '0%'
             
             ws.cell(row=fila_porcentajes, column=col_actual).font = Font(bold=True)
             border = Border(
                 left=Side(style='medium' if es_primera else 'thin', color='FFD0D0D0'),
-                right=Side(style='medium' if es_ultima else 'thin', color='FFD0D0D0'),
+                right=Side(style='medium') if col_actual == ultima_columna else Side(style='medium' if es_ultima else 'thin', color='FFD0D0D0'),
                 top=Side(style='thin', color='FFD0D0D0'),
                 bottom=Side(style='medium')
             )
@@ -1674,68 +1310,576 @@ def generar_analisis_en_hoja_unica(ws, df, pregunta_num, pregunta_col, pregunta_
             ws.cell(row=fila_porcentajes, column=col_actual).alignment = Alignment(horizontal='center', vertical='center')
             col_actual += 1
     
-    # Asegurar bordes en última fila de porcentajes
+    # Ajustar ancho de columnas
+    ws.column_dimensions['A'].width = 30
+    for col_idx in range(2, total_columnas + 1):
+        ws.column_dimensions[get_column_letter(col_idx)].width = 12
+    
+    return fila_porcentajes + 1
+
+def preguntas_multiples(df):
+    """
+    Preguntas con combinaciones múltiples y sus opciones, para el cálculo de
+    coocurrencias: {pregunta_col: (num_str, opciones)}.
+    """
+    multiples = {}
+    for _, pregunta_col, num_str in listar_preguntas(df):
+        if detectar_combinaciones_multiples(df, pregunta_col):
+            opciones = obtener_opciones_unicas(df, pregunta_col, True)
+            if len(opciones) > 0:
+                multiples[pregunta_col] = (num_str, opciones)
+    return multiples
+
+def resolver_pares_coocurrencia(multiples, pares):
+    """
+    Convierte los pares pedidos (número como 'P34' o nombre completo de la
+    columna) en pares de columnas. Un elemento 'todas' agrega todos los pares
+    distintos entre preguntas de selección múltiple.
+    """
+    columnas = list(multiples)
+    
+    def resolver(especificacion):
+        encontradas = [col for col in columnas if especificacion in (col, col.split(' - ')[0])]
+        if len(encontradas) != 1:
+            print(f"ERROR: '{especificacion}' no identifica una pregunta de selección múltiple.")
+            print(f"  Opciones: {', '.join(columnas)}")
+            sys.exit(1)
+        return encontradas[0]
+    
+    resueltos = []
+    for par in pares:
+        if par == 'todas':
+            nuevos = [(a, b) for i, a in enumerate(columnas) for b in columnas[i + 1:]]
+        else:
+            nuevos = [(resolver(par[0]), resolver(par[1]))]
+        resueltos.extend(nuevo for nuevo in nuevos if nuevo not in resueltos)
+    return resueltos
+
+def generar_hoja_coocurrencia(wb, pregunta_a, pregunta_b, opciones_a, opciones_b, tabla):
+    """
+    Genera una hoja de coocurrencia: opciones de la pregunta A (filas) ×
+    opciones de la pregunta B (columnas), con los registros que eligieron
+    ambas. Debajo, el porcentaje de cada fila (sobre el total de la opción A).
+    """
+    num_a = pregunta_a.split(' - ')[0]
+    num_b = pregunta_b.split(' - ')[0]
+    print(f"  Coocurrencia {num_a} × {num_b}")
+    
+    ws = wb.create_sheet(title=f"{num_a}x{num_b}")
+    
+    thin_side = Side(style='thin', color='FFD0D0D0')
+    medium_side = Side(style='medium')
+    fill_fila1 = PatternFill(start_color='FFD9E1F2', end_color='FFD9E1F2', fill_type='solid')
+    
+    # Las opciones de B se presentan como un único grupo de columnas
+    variables = {pregunta_b: {'categorias': list(opciones_b)}}
+    total_columnas = 2 + len(opciones_b)
+    
+    # Fila 1: Título
+    ws.cell(row=1, column=1, value=f"{pregunta_a} × {pregunta_b}")
+    ws.cell(row=1, column=1).font = Font(bold=True, size=14)
+    ws.cell(row=1, column=1).alignment = Alignment(horizontal='left', vertical='center')
+    ws.cell(row=1, column=1).fill = fill_fila1
+    ws.merge_cells(start_row=1, start_column=1, end_row=1, end_column=total_columnas)
+    ws.cell(row=1, column=1).border = Border(left=medium_side, right=medium_side, top=medium_side, bottom=thin_side)
+    
+    # Fila 2: Vacía con fondo gris
     for col_idx in range(1, total_columnas + 1):
-        cell = ws.cell(row=fila_porcentajes, column=col_idx)
-        if cell.border:
-            current_border = cell.border
-            right_style = Side(style='medium') if col_idx == total_columnas else current_border.right
-            new_border = Border(
-                left=current_border.left,
-                right=right_style,
-                top=current_border.top,
-                bottom=Side(style='medium')
-            )
-            cell.border = new_border
+        ws.cell(row=2, column=col_idx).fill = fill_fila1
+        ws.cell(row=2, column=col_idx).border = Border(left=thin_side, right=thin_side, top=thin_side, bottom=thin_side)
+    
+    conteos = tabla['conteos']
+    totales_a = tabla['totales_opcion']
+    # Porcentaje horizontal: sobre el total de cada opción de A
+    porcentajes_fila = calcular_porcentajes(conteos, totales_a, base='horizontal')
+    
+    def escribir_tabla(fila, borde_superior, porcentajes):
+        fila = escribir_encabezados(ws, fila, variables, borde_superior)
+        for idx_a, opcion_a in enumerate(opciones_a):
+            top = Side(style='medium' if idx_a == 0 else 'thin', color='FFD0D0D0')
+            total_a = int(totales_a[idx_a])
+            
+            ws.cell(row=fila, column=1, value=opcion_a)
+            ws.cell(row=fila, column=1).border = Border(left=thin_side, right=thin_side, top=top, bottom=thin_side)
+            ws.cell(row=fila, column=1).alignment = Alignment(horizontal='left', vertical='center')
+            
+            ws.cell(row=fila, column=2, value=total_a)
+            ws.cell(row=fila, column=2).border = Border(left=medium_side, right=medium_side, top=top, bottom=thin_side)
+            ws.cell(row=fila, column=2).alignment = Alignment(horizontal='center', vertical='center')
+            
+            for idx_b in range(len(opciones_b)):
+                celda = ws.cell(row=fila, column=3 + idx_b)
+                if porcentajes:
+                    unidades = porcentajes_fila['unidades'][idx_a, idx_b]
+                    celda.value = celda_porcentaje(unidades, porcentajes_fila['valores'][idx_a, idx_b])
+                    if unidades != 0:
+                        celda.number_format = porcentajes_fila['formato']
+                else:
+                    celda.value = int(conteos[idx_a, idx_b])
+                celda.border = Border(
+                    left=Side(style='medium' if idx_b == 0 else 'thin', color='FFD0D0D0'),
+                    right=medium_side if idx_b == len(opciones_b) - 1 else thin_side,
+                    top=top,
+                    bottom=medium_side if idx_a == len(opciones_a) - 1 else thin_side
+                )
+                celda.alignment = Alignment(horizontal='center', vertical='center')
+            fila += 1
+        return fila
+    
+    fila = escribir_tabla(3, thin_side, porcentajes=False)
+    
+    # Fila TOTAL: registros que respondieron A y, por opción de B, cuántos de ellos la eligieron
+    ws.cell(row=fila, column=1, value='TOTAL')
+    ws.cell(row=fila, column=2, value=int(tabla['total_respondieron']))
+    for idx_b in range(len(opciones_b)):
+        ws.cell(row=fila, column=3 + idx_b, value=int(tabla['totales_categoria'][idx_b]))
+    for col_idx in range(1, total_columnas + 1):
+        ws.cell(row=fila, column=col_idx).font = Font(bold=True)
+        ws.cell(row=fila, column=col_idx).border = Border(
+            left=medium_side if col_idx <= 3 else thin_side,
+            right=medium_side if col_idx in (2, total_columnas) else thin_side,
+            top=thin_side,
+            bottom=medium_side
+        )
+        ws.cell(row=fila, column=col_idx).alignment = Alignment(horizontal='center', vertical='center')
+    
+    escribir_tabla(fila + 3, medium_side, porcentajes=True)
     
     # Ajustar ancho de columnas
     ws.column_dimensions['A'].width = 30
     for col_idx in range(2, total_columnas + 1):
         ws.column_dimensions[get_column_letter(col_idx)].width = 12
+
+def generar_hoja_asociaciones(wb, tablas, variables):
+    """
+    Genera la hoja de resumen con la asociación de cada pregunta con cada
+    variable de cruce (chi-cuadrado, p-valor y V de Cramér): primero las
+    tablas significativas que cumplen la regla de Cochran, cada grupo
+    ordenado por V de Cramér. Las tablas de selección múltiple van en un
+    bloque aparte al final: cada registro cuenta una vez por opción, así que
+    su chi-cuadrado y p-valor no son válidos y nunca se marcan como confiables.
+    tablas: lista de (pregunta_col, tiene_combinaciones, tabla) ya calculadas.
+    """
+    filas = []
+    matrices = []
+    for pregunta_col, tiene_combinaciones, tabla in tablas:
+        for var_nombre, var_info in variables.items():
+            # Omitir la pregunta cruzada consigo misma (o con sus columnas derivadas)
+            if cruza_consigo_misma(pregunta_col, var_info):
+                continue
+            niveles = var_info.get('niveles', [var_info])
+            multiple = tiene_combinaciones or any(nivel.get('usa_contains', False) for nivel in niveles)
+            filas.append((pregunta_col, var_nombre, multiple))
+            matriz = tabla['conteos'][var_nombre]
+            if 'sin_ponderar' in tabla and tabla['total_general'] > 0:
+                # Tablas ponderadas: pesos normalizados al tamaño de la muestra,
+                # para que el chi-cuadrado no crezca con el factor de expansión
+                matriz = matriz * (tabla['sin_ponderar']['total_general'] / tabla['total_general'])
+            matrices.append(matriz)
+    
+    resultados = calcular_asociaciones(matrices)
+    # Primero las significativas (p < 0.05) que cumplen la regla de Cochran
+    # (a lo más 20% de celdas con esperado < 5); cada bloque de la asociación
+    # más fuerte a la más débil (V de Cramér descendente). Las tablas de
+    # selección múltiple quedan siempre después, en su propio bloque
+    multiples = np.array([multiple for _, _, multiple in filas], dtype=bool)
+    confiables = (resultados['p_valor'] < 0.05) & (resultados['esperados_bajos'] <= 0.2)
+    orden = np.lexsort((-resultados['v_cramer'], ~confiables, multiples))
+    
+    ws = wb.create_sheet(title="Asociaciones", index=0)
+    fill_header = PatternFill(start_color='FFE7E6E6', end_color='FFE7E6E6', fill_type='solid')
+    thin_side = Side(style='thin', color='FFD0D0D0')
+    thin_border = Border(left=thin_side, right=thin_side, top=thin_side, bottom=thin_side)
     
-    return fila_porcentajes + 1
+    ws.cell(row=1, column=1, value='Asociación entre preguntas y variables de cruce')
+    ws.cell(row=1, column=1).font = Font(bold=True, size=14)
+    
+    encabezados = ['#', 'Pregunta', 'Variable de cruce', 'N', 'Chi-cuadrado', 'gl', 'p-valor',
+                   'V de Cramér', 'Esperados < 5', 'Selección múltiple']
+    for col_idx, encabezado in enumerate(encabezados, start=1):
+        cell = ws.cell(row=3, column=col_idx, value=encabezado)
+        cell.font = Font(bold=True)
+        cell.fill = fill_header
+        cell.border = thin_border
+        cell.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
+    
+    fila = 4
+    posicion = 0
+    en_bloque_multiple = False
+    for t in orden:
+        pregunta_col, var_nombre, multiple = filas[t]
+        if multiple and not en_bloque_multiple:
+            # Bloque aparte (con numeración propia) para las tablas de selección múltiple
+            en_bloque_multiple = True
+            posicion = 0
+            fila += 1
+            ws.cell(row=fila, column=1, value='Selección múltiple: cada registro cuenta una vez por opción, '
+                                             'chi-cuadrado y p-valor solo orientativos')
+            ws.cell(row=fila, column=1).font = Font(bold=True)
+            fila += 1
+        posicion += 1
+        valores = [
+            posicion, pregunta_col, var_nombre, int(resultados['n'][t]),
+            float(resultados['chi2'][t]), int(resultados['grados_libertad'][t]),
+            float(resultados['p_valor'][t]), float(resultados['v_cramer'][t]),
+            float(resultados['esperados_bajos'][t]), 'Sí' if multiple else 'No'
+        ]
+        formatos = [None, None, None, None, '0.00', None, '0.0000', '0.000', '0%', None]
+        for col_idx, (valor, formato) in enumerate(zip(valores, formatos), start=1):
+            cell = ws.cell(row=fila, column=col_idx, value=valor)
+            cell.border = thin_border
+            if formato:
+                cell.number_format = formato
+            if col_idx not in (2, 3):
+                cell.alignment = Alignment(horizontal='center', vertical='center')
+        fila += 1
+    
+    # Ajustar ancho de columnas
+    ws.column_dimensions['A'].width = 6
+    ws.column_dimensions['B'].width = 50
+    ws.column_dimensions['C'].width = 30
+    for col_idx in range(4, len(encabezados) + 1):
+        ws.column_dimensions[get_column_letter(col_idx)].width = 14
+    
+    print(f"  ✓ Hoja Asociaciones generada ({len(filas)} tablas)")
 
-def generar_todos_analisis(archivo_entrada='V3.xlsx', archivo_salida='Todos-Cruzado.xlsx'):
+def calcular_intervalos_preguntas(df, preguntas, variables, remuestras, columna_peso=None):
     """
-    Función principal que genera análisis cruzado de todas las preguntas desde P3.
+    Intervalos de confianza bootstrap de todas las preguntas. Las preguntas se
+    agrupan por población (P6, P7 y P8 son condicionales) y cada población se
+    remuestrea una sola vez para todas sus preguntas (ponderadas si se indica
+    columna_peso).
+    Retorna {pregunta_col: intervalos}.
     """
-    print(f"Leyendo archivo: {archivo_entrada}")
+    poblaciones = {}
+    for _, pregunta_col, _ in preguntas:
+        tiene_combinaciones = detectar_combinaciones_multiples(df, pregunta_col)
+        opciones = obtener_opciones_unicas(df, pregunta_col, tiene_combinaciones)
+        if len(opciones) == 0:
+            continue
+        predicado = predicado_contiene if tiene_combinaciones else predicado_igualdad
+        _, opcion_filtro = mascara_poblacion(df, pregunta_col)
+        poblaciones.setdefault(opcion_filtro, {})[pregunta_col] = (opciones, predicado)
+    
+    intervalos = {}
+    for opcion_filtro, preguntas_poblacion in poblaciones.items():
+        df_work, _ = preparar_poblacion(df, next(iter(preguntas_poblacion)))
+        descripcion = 'todos los registros' if opcion_filtro is None else f"'{opcion_filtro}' en P3"
+        print(f"  Población {descripcion}: {len(df_work)} registros, {len(preguntas_poblacion)} preguntas")
+        intervalos.update(calcular_intervalos_bootstrap(
+            df_work, preguntas_poblacion, variables, remuestras, columna_peso=columna_peso
+        ))
+    return intervalos
+
+# Textos que read_excel interpreta como vacíos (valores por defecto de pandas)
+VALORES_VACIOS = {
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'
+}
+
+def leer_encuesta(archivo_entrada):
+    """Lee la encuesta completa (Excel, o CSV si la extensión es .csv)."""
+    if archivo_entrada.lower().endswith('.csv'):
+        return pd.read_csv(archivo_entrada)
+    return pd.read_excel(archivo_entrada)
+
+def leer_bloques(archivo_entrada, tamano_bloque):
+    """
+    Lee la encuesta en bloques de tamano_bloque registros, sin cargar el
+    archivo completo. Los CSV se leen con read_csv(chunksize=...) y los Excel
+    en modo solo lectura de openpyxl, fila por fila.
+    Genera un DataFrame por bloque.
+    """
+    if archivo_entrada.lower().endswith('.csv'):
+        yield from pd.read_csv(archivo_entrada, chunksize=tamano_bloque)
+        return
     
-    if not os.path.exists(archivo_entrada):
-        print(f"ERROR: No se encontró el archivo {archivo_entrada}")
+    wb = load_workbook(archivo_entrada, read_only=True, data_only=True)
+    try:
+        filas = wb.worksheets[0].iter_rows(values_only=True)
+        columnas = list(next(filas, ()))
+        registros = []
+        for fila in filas:
+            registros.append(fila)
+            if len(registros) == tamano_bloque:
+                yield bloque_desde_registros(registros, columnas)
+                registros = []
+        if registros:
+            yield bloque_desde_registros(registros, columnas)
+    finally:
+        wb.close()
+
+def bloque_desde_registros(registros, columnas):
+    """DataFrame de un bloque de filas de Excel, con los vacíos como NaN (igual que read_excel)."""
+    registros = [
+        tuple(None if isinstance(valor, str) and valor in VALORES_VACIOS else valor for valor in fila)
+        for fila in registros
+    ]
+    bloque = pd.DataFrame.from_records(registros, columns=columnas).infer_objects()
+    return bloque.mask(bloque.isna())
+
+def normalizar_tipos(bloque, columnas_con_nulos):
+    """
+    Las columnas enteras con vacíos en algún bloque se leen como float en el
+    archivo completo; se convierten igual en todos los bloques para que las
+    opciones y los conteos coincidan.
+    """
+    for columna in columnas_con_nulos:
+        if columna in bloque.columns and pd.api.types.is_integer_dtype(bloque[columna]):
+            bloque[columna] = bloque[columna].astype(np.float64)
+    return bloque
+
+def calcular_tablas_por_bloques(archivo_entrada, tamano_bloque, variables, columna_peso=None, coocurrencias=None):
+    """
+    Calcula las tablas de conteos de todas las preguntas leyendo la encuesta
+    por bloques, con memoria acotada al tamaño del bloque más los acumuladores.
+    
+    Primera pasada: frecuencia de los valores de cada columna, de la que salen
+    las opciones y el tipo (con o sin combinaciones) de cada pregunta.
+    Segunda pasada: tablas de cada bloque (población, columnas derivadas y
+    conteos) que se suman a las acumuladas con sumar_tablas.
+    
+    Retorna un diccionario con:
+        total_registros, columnas, preguntas (ver listar_preguntas)
+        info: {pregunta_col: (tiene_combinaciones, opciones)}
+        tablas: {pregunta_col: tabla} de las preguntas con opciones
+        multiples: preguntas de selección múltiple (ver preguntas_multiples)
+        coocurrencias: tablas de coocurrencia de los pares pedidos
+    """
+    # Primera pasada: frecuencias de las columnas de preguntas
+    total_registros = 0
+    columnas = []
+    preguntas = []
+    frecuencias = {}
+    columnas_con_nulos = set()
+    with etapa('lectura_y_perfil_esquema') as medicion:
+        for bloque in leer_bloques(archivo_entrada, tamano_bloque):
+            if not columnas:
+                columnas = bloque.columns.tolist()
+                preguntas = listar_preguntas(bloque)
+            total_registros += len(bloque)
+            for _, columna, _ in preguntas:
+                acumuladas = frecuencias.setdefault(columna, {})
+                for valor, frecuencia in contar_valores(bloque[columna]).items():
+                    acumuladas[valor] = acumuladas.get(valor, 0) + frecuencia
+                if bloque[columna].isna().any():
+                    columnas_con_nulos.add(columna)
+        medicion['registros'] = total_registros
+    print(f"  Primera pasada: {total_registros} registros, {len(columnas)} columnas")
+    
+    if columna_peso is not None and columna_peso not in columnas:
+        print(f"ERROR: No se encontró la columna de pesos '{columna_peso}'")
         sys.exit(1)
     
-    try:
-        df = pd.read_excel(archivo_entrada)
-        print(f"Archivo leído exitosamente. Total de registros: {len(df)}")
-    except Exception as e:
-        print(f"ERROR al leer el archivo: {e}")
+    # Opciones de cada pregunta (los enteros de columnas con vacíos quedan como float)
+    info = {}
+    multiples = {}
+    for _, pregunta_col, num_str in preguntas:
+        frecuencias_col = frecuencias.get(pregunta_col, {})
+        if pregunta_col in columnas_con_nulos:
+            frecuencias_col = frecuencias_como_float(frecuencias_col)
+        tiene_combinaciones = tiene_comas(pregunta_col, frecuencias_col)
+        opciones = opciones_desde_frecuencias(frecuencias_col, tiene_combinaciones)
+        info[pregunta_col] = (tiene_combinaciones, opciones)
+        if tiene_combinaciones and len(opciones) > 0:
+            multiples[pregunta_col] = (num_str, opciones)
+    
+    pares = resolver_pares_coocurrencia(multiples, coocurrencias) if coocurrencias else []
+    preguntas_cooc = {col: (opciones, predicado_contiene) for col, (_, opciones) in multiples.items()}
+    
+    # Segunda pasada: conteos por bloque, sumados a los acumulados
+    tablas = {}
+    tablas_cooc = None
+    with etapa('lectura_y_calculo', registros=total_registros):
+        for bloque in leer_bloques(archivo_entrada, tamano_bloque):
+            bloque = normalizar_tipos(bloque, columnas_con_nulos)
+            agregar_columnas_derivadas(bloque)
+            for _, pregunta_col, _ in preguntas:
+                tiene_combinaciones, opciones = info[pregunta_col]
+                if len(opciones) == 0:
+                    continue
+                mask_p3, _ = mascara_poblacion(bloque, pregunta_col)
+                poblacion = bloque if mask_p3 is None else bloque[mask_p3]
+                predicado_pregunta = predicado_contiene if tiene_combinaciones else predicado_igualdad
+                tablas[pregunta_col] = sumar_tablas(tablas.get(pregunta_col), calcular_tabla_cruzada(
+                    poblacion, pregunta_col, opciones, predicado_pregunta, variables, columna_peso
+                ))
+            if pares:
+                tablas_cooc = sumar_tablas(tablas_cooc, calcular_coocurrencias(bloque, preguntas_cooc, pares))
+    print(f"  Segunda pasada: {len(tablas)} tablas acumuladas")
+    
+    return {
+        'total_registros': total_registros,
+        'columnas': columnas,
+        'preguntas': preguntas,
+        'info': info,
+        'tablas': tablas,
+        'multiples': multiples,
+        'coocurrencias': tablas_cooc or {}
+    }
+
+def calcular_tablas_filtradas(df, mascara, variables, columna_peso=None, coocurrencias=None, codificadas=None):
+    """
+    Calcula las tablas de todas las preguntas sobre los registros de una
+    máscara (filtro --where), con la misma forma que calcular_tablas_por_bloques.
+    df debe tener ya las columnas derivadas.
+    
+    Las variables de cruce se codifican una sola vez sobre toda la encuesta y
+    cada pregunta combina la máscara con su regla de población (P6, P7, P8):
+    el motor selecciona esas filas de los arreglos codificados, sin copiar df.
+    Las opciones de cada pregunta salen de los registros filtrados, igual que
+    si la encuesta de entrada tuviera solo esos registros.
+    codificadas: variables ya codificadas sobre todo df (p. ej. compartidas
+    por todos los subgrupos de --split-by); si no se indica se codifican aquí.
+    """
+    if codificadas is None:
+        codificadas = {var_nombre: codificar_variable(df, var_info) for var_nombre, var_info in variables.items()}
+    preguntas = listar_preguntas(df)
+    info = {}
+    tablas = {}
+    multiples = {}
+    for _, pregunta_col, num_str in preguntas:
+        with etapa('perfil_esquema', pregunta=pregunta_col):
+            frecuencias = contar_valores(df[pregunta_col][mascara])
+            tiene_combinaciones = tiene_comas(pregunta_col, frecuencias)
+            opciones = opciones_desde_frecuencias(frecuencias, tiene_combinaciones)
+        info[pregunta_col] = (tiene_combinaciones, opciones)
+        if len(opciones) == 0:
+            continue
+        if tiene_combinaciones:
+            multiples[pregunta_col] = (num_str, opciones)
+        mask_p3, _ = mascara_poblacion(df, pregunta_col)
+        filas = mascara if mask_p3 is None else mascara & mask_p3.to_numpy()
+        predicado_pregunta = predicado_contiene if tiene_combinaciones else predicado_igualdad
+        with etapa('calculo', pregunta=pregunta_col, registros=np.count_nonzero(filas)):
+            tablas[pregunta_col] = calcular_tabla_cruzada(
+                df, pregunta_col, opciones, predicado_pregunta, variables, columna_peso, filas, codificadas
+            )
+    
+    tablas_cooc = {}
+    if coocurrencias:
+        pares = resolver_pares_coocurrencia(multiples, coocurrencias)
+        with etapa('calculo_coocurrencias', registros=np.count_nonzero(mascara)):
+            tablas_cooc = calcular_coocurrencias(
+                df, {col: (opciones, predicado_contiene) for col, (_, opciones) in multiples.items()}, pares, mascara
+            )
+    
+    return {
+        'total_registros': int(np.count_nonzero(mascara)),
+        'columnas': df.columns.tolist(),
+        'preguntas': preguntas,
+        'info': info,
+        'tablas': tablas,
+        'multiples': multiples,
+        'coocurrencias': tablas_cooc
+    }
+
+def generar_todos_analisis(archivo_entrada='V3.xlsx', archivo_salida='Todos-Cruzado.xlsx', variables=None,
+                           coocurrencias=None, asociaciones=False, remuestras=None, columna_peso=None,
+                           tamano_bloque=None, agregados=None, archivo_sqlite=None,
+                           exportar_largo=False, filtro=None, origen=None):
+    """
+    Función principal que genera análisis cruzado de todas las preguntas desde P3.
+    variables: grupos de columnas del reporte (por defecto VARIABLES_CRUCE).
+    coocurrencias: lista de pares de preguntas de selección múltiple (o 'todas')
+    que se agregan como hojas de coocurrencia a la versión con pestañas.
+    remuestras: si se indica, cada hoja de la versión con pestañas incluye los
+    intervalos de confianza bootstrap de los porcentajes con ese número de remuestras.
+    columna_peso: columna de pesos (factor de expansión); si se indica, los
+    conteos y porcentajes de ambas versiones quedan ponderados.
+    tamano_bloque: si se indica, la encuesta se lee por bloques de ese número
+    de registros y las tablas se acumulan bloque a bloque (memoria acotada);
+    los reportes son idénticos a los de la lectura completa.
+    agregados: tablas ya calculadas con la misma forma que el resultado de
+    calcular_tablas_por_bloques (p. ej. parciales combinados); si se indica
+    no se lee archivo_entrada.
+    archivo_sqlite: si se indica, todas las celdas calculadas se guardan
+    además en esa base SQLite en formato largo (ver almacen.py); los
+    resultados anteriores del mismo origen se reemplazan.
+    origen: clave de la corrida en la base SQLite; por defecto, la ruta
+    resuelta del archivo de entrada (o del de salida, si no hay entrada).
+    exportar_largo: si es True, escribe además la tabla en formato largo de
+    todos los cruces (<salida>-Largo.csv y, si hay pyarrow, .parquet).
+    filtro: expresión --where (ver filtros.py); los reportes quedan
+    restringidos a los registros que la cumplen.
+    Retorna un resumen: {registros, preguntas, errores (preguntas que no se
+    pudieron procesar), archivos (los dos reportes generados)}.
+    """
+    if (tamano_bloque is not None or agregados is not None or filtro is not None) and remuestras:
+        print("ERROR: Los intervalos bootstrap remuestrean registros y no se pueden calcular por bloques, con filtro ni desde tablas agregadas")
+        sys.exit(1)
+    if filtro is not None and (tamano_bloque is not None or agregados is not None):
+        print("ERROR: El filtro se aplica a la encuesta completa en memoria; no se puede combinar con la lectura por bloques ni con tablas agregadas")
         sys.exit(1)
     
+    # Medición por etapas: informe <salida>-Corrida.json y resumen al final
+    iniciar_registro(
+        'todos.py', archivo_salida, archivo_entrada=archivo_entrada, columna_peso=columna_peso, filtro=filtro
+    )
+    
+    df = None
+    if agregados is not None:
+        print(f"Usando tablas agregadas. Total de registros: {agregados['total_registros']}")
+    elif tamano_bloque is not None:
+        print(f"Leyendo archivo: {archivo_entrada}")
+        if not os.path.exists(archivo_entrada):
+            print(f"ERROR: No se encontró el archivo {archivo_entrada}")
+            sys.exit(1)
+        print(f"Leyendo por bloques de {tamano_bloque} registros...")
+        try:
+            agregados = calcular_tablas_por_bloques(
+                archivo_entrada, tamano_bloque, variables if variables is not None else VARIABLES_CRUCE,
+                columna_peso, coocurrencias
+            )
+            print(f"Archivo leído exitosamente. Total de registros: {agregados['total_registros']}")
+        except Exception as e:
+            print(f"ERROR al leer el archivo: {e}")
+            sys.exit(1)
+    else:
+        print(f"Leyendo archivo: {archivo_entrada}")
+        if not os.path.exists(archivo_entrada):
+            print(f"ERROR: No se encontró el archivo {archivo_entrada}")
+            sys.exit(1)
+        try:
+            with etapa('lectura') as medicion:
+                df = leer_encuesta(archivo_entrada)
+                medicion['registros'] = len(df)
+            print(f"Archivo leído exitosamente. Total de registros: {len(df)}")
+        except Exception as e:
+            print(f"ERROR al leer el archivo: {e}")
+            sys.exit(1)
+    
+    if columna_peso is not None and df is not None:
+        if columna_peso not in df.columns:
+            print(f"ERROR: No se encontró la columna de pesos '{columna_peso}'")
+            sys.exit(1)
+        pesos = obtener_pesos(df, columna_peso)
+        print(f"Ponderando por '{columna_peso}': suma de pesos {pesos.sum():,.2f} ({len(df)} registros)")
+    
+    # Filtro de subpoblación: una máscara y las tablas de todas las preguntas
+    if filtro is not None:
+        variables_filtro = dict(VARIABLES_CRUCE, **(variables or {}))
+        print(f"Aplicando filtro: {filtro}")
+        try:
+            with etapa('filtro', registros=len(df)):
+                mascara = compilar_filtro(filtro, agregar_columnas_derivadas(df), variables_filtro)
+        except ValueError as e:
+            print(f"ERROR en el filtro: {e}")
+            sys.exit(1)
+        print(f"  Registros que cumplen el filtro: {int(mascara.sum())} de {len(df)}")
+        agregados = calcular_tablas_filtradas(
+            df, mascara, variables if variables is not None else VARIABLES_CRUCE, columna_peso, coocurrencias
+        )
+        df = None
+    
     # Crear workbook
     wb = Workbook()
     # Eliminar hoja por defecto
     wb.remove(wb.active)
     
     # Obtener TODAS las preguntas desde P3 (incluyendo todas las variantes)
-    columnas = df.columns.tolist()
-    preguntas = []
-    
-    for col in columnas:
-        if col.startswith('P') and ' - ' in col:
-            # Extraer número de pregunta (puede ser P3, P11.1, P12.1, etc.)
-            num_pregunta_str = col.split(' - ')[0].replace('P', '')
-            try:
-                # Intentar convertir a float para manejar P11.1, P12.1, etc.
-                num = float(num_pregunta_str)
-                if num >= 3:
-                    # Incluir TODAS las variantes (no solo la primera)
-                    preguntas.append((num, col, num_pregunta_str))
-            except:
-                pass
-    
-    # Ordenar por número
-    preguntas.sort(key=lambda x: x[0])
+    with etapa('perfil_esquema'):
+        preguntas = listar_preguntas(df) if agregados is None else agregados['preguntas']
     
     print(f"\n{'='*80}")
     print(f"PREGUNTAS ENCONTRADAS: {len(preguntas)}")
@@ -1750,33 +1894,123 @@ def generar_todos_analisis(archivo_entrada='V3.xlsx', archivo_salida='Todos-Cruz
     
     wb_pestanas = Workbook()
     wb_pestanas.remove(wb_pestanas.active)
+    tablas_calculadas = []
+    tablas_almacen = []
+    errores = []
+    
+    # Intervalos de confianza: todas las remuestras de todas las preguntas de una vez
+    intervalos = {}
+    if remuestras:
+        print(f"\nCalculando intervalos de confianza bootstrap ({remuestras} remuestras)...")
+        with etapa('bootstrap', registros=len(df)):
+            intervalos = calcular_intervalos_preguntas(
+                df, preguntas, variables if variables is not None else VARIABLES_CRUCE, remuestras, columna_peso
+            )
     
     for pregunta_num, pregunta_col, num_str in preguntas:
         pregunta_nombre = pregunta_col
         
         # Detectar si tiene combinaciones múltiples
-        tiene_combinaciones = detectar_combinaciones_multiples(df, pregunta_col)
+        opciones = tabla = None
+        if agregados is None:
+            with etapa('perfil_esquema', pregunta=pregunta_col):
+                tiene_combinaciones = detectar_combinaciones_multiples(df, pregunta_col)
+        else:
+            tiene_combinaciones, opciones = agregados['info'][pregunta_col]
+            tabla = agregados['tablas'].get(pregunta_col)
         
         # Generar hoja
         try:
-            generar_hoja_pregunta(wb_pestanas, df, num_str, pregunta_col, pregunta_nombre, tiene_combinaciones)
+            if opciones is None:
+                with etapa('perfil_esquema', pregunta=pregunta_col):
+                    opciones = obtener_opciones_unicas(df, pregunta_col, tiene_combinaciones)
+            with etapa('escritura_pestanas', pregunta=pregunta_col, libro=wb_pestanas):
+                tabla = generar_hoja_pregunta(
+                    wb_pestanas, df, num_str, pregunta_col, pregunta_nombre, tiene_combinaciones, variables,
+                    intervalos.get(pregunta_col), columna_peso, opciones, tabla
+                )
+            if tabla is not None:
+                tablas_calculadas.append((pregunta_col, tiene_combinaciones, tabla))
+                tablas_almacen.append((f"P{num_str}", pregunta_col, opciones, tabla))
         except Exception as e:
             print(f"  ✗ Error al procesar {pregunta_nombre}: {e}")
+            errores.append(pregunta_col)
             import traceback
             traceback.print_exc()
     
+    # Resumen de asociaciones: reutiliza las tablas de conteos ya calculadas
+    if asociaciones:
+        print(f"\n{'='*80}")
+        print("GENERANDO RESUMEN DE ASOCIACIONES")
+        print(f"{'='*80}")
+        with etapa('asociaciones', libro=wb_pestanas):
+            generar_hoja_asociaciones(wb_pestanas, tablas_calculadas, variables if variables is not None else VARIABLES_CRUCE)
+    
+    # Hojas de coocurrencia: todos los pares salen de un solo producto de matrices
+    if coocurrencias:
+        print(f"\n{'='*80}")
+        print("GENERANDO HOJAS DE COOCURRENCIA")
+        print(f"{'='*80}")
+        if agregados is None:
+            with etapa('calculo_coocurrencias', registros=len(df)):
+                multiples = preguntas_multiples(df)
+                pares = resolver_pares_coocurrencia(multiples, coocurrencias)
+                tablas = calcular_coocurrencias(
+                    df, {col: (opciones, predicado_contiene) for col, (_, opciones) in multiples.items()}, pares
+                )
+        else:
+            multiples, tablas = agregados['multiples'], agregados['coocurrencias']
+        with etapa('escritura_coocurrencias', libro=wb_pestanas):
+            for (pregunta_a, pregunta_b), tabla in tablas.items():
+                generar_hoja_coocurrencia(
+                    wb_pestanas, pregunta_a, pregunta_b, multiples[pregunta_a][1], multiples[pregunta_b][1], tabla
+                )
+    
     # Guardar archivo con pestañas
     archivo_pestanas = archivo_salida.replace('.xlsx', '-Pestanas.xlsx')
     print(f"\n{'='*80}")
     print(f"Guardando archivo con pestañas: {archivo_pestanas}")
     try:
-        wb_pestanas.save(archivo_pestanas)
+        with etapa('guardado'):
+            wb_pestanas.save(archivo_pestanas)
         print(f"✓ Archivo generado exitosamente: {archivo_pestanas}")
         print(f"  Total de hojas generadas: {len(wb_pestanas.worksheets)}")
     except Exception as e:
         print(f"ERROR al guardar el archivo: {e}")
         sys.exit(1)
     
+    # Formato largo y almacén SQLite: las mismas tablas, una fila por celda
+    if exportar_largo or archivo_sqlite:
+        with etapa('formato_largo') as medicion:
+            tabla_larga = construir_tabla_larga(tablas_almacen, variables if variables is not None else VARIABLES_CRUCE)
+            medicion['registros'] = len(tabla_larga)
+    
+    if exportar_largo:
+        print(f"Exportando tabla en formato largo ({len(tabla_larga)} filas)")
+        try:
+            with etapa('exportar_largo', registros=len(tabla_larga)):
+                archivos_largo = exportar_tabla_larga(tabla_larga, archivo_salida)
+            for archivo in archivos_largo:
+                print(f"✓ Archivo generado exitosamente: {archivo}")
+        except Exception as e:
+            print(f"ERROR al exportar el formato largo: {e}")
+            sys.exit(1)
+    
+    if archivo_sqlite:
+        print(f"Guardando resultados en SQLite: {archivo_sqlite}")
+        if origen is None:
+            origen = clave_origen(archivo_entrada if archivo_entrada else archivo_salida)
+        try:
+            with etapa('sqlite', registros=len(tabla_larga)):
+                total_filas = guardar_resultados(
+                    archivo_sqlite, origen, tabla_larga,
+                    len(df) if df is not None else agregados['total_registros'], columna_peso
+                )
+            print(f"✓ {total_filas} filas guardadas (origen '{origen}')")
+        except Exception as e:
+            print(f"ERROR al guardar en SQLite: {e}")
+            sys.exit(1)
+    
     # ============================================================================
     # VERSIÓN 2: UNA SOLA HOJA (todas las preguntas en la misma hoja)
     # ============================================================================
@@ -1794,18 +2028,26 @@ def generar_todos_analisis(archivo_entrada='V3.xlsx', archivo_salida='Todos-Cruz
         pregunta_nombre = pregunta_col
         
         # Detectar si tiene combinaciones múltiples
-        tiene_combinaciones = detectar_combinaciones_multiples(df, pregunta_col)
+        opciones = tabla = None
+        if agregados is None:
+            with etapa('perfil_esquema', pregunta=pregunta_col):
+                tiene_combinaciones = detectar_combinaciones_multiples(df, pregunta_col)
+        else:
+            tiene_combinaciones, opciones = agregados['info'][pregunta_col]
+            tabla = agregados['tablas'].get(pregunta_col)
         
         # Generar análisis en la misma hoja
         try:
-            fila_actual = generar_analisis_en_hoja_unica(
-                ws_unica, df, num_str, pregunta_col, pregunta_nombre, 
-                tiene_combinaciones, fila_actual
-            )
+            with etapa('escritura_una_hoja', pregunta=pregunta_col, libro=wb_una_hoja):
+                fila_actual = generar_analisis_en_hoja_unica(
+                    ws_unica, df, num_str, pregunta_col, pregunta_nombre, 
+                    tiene_combinaciones, fila_actual, variables, columna_peso, opciones, tabla
+                )
             # Agregar 3 filas vacías entre preguntas
             fila_actual += 3
         except Exception as e:
             print(f"  ✗ Error al procesar {pregunta_nombre}: {e}")
+            errores.append(pregunta_col)
             import traceback
             traceback.print_exc()
     
@@ -1814,23 +2056,284 @@ def generar_todos_analisis(archivo_entrada='V3.xlsx', archivo_salida='Todos-Cruz
     print(f"\n{'='*80}")
     print(f"Guardando archivo en una sola hoja: {archivo_una_hoja}")
     try:
-        wb_una_hoja.save(archivo_una_hoja)
+        with etapa('guardado'):
+            wb_una_hoja.save(archivo_una_hoja)
         print(f"✓ Archivo generado exitosamente: {archivo_una_hoja}")
         print(f"  Total de filas generadas: {fila_actual}")
     except Exception as e:
         print(f"ERROR al guardar el archivo: {e}")
         sys.exit(1)
+    
+    terminar_registro()
+    return {
+        'registros': len(df) if df is not None else agregados['total_registros'],
+        'preguntas': len(preguntas),
+        'errores': sorted(set(errores), key=errores.index),
+        'archivos': [archivo_pestanas, archivo_una_hoja]
+    }
+
+def nombre_subgrupo(categoria):
+    """Categoría como parte de un nombre de archivo ('Occidente', 'h._Importador')."""
+    return re.sub(r'[^\w.-]+', '_', str(categoria)).strip('_') or 'vacio'
+
+def generar_subgrupo(tarea):
+    """
+    Genera los reportes de un subgrupo desde sus tablas ya calculadas (se
+    ejecuta en un proceso del grupo). La salida de todos.py va al registro
+    del subgrupo. Retorna la fila del resumen.
+    """
+    categoria, archivo_salida, archivo_log, agregados, opciones = tarea
+    resultado = {'subgrupo': categoria, 'log': archivo_log, 'estado': 'ok'}
+    inicio = time.perf_counter()
+    with open(archivo_log, 'w', encoding='utf-8') as log, \
+            contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        try:
+            resumen = generar_todos_analisis(None, archivo_salida, agregados=agregados, **opciones)
+            resultado.update(resumen)
+            if resumen['errores']:
+                resultado['estado'] = 'con errores'
+        except SystemExit:
+            # generar_todos_analisis termina con sys.exit(1) y deja el motivo en el registro
+            resultado['estado'] = 'error'
+        except Exception as e:
+            print(f"ERROR: {e}")
+            resultado['estado'] = 'error'
+    resultado['segundos'] = round(time.perf_counter() - inicio, 2)
+    return resultado
+
+def generar_por_subgrupos(archivo_entrada, archivo_salida, campo, procesos=None, variables=None,
+                          coocurrencias=None, asociaciones=False, columna_peso=None, archivo_sqlite=None,
+                          exportar_largo=False, filtro=None):
+    """
+    Genera los reportes de todos.py por separado para cada subgrupo de un
+    campo (--split-by), p. ej. uno por región de Region_Oficina.
+    
+    La encuesta se lee y se divide una sola vez (una máscara por categoría,
+    ver particionar_registros) y las variables de cruce se codifican una sola
+    vez para todos los subgrupos; las tablas de cada subgrupo salen de esos
+    arreglos compartidos. Solo la escritura de los libros se reparte en un
+    grupo de procesos. Cada subgrupo genera <salida>-<categoría>-Pestanas.xlsx
+    y -UnaHoja.xlsx, idénticos a los de una corrida con --where sobre esa
+    categoría, y su registro en <salida>-<categoría>.log.
+    filtro: expresión --where opcional que se aplica además a todos los subgrupos.
+    Retorna la lista de resultados por subgrupo.
+    """
+    variables = variables if variables is not None else VARIABLES_CRUCE
+    iniciar_registro(
+        'todos.py', archivo_salida, archivo_entrada=archivo_entrada, columna_peso=columna_peso, filtro=filtro,
+        division=campo
+    )
+    print(f"Leyendo archivo: {archivo_entrada}")
+    if not os.path.exists(archivo_entrada):
+        print(f"ERROR: No se encontró el archivo {archivo_entrada}")
+        sys.exit(1)
+    try:
+        with etapa('lectura') as medicion:
+            df = leer_encuesta(archivo_entrada)
+            medicion['registros'] = len(df)
+        print(f"Archivo leído exitosamente. Total de registros: {len(df)}")
+    except Exception as e:
+        print(f"ERROR al leer el archivo: {e}")
+        sys.exit(1)
+    if columna_peso is not None and columna_peso not in df.columns:
+        print(f"ERROR: No se encontró la columna de pesos '{columna_peso}'")
+        sys.exit(1)
+    
+    # Una sola división de los registros (y el filtro, si hay)
+    with etapa('columnas_derivadas', registros=len(df)):
+        df = agregar_columnas_derivadas(df)
+    variables_filtro = dict(VARIABLES_CRUCE, **variables)
+    try:
+        with etapa('particion', registros=len(df)):
+            columna, particiones = particionar_registros(df, campo, variables_filtro)
+            mascara_filtro = compilar_filtro(filtro, df, variables_filtro) if filtro is not None else None
+    except ValueError as e:
+        print(f"ERROR en --split-by/--where: {e}")
+        sys.exit(1)
+    if mascara_filtro is not None:
+        print(f"Aplicando filtro: {filtro} ({int(mascara_filtro.sum())} de {len(df)} registros)")
+        particiones = [(categoria, mascara & mascara_filtro) for categoria, mascara in particiones]
+        particiones = [(categoria, mascara) for categoria, mascara in particiones if mascara.any()]
+    if not particiones:
+        print(f"ERROR: Ningún registro tiene valor en '{columna}'")
+        sys.exit(1)
+    
+    print(f"\nDividiendo por '{columna}': {len(particiones)} subgrupos")
+    with etapa('codificacion', registros=len(df)):
+        codificadas = {var_nombre: codificar_variable(df, var_info) for var_nombre, var_info in variables.items()}
+    base = archivo_salida[:-len('.xlsx')] if archivo_salida.endswith('.xlsx') else archivo_salida
+    opciones = {
+        'variables': variables, 'coocurrencias': coocurrencias, 'asociaciones': asociaciones,
+        'columna_peso': columna_peso, 'archivo_sqlite': archivo_sqlite, 'exportar_largo': exportar_largo
+    }
+    tareas = []
+    for categoria, mascara in particiones:
+        agregados = calcular_tablas_filtradas(df, mascara, variables, columna_peso, coocurrencias, codificadas)
+        nombre = f"{base}-{nombre_subgrupo(categoria)}"
+        tareas.append((categoria, f"{nombre}.xlsx", f"{nombre}.log", agregados, opciones))
+        print(f"  ✓ {categoria}: {agregados['total_registros']} registros")
+    sin_grupo = len(df) - int(np.count_nonzero(np.logical_or.reduce([mascara for _, mascara in particiones])))
+    if sin_grupo:
+        print(f"  ⚠ {sin_grupo} registros sin subgrupo (vacíos o fuera de las categorías) no aparecen en ningún reporte")
+    
+    procesos = procesos or os.cpu_count() or 1
+    print(f"\nGenerando {len(tareas)} reportes con {min(procesos, len(tareas))} procesos...")
+    inicio = time.perf_counter()
+    resultados = []
+    with etapa('escritura_subgrupos'), ProcessPoolExecutor(max_workers=min(procesos, len(tareas))) as grupo:
+        for resultado in grupo.map(generar_subgrupo, tareas):
+            resultados.append(resultado)
+            print(f"  ✓ {resultado['subgrupo']}: {resultado['estado']} ({resultado['segundos']:.1f} s)")
+    total_segundos = time.perf_counter() - inicio
+    
+    print(f"\n{'Subgrupo':<40} {'Estado':<14} {'Registros':>10} {'Segundos':>9}")
+    print("-" * 76)
+    for resultado in resultados:
+        print(
+            f"{str(resultado['subgrupo'])[:40]:<40} {resultado['estado']:<14} "
+            f"{resultado.get('registros', '-'):>10} {resultado['segundos']:>9.1f}"
+        )
+        for archivo in resultado.get('archivos', []):
+            print(f"    {archivo}")
+    print(f"\nTiempo de escritura: {total_segundos:.1f} s")
+    terminar_registro()
+    return resultados
 
 if __name__ == "__main__":
-    archivo_entrada = sys.argv[1] if len(sys.argv) > 1 else 'V3.xlsx'
-    archivo_salida = sys.argv[2] if len(sys.argv) > 2 else 'Todos-Cruzado.xlsx'
+    parser = argparse.ArgumentParser(
+        description='Genera el análisis cruzado de todas las preguntas desde P3.'
+    )
+    parser.add_argument('archivo_entrada', nargs='?', default='V3.xlsx')
+    parser.add_argument('archivo_salida', nargs='?', default='Todos-Cruzado.xlsx')
+    parser.add_argument(
+        '--anidar', action='append', default=[], metavar='EXTERNA>INTERNA',
+        help="Agrega un grupo anidado, p. ej. 'Oficina/Agencia/Delegación>P37 Género' (se puede repetir)"
+    )
+    parser.add_argument(
+        '--coocurrencia', action='append', nargs=2, default=[], metavar=('PREGUNTA_A', 'PREGUNTA_B'),
+        help="Agrega una hoja de coocurrencia entre dos preguntas múltiples, p. ej. P34 P35 (se puede repetir)"
+    )
+    parser.add_argument(
+        '--coocurrencias', action='store_true',
+        help='Agrega hojas de coocurrencia para todos los pares de preguntas múltiples'
+    )
+    parser.add_argument(
+        '--asociaciones', action='store_true',
+        help='Agrega una hoja con chi-cuadrado, p-valor y V de Cramér de cada tabla, ordenada por asociación'
+    )
+    parser.add_argument(
+        '--bootstrap', type=int, default=None, metavar='B',
+        help='Agrega a cada hoja los límites del intervalo de confianza del 95%% de cada porcentaje, con B remuestras (p. ej. 1000)'
+    )
+    parser.add_argument(
+        '--peso', default=None, metavar='COLUMNA',
+        help='Columna con el factor de expansión por encuestado; los conteos y porcentajes quedan ponderados'
+    )
+    parser.add_argument(
+        '--bloques', type=int, default=None, metavar='N',
+        help='Lee la encuesta (Excel o CSV) por bloques de N registros y acumula los conteos, con memoria acotada'
+    )
+    parser.add_argument(
+        '--sqlite', default=None, metavar='ARCHIVO',
+        help='Guarda además todas las celdas en una base SQLite en formato largo, con índices por pregunta y variable'
+    )
+    parser.add_argument(
+        '--origen', default=None, metavar='NOMBRE',
+        help='Con --sqlite: clave de la corrida en la base (por defecto, la ruta resuelta del archivo de entrada)'
+    )
+    parser.add_argument(
+        '--largo', action='store_true',
+        help='Exporta además todas las celdas en formato largo: <salida>-Largo.csv y -Largo.parquet (si hay pyarrow)'
+    )
+    parser.add_argument(
+        '--where', default=None, metavar='EXPRESION',
+        help="Restringe los reportes a una subpoblación, p. ej. \"P9 = 'h. Importador'\" o 'Region_Aduana is not null'"
+    )
+    parser.add_argument(
+        '--split-by', default=None, metavar='CAMPO',
+        help='Genera un par de reportes por cada categoría del campo (p. ej. Region_Oficina), en paralelo'
+    )
+    parser.add_argument(
+        '--procesos', type=int, default=None, metavar='N',
+        help='Procesos para escribir los reportes de --split-by (por defecto, uno por CPU)'
+    )
+    parser.add_argument(
+        '--escaneos', action='store_true',
+        help='Cuenta por hoja los str.contains, máscaras de igualdad y DataFrames filtrados (informe de la corrida)'
+    )
+    parser.add_argument(
+        '--max-escaneos', type=int, default=None, metavar='N',
+        help='Con el contador de escaneos: termina con error si alguna hoja hace más de N escaneos'
+    )
+    parser.add_argument(
+        '--max-filas-escaneadas', type=int, default=None, metavar='N',
+        help='Con el contador de escaneos: termina con error si alguna hoja hace escaneos que recorren más de N filas'
+    )
+    parser.add_argument(
+        '--profile-memory', action='store_true',
+        help='Registra el pico de RSS y la memoria asignada (tracemalloc) por etapa y por pregunta, con las líneas que más asignan'
+    )
+    parser.add_argument(
+        '--profile', action='store_true',
+        help='Ejecuta bajo cProfile: guarda <salida>-Perfil.prof y muestra las funciones más costosas por grupo'
+    )
+    args = parser.parse_args()
+    if args.bootstrap is not None and args.bootstrap < 1:
+        parser.error('--bootstrap: el número de remuestras debe ser mayor que 0')
+    if args.bloques is not None and args.bloques < 1:
+        parser.error('--bloques: el tamaño del bloque debe ser mayor que 0')
+    if args.split_by is not None and (args.bootstrap is not None or args.bloques is not None):
+        parser.error('--split-by: no se puede combinar con --bootstrap ni con --bloques')
+    if args.origen is not None and (args.sqlite is None or args.split_by is not None):
+        parser.error('--origen: requiere --sqlite y no se combina con --split-by (cada subgrupo usa la ruta de su reporte)')
+    if args.escaneos or args.max_escaneos is not None or args.max_filas_escaneadas is not None:
+        activar_contador_escaneos()
+    if args.profile_memory:
+        activar_perfil_memoria()
+    
+    variables = None
+    if args.anidar:
+        variables = dict(VARIABLES_CRUCE)
+        for definicion in args.anidar:
+            externa, _, interna = definicion.partition('>')
+            if externa.strip() not in VARIABLES_CRUCE or interna.strip() not in VARIABLES_CRUCE:
+                parser.error(f"--anidar: grupos no válidos en '{definicion}'. Opciones: {', '.join(VARIABLES_CRUCE)}")
+            nombre, definicion_anidada = definir_grupo_anidado(externa.strip(), interna.strip())
+            variables[nombre] = definicion_anidada
     
     print("=" * 80)
     print("GENERADOR DE ANÁLISIS CRUZADO - TODAS LAS PREGUNTAS")
     print("=" * 80)
     print()
     
-    generar_todos_analisis(archivo_entrada, archivo_salida)
+    coocurrencias = (['todas'] if args.coocurrencias else []) + args.coocurrencia
+    if args.split_by is not None:
+        principal = functools.partial(
+            generar_por_subgrupos,
+            args.archivo_entrada, args.archivo_salida, args.split_by, args.procesos, variables, coocurrencias,
+            args.asociaciones, args.peso, archivo_sqlite=args.sqlite, exportar_largo=args.largo,
+            filtro=args.where
+        )
+    else:
+        principal = functools.partial(
+            generar_todos_analisis,
+            args.archivo_entrada, args.archivo_salida, variables, coocurrencias, args.asociaciones, args.bootstrap,
+            args.peso, args.bloques, archivo_sqlite=args.sqlite, exportar_largo=args.largo,
+            filtro=args.where, origen=args.origen
+        )
+    # Con --split-by el perfil cubre el proceso principal (lectura, división y cálculo), no la escritura en paralelo
+    if args.profile:
+        ejecutar_con_perfil(args.archivo_salida, principal)
+    else:
+        principal()
+    
+    # Límite de escaneos por hoja de la corrida (con --split-by, las tablas de todos los subgrupos)
+    if args.max_escaneos is not None or args.max_filas_escaneadas is not None:
+        try:
+            afirmar_limite_escaneos(args.max_escaneos, maximo_filas=args.max_filas_escaneadas)
+        except AssertionError as e:
+            print(f"ERROR: {e}")
+            sys.exit(1)
     
     print()
     print("=" * 80)